@@ -72,7 +72,7 @@ If you just want to know about a key, ask and ye shall receive::
 
     >>> from pprint import pprint
     >>> s["This is a testfile."] = OSSFile("Hi!", metadata={"hairdo": "Secret"})
-    >>> pprint(s.info("This is a testfile."))  # doctest: +ELLIPSIS
+    >>> pprint(dict(s.info("This is a testfile.")))  # doctest: +ELLIPSIS
     {'date': datetime.datetime(...),
      'headers': {'content-length': '3',
                  'content-type': 'application/octet-stream',
@@ -88,7 +88,8 @@ If you just want to know about a key, ask and ye shall receive::
      'modify': datetime.datetime(...),
      'size': 3}
 
-Notable is that you got the metadata parsed out in the `metadata` key. You
+Notable is that you got the metadata parsed out in the `metadata` key. The
+info is parsed lazily, so ``s.info(key).size`` won't bother with the dates. You
 might also have noticed how the file was uploaded, using an `OSSFile` object
 like that. That's a nicer way to do it, in a way.
 
@@ -121,8 +122,8 @@ That about sums the basics up.
 
 from __future__ import absolute_import
 
-__version__ = "1.1.0"
+__version__ = "1.2.0"
 
-from .bucket import OSSFile, OSSBucket, OSSError, KeyNotFound
-OSSFile, OSSBucket, OSSError, KeyNotFound  # pyflakes
+from .bucket import OSSFile, OSSBucket, OSSError, KeyNotFound, ChecksumMismatch
+OSSFile, OSSBucket, OSSError, KeyNotFound, ChecksumMismatch  # pyflakes
 __all__ = "OSSFile", "OSSBucket", "OSSError"
@@ -0,0 +1,204 @@
+"""Adaptive concurrency for bulk operations
+
+An `AdaptiveLimiter` caps the number of requests a bucket has in flight, and
+tunes that cap as it goes: additively up while responses come back fast and
+clean, multiplicatively down on throttling (HTTP 503) and timeouts. Usage::
+
+    >>> limiter = AdaptiveLimiter(initial=8, max_limit=128)
+    >>> bucket = OSSBucket("my-bucket", concurrency_limiter=limiter)
+    >>> pool = WorkerPool(128)
+    >>> for key in keys:
+    ...     pool.submit(bucket.delete, key)
+
+Size thread pools for *max_limit*; threads beyond the current limit simply
+wait their turn in `OSSBucket.send`. A request holds its slot until its
+response body has been read or closed, so downloads count for as long as
+they transfer. For monitoring, see `snapshot` and the recent `decisions`.
+"""
+
+from __future__ import with_statement
+
+import time
+import socket
+import urllib2
+import weakref
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+OK, THROTTLED, TIMEOUT, ERROR = "ok", "throttled", "timeout", "error"
+
+def classify(exc):
+    """Tell what exception *exc* says about the health of the service."""
+    if isinstance(exc, urllib2.HTTPError):
+        if exc.code == 503:
+            return THROTTLED
+        elif exc.code >= 500:
+            return ERROR
+        else:
+            # The service answered promptly, the request was just bad.
+            return OK
+    if isinstance(exc, urllib2.URLError):
+        exc = exc.reason
+    if isinstance(exc, socket.timeout):
+        return TIMEOUT
+    return ERROR
+
+class AdaptiveLimiter(object):
+    """Additive-increase, multiplicative-decrease limit on in-flight requests.
+
+    Each healthy response raises the limit by *increase* / *limit*, which adds
+    up to *increase* per limit's worth of requests. Responses slower than
+    *latency_target* seconds, if given, do not count as healthy. Throttling or
+    a timeout multiplies the limit by *backoff*, at most once per *cooldown*
+    seconds so one burst of failures is not punished over and over.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, increase=1.0,
+                 backoff=0.5, latency_target=None, cooldown=1.0,
+                 clock=time.time, n_decisions=100):
+        if not min_limit <= initial <= max_limit:
+            raise ValueError("initial limit %r outside [%r, %r]"
+                             % (initial, min_limit, max_limit))
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.clock = clock
+        self.in_flight = 0
+        self.counts = dict.fromkeys((OK, THROTTLED, TIMEOUT, ERROR), 0)
+        self.decisions = deque(maxlen=n_decisions)
+        self._last_backoff = None
+        self._cond = threading.Condition()
+        # Weak references to responses holding slots, until they let go.
+        self._held = set()
+
+    def __repr__(self):
+        return "<%s limit=%.2f in_flight=%d>" % (self.__class__.__name__,
+                                                 self.limit, self.in_flight)
+
+    def acquire(self):
+        """Wait for a free slot, and return a token to `release` it with."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return self.clock()
+
+    def release(self, token, outcome=OK, latency=None):
+        """Free the slot taken at *token*, adjusting the limit by *outcome*
+        and *latency*, by default the time since *token*."""
+        now = self.clock()
+        if latency is None:
+            latency = now - token
+        with self._cond:
+            self.in_flight -= 1
+            self.counts[outcome] += 1
+            if outcome in (THROTTLED, TIMEOUT):
+                if (self._last_backoff is None or
+                        now - self._last_backoff >= self.cooldown):
+                    self._last_backoff = now
+                    self._set_limit(self.limit * self.backoff, outcome, now)
+            elif outcome == OK:
+                if self.latency_target is None or latency <= self.latency_target:
+                    self._set_limit(self.limit + self.increase / self.limit,
+                                    outcome, now)
+            self._cond.notify_all()
+
+    def _set_limit(self, limit, reason, now):
+        limit = max(self.min_limit, min(self.max_limit, limit))
+        # Only whole steps are interesting to look back on.
+        if int(limit) != int(self.limit):
+            self.decisions.append((now, reason, int(self.limit), int(limit)))
+        self.limit = limit
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for the duration of a with-block.
+
+        Exceptions escaping the block are classified with `classify`.
+        """
+        token = self.acquire()
+        try:
+            yield
+        except BaseException, e:
+            self.release(token, classify(e))
+            raise
+        else:
+            self.release(token, OK)
+
+    def open(self, opener, req, **kwds):
+        """Open urllib2 request *req* with *opener* in a slot.
+
+        The slot is held until the response body is read to the end, fails
+        to read, or the response is closed or collected; errors reading it
+        are classified with `classify`. Responses without a body, to HEAD
+        or of no length, give the slot back at once. Latency is counted up
+        to the response headers.
+        """
+        token = self.acquire()
+        try:
+            resp = opener.open(req, **kwds)
+        except BaseException, e:
+            self.release(token, classify(e))
+            raise
+        hold = _Hold(self, token, self.clock() - token)
+        try:
+            length = resp.info()["Content-Length"]
+        except KeyError:
+            length = None
+        if req.get_method() == "HEAD" or length == "0":
+            hold.release()
+            return resp
+        hold.ref = weakref.ref(resp, lambda ref: hold.release())
+        with self._cond:
+            self._held.add(hold.ref)
+        def held(read, whole):
+            def held_read(*a, **k):
+                try:
+                    data = read(*a, **k)
+                except BaseException, e:
+                    hold.release(classify(e))
+                    raise
+                if (not data and a[:1] != (0,)) or (whole and not a):
+                    hold.release()
+                return data
+            return held_read
+        resp.read = held(resp.read, True)
+        resp.readline = held(resp.readline, False)
+        close = resp.close
+        def held_close():
+            hold.release()
+            close()
+        resp.close = held_close
+        return resp
+
+    def snapshot(self):
+        """Current limit, requests in flight and outcome counts, as a dict."""
+        with self._cond:
+            rv = dict(self.counts)
+            rv.update(limit=int(self.limit), in_flight=self.in_flight)
+            return rv
+
+class _Hold(object):
+    # A slot held for a response, given back once only.
+
+    def __init__(self, limiter, token, latency):
+        self.limiter = limiter
+        self.token = token
+        self.latency = latency
+        self.ref = None
+        self._lock = threading.Lock()
+
+    def release(self, outcome=OK):
+        with self._lock:
+            token, self.token = self.token, None
+        if token is None:
+            return
+        limiter = self.limiter
+        with limiter._cond:
+            limiter._held.discard(self.ref)
+        limiter.release(token, outcome, latency=self.latency)
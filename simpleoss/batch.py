@@ -0,0 +1,99 @@
+"""Running many bucket operations concurrently
+
+A `Batch` queues operations on a bucket and runs them on a pool of worker
+threads, handing back a `Future` for each::
+
+    >>> bucket.use_connection_pool(ConnectionPool(max_idle=16))
+    >>> with bucket.batch(n_workers=16) as batch:
+    ...     for name in names:
+    ...         batch.put(name, data[name])
+    ...     infos = [batch.info(name) for name in names]
+    >>> [info.result().size for info in infos]
+    [123, 456, ...]
+
+Leaving the ``with`` block waits for every operation, and raises a
+`BatchError` listing the ones that failed.
+"""
+
+from __future__ import with_statement
+
+from .bucket import OSSError
+from .workers import WorkerPool, as_completed
+
+class BatchError(OSSError):
+    """Some operations in a batch failed.
+
+    *errors* lists tuples of (operation, exception), where operation is a
+    (method name, args, kwds) tuple.
+    """
+
+    def __init__(self, errors, n_operations):
+        msg = "%d of %d operations failed" % (len(errors), n_operations)
+        super(BatchError, self).__init__(msg)
+        self.errors = errors
+
+class Batch(object):
+    """Operations on *bucket*, run concurrently on *n_workers* threads.
+
+    Operations are sent as the bucket sends anything. For connections to be
+    kept alive between them, give the bucket a connection pool with
+    `OSSBucket.use_connection_pool` before sharing it.
+    """
+
+    def __init__(self, bucket, n_workers=8):
+        self.bucket = bucket
+        self.pool = WorkerPool(n_workers)
+        self.operations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.wait()
+        else:
+            self.pool.shutdown(wait=False, cancel=True)
+
+    def submit(self, method, *args, **kwds):
+        """Queue `bucket.method(*args, **kwds)`, returning its `Future`."""
+        fn = getattr(self.bucket, method)
+        fut = self.pool.submit(fn, *args, **kwds)
+        self.operations.append(((method, args, kwds), fut))
+        return fut
+
+    def get(self, *args, **kwds): return self.submit("get", *args, **kwds)
+    def info(self, *args, **kwds): return self.submit("info", *args, **kwds)
+    def put(self, *args, **kwds): return self.submit("put", *args, **kwds)
+    def delete(self, *args, **kwds): return self.submit("delete", *args, **kwds)
+    def copy(self, *args, **kwds): return self.submit("copy", *args, **kwds)
+
+    @property
+    def futures(self):
+        """The futures of all operations, in the order they were queued."""
+        return [fut for (op, fut) in self.operations]
+
+    def as_completed(self):
+        """Yield the futures of operations queued so far as they finish."""
+        return as_completed(self.futures)
+
+    def wait(self):
+        """Wait for all operations, then raise a `BatchError` if any failed.
+
+        No more operations can be queued afterwards.
+        """
+        errors = []
+        for op, fut in self.operations:
+            exc = fut.exception()
+            if exc is not None:
+                errors.append((op, exc))
+        self.pool.shutdown()
+        if errors:
+            raise BatchError(errors, len(self.operations))
+
+    def results(self):
+        """Wait for all operations, and list their results in queued order.
+
+        Raises `BatchError` if any operation failed.
+        """
+        self.wait()
+        return [fut.result() for fut in self.futures]
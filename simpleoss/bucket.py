@@ -1,22 +1,33 @@
 """Bucket manipulation"""
 
-from __future__ import absolute_import
+from __future__ import absolute_import, with_statement
 
 import time
-import hmac
-import hashlib
-import httplib
-import urllib2
 import datetime
 import warnings
-from xml.etree import cElementTree as ElementTree
 from contextlib import contextmanager
-from urllib import quote_plus
 from base64 import b64encode
-from cgi import escape
+# What threading.local is, without importing all of threading.
+from thread import _local as thread_local
 
 from .utils import (_oss_canonicalize, metadata_headers, rfc822_fmtdate, _iso8601_dt,
-                    oss_md5, oss_urlquote, guess_mimetype, info_dict, expire2datetime)
+                    oss_md5, oss_urlquote, guess_mimetype, ObjectInfo, expire2datetime,
+                    urlquote_plus, xml_escape, lazy_module, lazy_class)
+
+# Slow to import, and not needed until requests are signed and sent.
+hmac = lazy_module("hmac")
+Queue = lazy_module("Queue")
+random = lazy_module("random")
+socket = lazy_module("socket")
+hashlib = lazy_module("hashlib")
+httplib = lazy_module("httplib")
+urllib2 = lazy_module("urllib2")
+ElementTree = lazy_module("xml.etree.cElementTree")
+
+# These live in simpleoss.transport, away from urllib2 until needed.
+AnyMethodRequest = lazy_class("simpleoss.transport", "AnyMethodRequest")
+StreamHTTPHandler = lazy_class("simpleoss.transport", "StreamHTTPHandler")
+StreamHTTPSHandler = lazy_class("simpleoss.transport", "StreamHTTPSHandler")
 
 aliyun_oss_domain = "oss-daily-test.aliyun-inc.com"
 aliyun_oss_ns_url = "http://%s/doc/2006-03-01/" % aliyun_oss_domain
@@ -65,25 +76,15 @@ class KeyNotFound(OSSError, KeyError):
     @property
     def key(self): return self.extra.get("key")
 
-class StreamHTTPHandler(urllib2.HTTPHandler):
-    pass
-
-class StreamHTTPSHandler(urllib2.HTTPSHandler):
-    pass
-
-class AnyMethodRequest(urllib2.Request):
-    def __init__(self, method, *args, **kwds):
-        self.method = method
-        urllib2.Request.__init__(self, *args, **kwds)
-
-    def get_method(self):
-        return self.method
+class ChecksumMismatch(OSSError):
+    @property
+    def key(self): return self.extra.get("key")
 
 class OSSRequest(object):
     urllib_request_cls = AnyMethodRequest
 
     def __init__(self, bucket=None, key=None, method="GET", headers={},
-                 args=None, data=None, subresource=None):
+                 args=None, data=None, subresource=None, timeout=None):
         headers = headers.copy()
         if data and "Content-MD5" not in headers:
             headers["Content-MD5"] = oss_md5(data)
@@ -98,6 +99,7 @@ class OSSRequest(object):
         self.args = args
         self.data = data
         self.subresource = subresource
+        self.timeout = timeout
 
     def __str__(self):
         return "<OSS %s request bucket %r key %r>" % (self.method, self.bucket, self.key)
@@ -121,7 +123,8 @@ class OSSRequest(object):
         if self.key is not None:
             res += "%s" % self.key
         if self.subresource:
-            res += "?%s" % oss_urlquote(self.subresource)
+            # Signed as is; quoting would mangle "partNumber=1&uploadId=..."
+            res += "?%s" % self.subresource
         return res
 
     def sign(self, cred):
@@ -133,9 +136,10 @@ class OSSRequest(object):
         self.headers["Authorization"] = "OSS %s:%s" % (cred.access_key, sign)
         return sign
 
-    def urllib(self, bucket):
-        return self.urllib_request_cls(self.method, self.url(bucket.base_url),
-                                       data=self.data, headers=self.headers)
+    def urllib(self, bucket, base_url=None):
+        url = self.url(base_url or bucket.base_url)
+        return self.urllib_request_cls(self.method, url, data=self.data,
+                                       headers=self.headers)
 
     def url(self, base_url, arg_sep="&"):
         url = base_url + "/"
@@ -149,7 +153,7 @@ class OSSRequest(object):
                 args = self.args
                 if hasattr(args, "iteritems"):
                     args = args.iteritems()
-                args = ((quote_plus(k), quote_plus(v)) for (k, v) in args)
+                args = ((urlquote_plus(k), urlquote_plus(v)) for (k, v) in args)
                 args = arg_sep.join("%s=%s" % i for i in args)
                 ps.append(args)
             url += "?" + "&".join(ps)
@@ -167,11 +171,17 @@ class OSSFile(str):
         return bucket.put(key, **self.kwds)
 
 class OSSListing(object):
-    """Representation of a single pageful of OSS bucket listing data."""
+    """Representation of a single pageful of OSS bucket listing data.
+
+    Iterating yields the keys on the page, those accepted by *item_filter*
+    if given (see `simpleoss.listfilter.ListingFilter`); *prefixes* holds the
+    common prefixes rolled up by a delimiter, if one was given.
+    """
 
     truncated = None
+    next_marker = None
 
-    def __init__(self, etree):
+    def __init__(self, etree, item_filter=None):
         # TODO Use SAX - processes XML before downloading entire response
         root = etree.getroot()
         expect_tag = self._mktag("ListBucketResult")
@@ -179,19 +189,37 @@ class OSSListing(object):
             raise ValueError("root tag mismatch, wanted %r but got %r"
                              % (expect_tag, root.tag))
         self.etree = etree
+        self.item_filter = item_filter
         trunc_text = root.findtext(self._mktag("IsTruncated"))
         self.truncated = {"true": True, "false": False}[trunc_text]
+        prefix_tag = self._mktag("CommonPrefixes") + "/" + self._mktag("Prefix")
+        self.prefixes = [el.text for el in root.findall(prefix_tag)]
+        # A page may consist of common prefixes only, so the marker for the
+        # next page cannot always be derived from the keys.
+        self.next_marker = root.findtext(self._mktag("NextMarker")) or None
+        if self.next_marker is None and self.prefixes:
+            self.next_marker = self.prefixes[-1]
 
     def __iter__(self):
         root = self.etree.getroot()
+        accept = self.item_filter
+        key_tag = self._mktag("Key")
         for entry in root.findall(self._mktag("Contents")):
-            item = self._el2item(entry)
-            yield item
-            self.next_marker = item[0]
+            if accept is None:
+                item = self._el2item(entry)
+                key = item[0]
+                yield item
+            else:
+                # Only decode entries passing the filter, which sees text.
+                key = entry.findtext(key_tag)
+                if accept(key, lambda tag: entry.findtext(self._mktag(tag))):
+                    yield self._el2item(entry)
+            if key > self.next_marker:
+                self.next_marker = key
 
     @classmethod
-    def parse(cls, resp):
-        return cls(ElementTree.parse(resp))
+    def parse(cls, resp, item_filter=None):
+        return cls(ElementTree.parse(resp), item_filter)
 
     def _mktag(self, name):
         return "{%s}%s" % (aliyun_oss_ns_url, name)
@@ -205,11 +233,36 @@ class OSSListing(object):
         return (key, modify, etag, size)
 
 class OSSBucket(object):
+    """The OSS bucket *name*.
+
+    A bucket may be shared by any number of threads once set up: options
+    for a single call, such as *timeout* and *headers*, are passed to that
+    call, and `timeout_disabled` only applies to the calling thread.
+    Configure the bucket (attributes, `use_connection_pool`) before sharing.
+    """
+
     default_encoding = "utf-8"
     n_retries = 10
+    #: Retries wait a random time up to this many seconds, doubling with
+    #: each retry up to *retry_backoff_max*.
+    retry_backoff = 0.05
+    retry_backoff_max = 5.0
+    rate_limiter = None
+    concurrency_limiter = None
+    hedge_policy = None
+    connection_pool = None
+    http2_pool = None
+    transfer_stats = None
+    recorder = None
+    check_crc64 = False
+    scheduler = None
+    memory_budget = None
 
     def __init__(self, name=None, access_key=None, secret_key=None,
-                 base_url=None, timeout=None, secure=False):
+                 base_url=None, timeout=None, secure=False, rate_limiter=None,
+                 concurrency_limiter=None, hedge_policy=None,
+                 connection_pool=None, transfer_stats=None, recorder=None,
+                 check_crc64=False, scheduler=None, memory_budget=None):
         scheme = ("http", "https")[int(bool(secure))]
         if not base_url:
             base_url = "%s://%s" % (scheme, aliyun_oss_domain)
@@ -219,12 +272,25 @@ class OSSBucket(object):
             if not base_url.startswith(scheme + "://"):
                 raise ValueError("secure=%r, url must use %s"
                                  % (secure, scheme))
+        self._local = thread_local()
         self.opener = self.build_opener()
         self.name = name
         self.access_key = access_key
         self.secret_key = secret_key
         self.base_url = base_url
         self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.hedge_policy = hedge_policy
+        self.transfer_stats = transfer_stats
+        self.recorder = recorder
+        self.check_crc64 = check_crc64
+        self.scheduler = scheduler
+        if memory_budget is not None:
+            # Otherwise leave any budget set on the class, for all buckets.
+            self.memory_budget = memory_budget
+        if connection_pool is not None:
+            self.use_connection_pool(connection_pool)
 
     def __str__(self):
         return "<%s %s at %r>" % (self.__class__.__name__, self.name, self.base_url)
@@ -248,62 +314,231 @@ class OSSBucket(object):
         else:
             return True
 
+    _timeout = None
+
+    def _get_timeout(self):
+        overrides = getattr(self._local, "timeouts", None)
+        if overrides:
+            return overrides[-1]
+        return self._timeout
+
+    def _set_timeout(self, timeout):
+        self._timeout = timeout
+
+    timeout = property(_get_timeout, _set_timeout, doc="""Default timeout
+        for requests, in seconds, as seen by the current thread.""")
+
     @contextmanager
     def timeout_disabled(self):
-        (prev_timeout, self.timeout) = (self.timeout, None)
+        """Send requests from this thread without a timeout, for a while."""
+        overrides = self._local.__dict__.setdefault("timeouts", [])
+        overrides.append(None)
         try:
             yield
         finally:
-            self.timeout = prev_timeout
+            overrides.pop()
 
     @classmethod
     def build_opener(cls):
-        return urllib2.build_opener(StreamHTTPHandler, StreamHTTPSHandler)
+        from .transport import build_opener
+        return build_opener()
+
+    def use_connection_pool(self, pool):
+        """Keep connections alive in `ConnectionPool` *pool* between requests."""
+        from .connpool import PooledHTTPHandler, PooledHTTPSHandler
+        self.connection_pool = pool
+        if self.opener is not None:
+            self.opener.add_handler(PooledHTTPHandler(pool))
+            self.opener.add_handler(PooledHTTPSHandler(pool))
+
+    def use_http2(self, pool=None):
+        """Send requests as HTTP/2 streams over the shared connections of
+        `simpleoss.http2.HTTP2Pool` *pool*, or a new one. Needs hyper.
+
+        It takes precedence over any connection pool for HTTP/1.1. A bucket
+        with a timeout needs a pool whose timeout is no longer.
+        """
+        from .http2 import HTTP2Pool, HTTP2Handler
+        if pool is None:
+            pool = HTTP2Pool(timeout=self.timeout)
+        if not pool.allows_timeout(self.timeout):
+            raise ValueError("the bucket's timeout of %rs needs an HTTP2Pool "
+                             "with one no longer, not %r"
+                             % (self.timeout, pool.timeout))
+        self.http2_pool = pool
+        if self.opener is not None:
+            self.opener.add_handler(HTTP2Handler(pool))
+
+    def warmup(self, n_connections=4, base_url=None):
+        """Open *n_connections* to OSS before traffic arrives.
+
+        The connections go to the host of *base_url*, by default the bucket's
+        own, and are kept in the bucket's connection pool, which is set up if
+        there is none. Returns the number of idle connections pooled.
+        """
+        if self.connection_pool is None:
+            from .connpool import ConnectionPool
+            self.use_connection_pool(ConnectionPool())
+        timeout = self.timeout or socket._GLOBAL_DEFAULT_TIMEOUT
+        return self.connection_pool.warm(base_url or self.base_url,
+                                         n_connections, timeout=timeout)
 
     def request(self, *a, **k):
         k.setdefault("bucket", self.name)
         return OSSRequest(*a, **k)
 
     def send(self, ossreq):
+        recorder = self.recorder
+        if recorder is None:
+            return self._send(ossreq)
+        start = recorder.clock()
+        try:
+            resp = self._send(ossreq)
+        except OSSError, e:
+            recorder.record(ossreq, start, error=e)
+            raise
+        recorder.record(ossreq, start, resp=resp)
+        return resp
+
+    def _send(self, ossreq):
         ossreq.sign(self)
         for retry_no in xrange(self.n_retries):
-            req = ossreq.urllib(self)
             try:
-                if self.timeout:
-                    return self.opener.open(req, timeout=self.timeout)
-                else:
-                    return self.opener.open(req)
+                return self._attempt(ossreq)
             except (urllib2.HTTPError, urllib2.URLError), e:
-                # If OSS gives HTTP 500, we should try again.
-                ecode = getattr(e, "code", None)
-                if ecode == 500:
-                    continue
-                elif ecode == 404:
-                    exc_cls = KeyNotFound
-                else:
-                    exc_cls = OSSError
-                raise exc_cls.from_urllib(e, key=ossreq.key)
+                if retry_no + 1 == self.n_retries or not self._should_retry(e):
+                    break
+                if getattr(e, "fp", None) is not None:
+                    # Let go of the connection while waiting.
+                    e.fp.close()
+                time.sleep(self._retry_delay(retry_no, e))
+        if getattr(e, "code", None) == 404:
+            exc_cls = KeyNotFound
         else:
-            raise RuntimeError("ran out of retries")  # Shouldn't happen.
+            exc_cls = OSSError
+        raise exc_cls.from_urllib(e, key=ossreq.key)
+
+    def _should_retry(self, e):
+        # If OSS gives HTTP 500, we should try again.
+        return getattr(e, "code", None) == 500
+
+    def _retry_delay(self, retry_no, e):
+        # Jittered, so that clients failing together don't all retry
+        # together, and longer when OSS asks for less traffic with a 503.
+        delay = self.retry_backoff * 2 ** retry_no
+        if getattr(e, "code", None) == 503:
+            delay *= 4
+        return random.uniform(0, min(delay, self.retry_backoff_max))
+
+    def _attempt(self, ossreq, base_url=None):
+        limiter, stats = self.rate_limiter, self.transfer_stats
+        req = ossreq.urllib(self, base_url)
+        if limiter:
+            limiter.acquire_request()
+            req.add_data(limiter.wrap_upload(req.get_data()))
+        upload = None
+        if stats and req.has_data():
+            upload = stats.track_upload(req)
+        timeout = ossreq.timeout
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            resp = self._open(req, timeout)
+        except:
+            # A retry is a transfer of its own.
+            if upload:
+                upload.abort()
+            raise
+        if upload:
+            upload.finish()
+        if limiter:
+            limiter.wrap_response(resp)
+        if stats and ossreq.method == "GET":
+            stats.track_download(resp)
+        return resp
+
+    def send_idempotent(self, ossreq):
+        """Send *ossreq*, which must be safe to repeat, hedging if enabled."""
+        if self.hedge_policy:
+            return self.hedge_policy.send(self, ossreq)
+        return self.send(ossreq)
+
+    def _open(self, req, timeout=None):
+        if not self.scheduler:
+            return self._open_limited(req, timeout)
+        with self.scheduler.slot(req):
+            return self._open_limited(req, timeout)
+
+    def _open_limited(self, req, timeout=None):
+        kwds = {"timeout": timeout} if timeout else {}
+        if not self.concurrency_limiter:
+            return self.opener.open(req, **kwds)
+        return self.concurrency_limiter.open(self.opener, req, **kwds)
 
     def make_request(self, *a, **k):
         warnings.warn(DeprecationWarning("make_request() is deprecated, "
                                          "use request() and send()"))
         return self.send(self.request(*a, **k))
 
-    def get(self, key):
-        response = self.send(self.request(key=key))
-        response.oss_info = info_dict(dict(response.info()))
+    def get(self, key, headers={}, timeout=None):
+        """Get *key*, sending extra *headers* such as Range.
+
+        *timeout*, if given, overrides the bucket's for this request. If the
+        bucket checks CRCs, whole objects are checked as they are read.
+        """
+        ossreq = self.request(key=key, headers=headers, timeout=timeout)
+        response = self.send_idempotent(ossreq)
+        response.oss_info = ObjectInfo(response.info())
+        if (self.check_crc64 and "Range" not in headers
+                and getattr(response, "code", 200) != 206):
+            from .crc64 import check_response
+            check_response(response, key=key)
         return response
 
-    def info(self, key):
-        response = self.send(self.request(method="HEAD", key=key))
-        rv = info_dict(dict(response.info()))
+    def open(self, key, mode="rb", **kwds):
+        """Open *key* as a file object.
+
+        Mode "rb" gives a seekable `OSSReader`, which reads through Range
+        requests; mode "wb" gives an `OSSWriter`, which uploads as it is
+        written to. Keyword arguments go to these.
+        """
+        from . import objfile
+        if mode in ("r", "rb"):
+            return objfile.OSSReader(self, key, **kwds)
+        elif mode in ("w", "wb"):
+            return objfile.OSSWriter(self, key, **kwds)
+        raise ValueError("unsupported mode %r" % (mode,))
+
+    def info(self, key, headers={}, timeout=None):
+        ossreq = self.request(method="HEAD", key=key, headers=headers,
+                              timeout=timeout)
+        response = self.send_idempotent(ossreq)
+        rv = ObjectInfo(response.info())
         response.close()
         return rv
 
     def put(self, key, data=None, acl=None, metadata={}, mimetype=None,
-            transformer=None, headers={}):
+            transformer=None, headers={}, timeout=None):
+        ossreq = self._put_request(key, data, acl=acl, metadata=metadata,
+                                   mimetype=mimetype, transformer=transformer,
+                                   headers=headers, timeout=timeout)
+        if not self.check_crc64:
+            self.send(ossreq).close()
+            return
+        from . import crc64
+        if hasattr(ossreq.data, "read"):
+            ossreq.data = crc64.CRC64File(ossreq.data)
+            resp = self.send(ossreq)
+            crc = ossreq.data.crc.crc
+        else:
+            resp = self.send(ossreq)
+            crc = crc64.crc64(ossreq.data or "")
+        resp.close()
+        crc64.verify(ObjectInfo(resp.info()), crc, key=key)
+
+    def _put_request(self, key, data=None, acl=None, metadata={},
+                     mimetype=None, transformer=None, headers={},
+                     timeout=None):
         if isinstance(data, unicode):
             data = data.encode(self.default_encoding)
         headers = headers.copy()
@@ -318,10 +553,11 @@ class OSSBucket(object):
             headers["Content-Length"] = str(len(data))
         if "Content-MD5" not in headers:
             headers["Content-MD5"] = oss_md5(data)
-        ossreq = self.request(method="PUT", key=key, data=data, headers=headers)
-        self.send(ossreq).close()
+        return self.request(method="PUT", key=key, data=data, headers=headers,
+                            timeout=timeout)
 
     def delete(self, *keys):
+        """Delete *keys*, returning whether all of them were deleted."""
         n_keys = len(keys)
         if not keys:
             raise TypeError("required one key at least")
@@ -335,23 +571,43 @@ class OSSBucket(object):
                 e.fp.close()
                 return False
             else:
+                resp.close()
                 return 200 <= resp.code < 300
         else:
-            if n_keys > 1000:
-                raise ValueError("cannot delete more than 1000 keys at a time")
-            fmt = "<Object><Key>%s</Key></Object>"
-            body = "".join(fmt % escape(k) for k in keys)
-            data = ('<?xml version="1.0" encoding="UTF-8"?><Delete>'
-                    "<Quiet>true</Quiet>%s</Delete>") % body
-            headers = {"Content-Type": "multipart/form-data"}
-            resp = self.send(self.request(method="POST", data=data,
-                                          headers=headers, subresource="delete"))
-            return 200 <= resp.code < 300
+            return not self.delete_many(keys)
+
+    def delete_many(self, keys):
+        """Delete up to 1000 *keys* in one request, returning those that
+        could not be as a list of (key, error code, message)."""
+        if len(keys) > 1000:
+            raise ValueError("cannot delete more than 1000 keys at a time")
+        fmt = "<Object><Key>%s</Key></Object>"
+        body = "".join(fmt % xml_escape(k) for k in keys)
+        data = ('<?xml version="1.0" encoding="UTF-8"?><Delete>'
+                "<Quiet>true</Quiet>%s</Delete>") % body
+        headers = {"Content-Type": "multipart/form-data"}
+        resp = self.send(self.request(method="POST", data=data,
+                                      headers=headers, subresource="delete"))
+        try:
+            data = resp.read()
+        finally:
+            resp.close()
+        # Quiet mode only lists the keys that failed, if any.
+        failed = []
+        if not data.strip():
+            return failed
+        for el in ElementTree.fromstring(data).getiterator():
+            if el.tag.rpartition("}")[2] == "Error":
+                fields = dict((sub.tag.rpartition("}")[2], sub.text)
+                              for sub in el)
+                failed.append((fields.get("Key"), fields.get("Code"),
+                               fields.get("Message")))
+        return failed
 
     # TODO Expose the conditional headers, x-oss-copy-source-if-*
     # TODO Add module-level documentation and doctests.
     def copy(self, source, key, acl=None, metadata=None,
-             mimetype=None, headers={}):
+             mimetype=None, headers={}, timeout=None):
         """Copy OSS file *source* on format '<bucket>/<key>' to *key*.
 
         If metadata is not None, replaces the metadata with given metadata,
@@ -368,12 +624,83 @@ class OSSBucket(object):
             headers.update(metadata_headers(metadata))
         else:
             headers["x-oss-metadata-directive"] = "COPY"
-        self.send(self.request(method="PUT", key=key, headers=headers)).close()
+        ossreq = self.request(method="PUT", key=key, headers=headers,
+                              timeout=timeout)
+        self.send(ossreq).close()
+
+    def initiate_multipart(self, key, acl=None, metadata={}, mimetype=None,
+                           headers={}):
+        """Start a multipart upload to *key*, returning its upload ID."""
+        headers = headers.copy()
+        headers["Content-Type"] = str(mimetype or guess_mimetype(key))
+        headers.update(metadata_headers(metadata))
+        if acl: headers["x-oss-object-acl"] = acl
+        resp = self.send(self.request(method="POST", key=key, headers=headers,
+                                      subresource="uploads"))
+        try:
+            root = ElementTree.parse(resp).getroot()
+        finally:
+            resp.close()
+        # Tags may or may not be namespaced.
+        for el in root:
+            if el.tag.rpartition("}")[2] == "UploadId":
+                return el.text
+        raise OSSError("no UploadId in response", key=key)
+
+    def upload_part(self, key, upload_id, part_no, data, timeout=None,
+                    crc=None):
+        """Upload *data* as part *part_no* (from 1) of a multipart upload,
+        returning the part's ETag.
+
+        If the bucket checks CRCs, the part is checked against *crc*, or the
+        CRC of *data* if not given.
+        """
+        # Without a Content-Type, urllib2 would send a form type that the
+        # request wasn't signed with.
+        headers = {"Content-Length": str(len(data)),
+                   "Content-Type": "application/octet-stream"}
+        subresource = "partNumber=%d&uploadId=%s" % (part_no, upload_id)
+        ossreq = self.request(method="PUT", key=key, data=data, headers=headers,
+                              subresource=subresource, timeout=timeout)
+        resp = self.send(ossreq)
+        resp.close()
+        info = ObjectInfo(resp.info())
+        if self.check_crc64:
+            from . import crc64
+            if crc is None:
+                crc = crc64.crc64(data)
+            crc64.verify(info, crc, key=key)
+        return info.etag
+
+    def complete_multipart(self, key, upload_id, parts, crc=None):
+        """Finish a multipart upload from *parts*, (part_no, etag) pairs.
+
+        If the bucket checks CRCs and *crc* is given, the object is checked
+        against it.
+        """
+        fmt = "<Part><PartNumber>%d</PartNumber><ETag>%s</ETag></Part>"
+        body = "".join(fmt % (n, xml_escape(etag)) for (n, etag) in sorted(parts))
+        data = "<CompleteMultipartUpload>%s</CompleteMultipartUpload>" % body
+        headers = {"Content-Type": "application/xml"}
+        resp = self.send(self.request(method="POST", key=key, data=data,
+                                      headers=headers,
+                                      subresource="uploadId=%s" % upload_id))
+        resp.close()
+        if self.check_crc64 and crc is not None:
+            from .crc64 import verify
+            verify(ObjectInfo(resp.info()), crc, key=key)
 
-    def _get_listing(self, args):
-        return OSSListing.parse(self.send(self.request(key='', args=args)))
+    def abort_multipart(self, key, upload_id):
+        """Abandon a multipart upload, discarding the parts uploaded."""
+        self.send(self.request(method="DELETE", key=key,
+                               subresource="uploadId=%s" % upload_id)).close()
 
-    def listdir(self, prefix=None, marker=None, limit=None, delimiter=None):
+    def _get_listing(self, args, item_filter=None):
+        return OSSListing.parse(self.send(self.request(key='', args=args)),
+                                item_filter)
+
+    def listdir(self, prefix=None, marker=None, limit=None, delimiter=None,
+                **filters):
         """List bucket contents.
 
         Yields tuples of (key, modified, etag, size).
@@ -381,29 +708,102 @@ class OSSBucket(object):
         *prefix*, if given, predicates `key.startswith(prefix)`.
         *marker*, if given, predicates `key > marker`, lexicographically.
         *limit*, if given, predicates `len(keys) <= limit`.
+        *delimiter*, if given, rolls keys up into common prefixes, which are
+        skipped here; use `walk` to browse them.
 
         *key* will include the *prefix* if any is given.
 
+        Keyword arguments *glob*, *regex*, *suffix*, *min_size*, *max_size*,
+        *modified_after* and *modified_before* filter the keys while the
+        listing is parsed; see `simpleoss.listfilter.ListingFilter`. *limit*
+        applies before filtering.
+
         .. note:: This method can make several requests to OSS if the listing is
                   very long.
         """
+        item_filter = None
+        if filters:
+            from .listfilter import ListingFilter, glob_prefix
+            item_filter = ListingFilter(**filters)
+            if prefix is None and item_filter.glob:
+                prefix = glob_prefix(item_filter.glob) or None
         m = (("prefix", prefix),
              ("marker", marker),
              ("max-keys", limit),
              ("delimiter", delimiter))
         args = dict((str(k), str(v)) for (k, v) in m if v is not None)
 
-        listing = self._get_listing(args)
+        listing = self._get_listing(args, item_filter)
         while listing:
             for item in listing:
                 yield item
 
             if listing.truncated:
                 args["marker"] = listing.next_marker
-                listing = self._get_listing(args)
+                listing = self._get_listing(args, item_filter)
             else:
                 break
 
+    def _list_level(self, prefix, delimiter):
+        args = {"prefix": prefix, "delimiter": delimiter}
+        prefixes, items = [], []
+        while True:
+            listing = self._get_listing(args)
+            items.extend(listing)
+            prefixes.extend(listing.prefixes)
+            if not listing.truncated:
+                return prefixes, items
+            args["marker"] = listing.next_marker
+
+    def walk(self, prefix="", delimiter="/", n_workers=8):
+        """Walk the bucket hierarchy below *prefix*, much like `os.walk`.
+
+        Yields tuples of (prefix, subprefixes, items) where *items* are
+        `listdir` tuples. Each level is listed by one of *n_workers* threads,
+        so sibling prefixes are traversed in parallel, and levels are yielded
+        as they finish rather than in lexicographical order.
+
+        As with `os.walk`, removing entries from *subprefixes* in place
+        prunes them from the walk.
+        """
+        from .workers import WorkerPool
+        pool = WorkerPool(n_workers)
+        finished = Queue.Queue()
+        def submit(prefix):
+            fut = pool.submit(self._list_level, prefix, delimiter)
+            fut.add_done_callback(lambda fut: finished.put((prefix, fut)))
+        try:
+            submit(prefix)
+            n_pending = 1
+            while n_pending:
+                prefix, fut = finished.get()
+                n_pending -= 1
+                subprefixes, items = fut.result()
+                yield prefix, subprefixes, items
+                for subprefix in subprefixes:
+                    submit(subprefix)
+                    n_pending += 1
+        finally:
+            pool.shutdown(wait=False, cancel=True)
+
+    def batch(self, n_workers=8):
+        """Queue operations to run concurrently, getting futures back; see
+        `simpleoss.batch.Batch`."""
+        from .batch import Batch
+        return Batch(self, n_workers)
+
+    def upload_tree(self, local_dir, prefix="", **kwds):
+        """Upload the files below *local_dir* under *prefix*, hashing and
+        uploading concurrently; see `simpleoss.upload.upload_tree`."""
+        from .upload import upload_tree
+        return upload_tree(self, local_dir, prefix, **kwds)
+
+    def move_prefix(self, src, dst, **kwds):
+        """Move the keys under *src* to *dst* with concurrent copies and
+        batched deletes; see `simpleoss.move.move_prefix`."""
+        from .move import move_prefix
+        return move_prefix(self, src, dst, **kwds)
+
     def make_url(self, key, args=None, arg_sep=";"):
         ossreq = self.request(key=key, args=args)
         return ossreq.url(self.base_url, arg_sep=arg_sep)
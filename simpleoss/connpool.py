@@ -0,0 +1,316 @@
+"""Persistent connections and DNS caching for buckets
+
+By default urllib2 opens, and tears down, a connection per request. Given a
+`ConnectionPool`, a bucket instead keeps connections alive between requests,
+and can open a number of them ahead of time::
+
+    >>> pool = ConnectionPool(resolver=CachingResolver(ttl=60))
+    >>> bucket = OSSBucket("my-bucket", connection_pool=pool)
+    >>> bucket.warmup(8)
+    8
+
+With a `CachingResolver`, host names are looked up once per *ttl* seconds
+rather than once per connection.
+"""
+
+from __future__ import with_statement
+
+import time
+import errno
+import socket
+import httplib
+import urllib2
+import threading
+from urllib import addinfourl
+from urlparse import urlsplit
+
+class CachingResolver(object):
+    """Resolve host names through *getaddrinfo*, remembering the answers.
+
+    Answers are kept for *ttl* seconds. When a name resolves to several
+    addresses, connections are spread across them in turn.
+    """
+
+    def __init__(self, ttl=60.0, clock=time.time,
+                 getaddrinfo=socket.getaddrinfo):
+        self.ttl = ttl
+        self.clock = clock
+        self.getaddrinfo = getaddrinfo
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host, port):
+        """List the (family, socktype, proto, sockaddr) to try for *host*."""
+        now = self.clock()
+        with self._lock:
+            entry = self._cache.get((host, port))
+            if entry and entry[0] > now:
+                addrs = entry[1]
+                # Rotate for the next caller.
+                addrs.append(addrs.pop(0))
+                return list(addrs)
+        infos = self.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+        addrs = [(af, st, proto, sa) for (af, st, proto, cn, sa) in infos]
+        with self._lock:
+            self._cache[host, port] = (now + self.ttl, list(addrs))
+        return addrs
+
+    def forget(self, host=None):
+        """Drop cached answers for *host*, or all of them."""
+        with self._lock:
+            for key in list(self._cache):
+                if host is None or key[0] == host:
+                    del self._cache[key]
+
+    def create_connection(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT,
+                          source_address=None):
+        """Like `socket.create_connection`, but resolving through the cache."""
+        host, port = address
+        err = None
+        for af, socktype, proto, sa in self.resolve(host, port):
+            sock = None
+            try:
+                sock = socket.socket(af, socktype, proto)
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sa)
+                return sock
+            except socket.error, err:
+                if sock is not None:
+                    sock.close()
+        # Every address failed, so the cached answer may well be stale.
+        self.forget(host)
+        if err is not None:
+            raise err
+        raise socket.error("getaddrinfo returns an empty list")
+
+class Unanswered(httplib.HTTPException):
+    """The connection failed before any of the response came, so the server
+    can't have acted on the request; raised in place of socket error *err*.
+    """
+
+    def __init__(self, err):
+        httplib.HTTPException.__init__(self, err)
+        self.err = err
+
+_reset_errnos = (errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE)
+
+class PooledHTTPResponse(httplib.HTTPResponse):
+    """Tells a connection closed before any response, which is safe to send
+    the request again on, from one failing later."""
+
+    def _read_status(self):
+        try:
+            return httplib.HTTPResponse._read_status(self)
+        except socket.timeout:
+            raise
+        except socket.error, err:
+            if err.errno in _reset_errnos:
+                raise Unanswered(err)
+            raise
+        except httplib.BadStatusLine, err:
+            if not err.line or err.line.startswith("No status line"):
+                raise Unanswered(err)
+            raise
+
+class ConnectionPool(object):
+    """Idle keep-alive connections, at most *max_idle* per host.
+
+    Safe to share between threads and buckets; a connection is only ever
+    handed to one request at a time.
+    """
+
+    connection_classes = {"http": httplib.HTTPConnection,
+                          "https": httplib.HTTPSConnection}
+
+    def __init__(self, max_idle=16, resolver=None):
+        self.max_idle = max_idle
+        self.resolver = resolver
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(conns) for conns in self._idle.itervalues())
+
+    def connect(self, scheme, host, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """Make a new, not yet connected, connection to *host*."""
+        conn = self.connection_classes[scheme](host, timeout=timeout)
+        conn.response_class = PooledHTTPResponse
+        if self.resolver:
+            conn._create_connection = self.resolver.create_connection
+        return conn
+
+    def get(self, scheme, host, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """Get an idle connection to *host*, or a new one.
+
+        Returns a tuple (connection, reused).
+        """
+        with self._lock:
+            conns = self._idle.get((scheme, host))
+            conn = conns and conns.pop()
+        if conn:
+            if conn.sock is not None:
+                conn.sock.settimeout(None if timeout is socket._GLOBAL_DEFAULT_TIMEOUT
+                                     else timeout)
+            conn.timeout = timeout
+            return conn, True
+        return self.connect(scheme, host, timeout=timeout), False
+
+    def put(self, scheme, host, conn):
+        """Return *conn* to the pool, or close it if the pool is full."""
+        with self._lock:
+            conns = self._idle.setdefault((scheme, host), [])
+            if len(conns) < self.max_idle:
+                conns.append(conn)
+                return
+        conn.close()
+
+    def warm(self, url, n_connections, timeout=socket._GLOBAL_DEFAULT_TIMEOUT):
+        """Open *n_connections* to the host of *url* and pool them.
+
+        Connections already idle in the pool count towards the number, and
+        the number of connections now idle is returned.
+        """
+        scheme, host = urlsplit(url)[:2]
+        with self._lock:
+            n_idle = len(self._idle.get((scheme, host), ()))
+        for i in xrange(n_idle, min(n_connections, self.max_idle)):
+            conn = self.connect(scheme, host, timeout=timeout)
+            conn.connect()
+            self.put(scheme, host, conn)
+            n_idle += 1
+        return n_idle
+
+    def clear(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.itervalues():
+            for conn in conns:
+                conn.close()
+
+class PooledResponseFile(object):
+    """File object over HTTP response *r* which hands its connection back
+    through *release(reusable)* once the body is read or closed."""
+
+    def __init__(self, r, release):
+        self._r = r
+        r.recv = r.read
+        self._fp = socket._fileobject(r, close=True)
+        self._release = release
+        self._check()
+
+    def _check(self):
+        r = self._r
+        if not self._release:
+            return
+        if not r.isclosed() and r.length == 0 and not r.chunked:
+            # Bodiless responses, such as to HEAD, are done from the start.
+            r.close()
+        if r.isclosed():
+            release, self._release = self._release, None
+            release(not r.will_close)
+
+    def read(self, *a):
+        data = self._fp.read(*a)
+        self._check()
+        return data
+
+    def readline(self, *a):
+        line = self._fp.readline(*a)
+        self._check()
+        return line
+
+    def readlines(self, *a):
+        lines = self._fp.readlines(*a)
+        self._check()
+        return lines
+
+    def close(self):
+        self._check()
+        if self._release:
+            # Unread data is left on the connection, so it can't be reused.
+            release, self._release = self._release, None
+            release(False)
+        self._fp.close()
+
+class PooledHandlerMixin(object):
+    # Run before the stock handlers, which would open a connection each.
+    handler_order = urllib2.HTTPHandler.handler_order - 1
+
+    #: Requests with these methods are sent again, once, if a kept-alive
+    #: connection turns out to have been closed before they got an answer.
+    resend_methods = frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS"])
+
+    def __init__(self, pool):
+        urllib2.AbstractHTTPHandler.__init__(self)
+        self.pool = pool
+
+    def pooled_open(self, scheme, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError("no host given")
+        headers = dict(req.unredirected_hdrs)
+        headers.update(req.headers)
+        headers["Connection"] = "keep-alive"
+        headers = dict((name.title(), val) for name, val in headers.items())
+        conn, reused = self.pool.get(scheme, host, timeout=req.timeout)
+        try:
+            r = self._roundtrip(conn, req, headers)
+        except (socket.error, httplib.HTTPException), err:
+            conn.close()
+            if not (reused and self._may_resend(req, err)):
+                raise urllib2.URLError(getattr(err, "err", err))
+            # The server may well have timed out the idle connection; retry
+            # once on a fresh one.
+            data = req.get_data()
+            if hasattr(data, "seek"):
+                data.seek(0)
+            conn = self.pool.connect(scheme, host, timeout=req.timeout)
+            try:
+                r = self._roundtrip(conn, req, headers)
+            except (socket.error, httplib.HTTPException), err:
+                conn.close()
+                raise urllib2.URLError(getattr(err, "err", err))
+
+        def release(reusable):
+            if reusable:
+                self.pool.put(scheme, host, conn)
+            else:
+                conn.close()
+        resp = addinfourl(PooledResponseFile(r, release), r.msg,
+                          req.get_full_url())
+        resp.code = r.status
+        resp.msg = r.reason
+        return resp
+
+    def _may_resend(self, req, err):
+        # Only if the server can't have acted on it, and it would do no harm
+        # if it had: never after a timeout, which may just be a slow answer.
+        if not isinstance(err, Unanswered):
+            return False
+        if req.get_method() not in self.resend_methods:
+            return False
+        data = req.get_data()
+        return data is None or isinstance(data, str) or hasattr(data, "seek")
+
+    def _roundtrip(self, conn, req, headers):
+        try:
+            conn.request(req.get_method(), req.get_selector(), req.get_data(),
+                         headers)
+        except socket.timeout:
+            raise
+        except socket.error, err:
+            raise Unanswered(err)
+        return conn.getresponse()
+
+class PooledHTTPHandler(PooledHandlerMixin, urllib2.HTTPHandler):
+    def http_open(self, req):
+        return self.pooled_open("http", req)
+
+class PooledHTTPSHandler(PooledHandlerMixin, urllib2.HTTPSHandler):
+    def https_open(self, req):
+        return self.pooled_open("https", req)
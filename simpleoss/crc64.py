@@ -0,0 +1,206 @@
+"""CRC-64/ECMA checksums, as OSS gives in ``x-oss-hash-crc64ecma``
+
+Unlike MD5, a CRC can be computed as data streams past, and the CRCs of
+parts can be combined into the CRC of the whole without seeing the data
+again::
+
+    >>> crc64("123456789")
+    11051210869376104954L
+    >>> a, b = crc64("12345"), crc64("6789")
+    >>> crc64_combine(a, b, 4) == crc64("123456789")
+    True
+
+A bucket with *check_crc64* set checks what it uploads and whole objects it
+downloads against the CRC OSS reports, raising `ChecksumMismatch` when they
+differ.
+
+The CRC is computed by the C extension of ``crcmod`` when that is installed,
+which is faster than MD5. Without it, a pure Python slicing-by-8 version is
+used, at a few MB/s.
+"""
+
+from __future__ import with_statement
+
+import struct
+import threading
+
+from .bucket import ChecksumMismatch
+
+#: The ECMA-182 polynomial, bit-reversed.
+poly = 0xC96C5795D7870F42
+_mask = 0xFFFFFFFFFFFFFFFF
+
+def _make_tables():
+    # _tables[k][b] is the CRC of byte b followed by k zero bytes.
+    t0 = []
+    for i in xrange(256):
+        crc = i
+        for _ in xrange(8):
+            crc = (crc >> 1) ^ poly if crc & 1 else crc >> 1
+        t0.append(crc)
+    tables = [t0]
+    for k in xrange(1, 8):
+        prev = tables[-1]
+        tables.append([(prev[b] >> 8) ^ t0[prev[b] & 0xff] for b in xrange(256)])
+    return tables
+
+_tables = _make_tables()
+
+def _py_crc64(data, crc=0):
+    t0, t1, t2, t3, t4, t5, t6, t7 = _tables
+    crc ^= _mask
+    n_words = len(data) // 8
+    if n_words:
+        for word in struct.unpack("<%dQ" % n_words, buffer(data, 0, n_words * 8)):
+            x = crc ^ word
+            crc = (t7[x & 0xff] ^ t6[(x >> 8) & 0xff] ^
+                   t5[(x >> 16) & 0xff] ^ t4[(x >> 24) & 0xff] ^
+                   t3[(x >> 32) & 0xff] ^ t2[(x >> 40) & 0xff] ^
+                   t1[(x >> 48) & 0xff] ^ t0[x >> 56])
+    for b in bytearray(buffer(data, n_words * 8)):
+        crc = t0[(crc ^ b) & 0xff] ^ (crc >> 8)
+    return crc ^ _mask
+
+try:
+    import crcmod
+    _crc64 = crcmod.mkCrcFun(0x142F0E1EBA9EA3693, initCrc=0, xorOut=_mask,
+                             rev=True)
+except ImportError:
+    _crc64 = _py_crc64
+
+def crc64(data, crc=0):
+    """The CRC-64 of *data*, continuing from *crc*, the CRC of what came
+    before it."""
+    return _crc64(data, crc)
+
+def _gf2_times(mat, vec):
+    rv = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            rv ^= mat[i]
+        vec >>= 1
+        i += 1
+    return rv
+
+def _gf2_square(mat):
+    return [_gf2_times(mat, mat[n]) for n in xrange(64)]
+
+# _shift_ops[k] is the matrix advancing a CRC over 2 ** k zero bytes.
+_shift_ops = []
+_shift_lock = threading.Lock()
+
+def _shift_op(k):
+    with _shift_lock:
+        while len(_shift_ops) <= k:
+            if _shift_ops:
+                op = _gf2_square(_shift_ops[-1])
+            else:
+                op = [poly] + [1 << n for n in xrange(63)]  # One zero bit.
+                for i in xrange(3):
+                    op = _gf2_square(op)
+            _shift_ops.append(op)
+        return _shift_ops[k]
+
+def crc64_combine(crc1, crc2, len2):
+    """The CRC of data *A* + *B*, given *crc1* of *A*, and *crc2* and length
+    *len2* of *B*.
+
+    This is the GF(2) matrix method of zlib's ``crc32_combine``.
+    """
+    k = 0
+    while len2:
+        if len2 & 1:
+            crc1 = _gf2_times(_shift_op(k), crc1)
+        len2 >>= 1
+        k += 1
+    return crc1 ^ crc2
+
+class CRC64(object):
+    """Incremental CRC-64 of the data given to `update`, of *length* bytes.
+
+    >>> h = CRC64("12345")
+    >>> h.update("6789")
+    >>> h.crc == crc64("123456789"), h.length
+    (True, 9)
+    """
+
+    __slots__ = ("crc", "length")
+
+    def __init__(self, data="", crc=0, length=0):
+        self.crc = crc
+        self.length = length
+        if data:
+            self.update(data)
+
+    def __repr__(self):
+        return "<%s %d bytes, %d>" % (self.__class__.__name__, self.length,
+                                      self.crc)
+
+    def update(self, data):
+        self.crc = crc64(data, self.crc)
+        self.length += len(data)
+
+    def copy(self):
+        return self.__class__(crc=self.crc, length=self.length)
+
+    def combine(self, other):
+        """The `CRC64` of this data followed by that of *other*."""
+        return self.__class__(crc=crc64_combine(self.crc, other.crc,
+                                                other.length),
+                              length=self.length + other.length)
+
+class CRC64File(object):
+    """Computes the CRC of what is read from *fp*, as `crc`, a `CRC64`."""
+
+    __slots__ = ("fp", "crc")
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.crc = CRC64()
+
+    def __getattr__(self, attnam):
+        return getattr(self.fp, attnam)
+
+    def read(self, *a, **k):
+        chunk = self.fp.read(*a, **k)
+        self.crc.update(chunk)
+        return chunk
+
+    def seek(self, offset, whence=0):
+        """Rewind to the start, as when a request is sent again; the CRC
+        starts over too."""
+        if (offset, whence) != (0, 0):
+            raise IOError("can only seek to the start")
+        self.fp.seek(0)
+        self.crc = CRC64()
+
+def verify(info, crc, key=None):
+    """Raise `ChecksumMismatch` if `ObjectInfo` *info* has a CRC other than
+    *crc*. Responses without one pass."""
+    expected = info.crc64
+    if expected is not None and expected != crc:
+        raise ChecksumMismatch("CRC64 mismatch", key=key, expected=expected,
+                               actual=crc)
+
+def check_response(resp, key=None):
+    """Check the body of whole-object response *resp* against its CRC as it
+    is read, raising `ChecksumMismatch` on the read that completes it."""
+    info = resp.oss_info
+    size = info.size
+    crc = CRC64()
+    checked = [info.crc64 is None]
+    def update(chunk, at_eof):
+        crc.update(chunk)
+        if (at_eof or not chunk or crc.length == size) and not checked[0]:
+            checked[0] = True
+            verify(info, crc.crc, key=key)
+        return chunk
+    read, readline = resp.read, resp.readline
+    def checked_read(amt=None):
+        if amt is None or amt < 0:
+            return update(read(), True)
+        return update(read(amt), False)
+    resp.read = checked_read
+    resp.readline = lambda *a, **k: update(readline(*a, **k), False)
+    return resp
@@ -0,0 +1,281 @@
+"""Client-side encryption in independently decryptable frames
+
+A `FrameCipher` encrypts content as it is uploaded and decrypts it as it is
+read, holding no more than a frame at a time::
+
+    >>> cipher = FrameCipher(key)
+    >>> bucket.put_file("backups/db.dump", "db.dump", encryption=cipher)
+    >>> fp = cipher.open(bucket, "backups/db.dump")
+    >>> fp.seek(10 << 30)
+    >>> fp.read(100)
+
+Content is cut into frames of *frame_size* bytes, each sealed with AES-GCM
+on its own, so that reading from the middle of an object only fetches and
+decrypts the frames covering that span.
+
+The format is a header of the magic ``OSSENC01``, the frame size as a
+big-endian 32-bit integer and an 8-byte random nonce prefix, followed by the
+frames, each its ciphertext and a 16-byte tag. The last frame is shorter
+than the frame size, if need be empty, so truncation is detected. A frame's
+nonce is the prefix and its 32-bit index, and it authenticates the header
+and whether it is the last.
+
+AES-GCM comes from the ``cryptography`` package, which must be installed
+unless another AEAD with the same interface is given.
+"""
+
+import io
+import os
+import struct
+
+from .objfile import OSSReader
+
+magic = "OSSENC01"
+header_format = ">8sI8s"
+header_size = struct.calcsize(header_format)
+tag_size = 16
+
+class DecryptionError(ValueError):
+    """Content failed authentication: it was altered, truncated, or the key
+    is wrong."""
+
+def _read_full(fp, n):
+    chunks = []
+    while n > 0:
+        chunk = fp.read(n)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        n -= len(chunk)
+    return "".join(chunks)
+
+class FrameCipher(object):
+    """Encrypt and decrypt with AES-GCM key *key* (16, 24 or 32 bytes), in
+    frames of *frame_size* bytes of plaintext.
+
+    *aead*, if given, replaces AES-GCM: an object with methods
+    ``encrypt(nonce, data, associated_data)`` and ``decrypt(nonce, data,
+    associated_data)``, like ``cryptography``'s ``AESGCM``, adding a
+    16-byte tag.
+    """
+
+    def __init__(self, key, frame_size=64 << 10, aead=None):
+        if aead is None:
+            from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+            aead = AESGCM(key)
+        self.aead = aead
+        self.frame_size = frame_size
+
+    @staticmethod
+    def generate_key():
+        return os.urandom(32)
+
+    def encrypted_size(self, size):
+        """The size of *size* bytes once encrypted."""
+        n_frames = size // self.frame_size + 1
+        return header_size + n_frames * tag_size + size
+
+    def make_header(self):
+        return struct.pack(header_format, magic, self.frame_size, os.urandom(8))
+
+    def seal(self, header, index, data, last):
+        """Encrypt frame number *index* of the object with *header*."""
+        if index > 0xffffffff:
+            raise ValueError("too many frames, use a larger frame_size")
+        prefix = header[-8:]
+        aad = header + ("\x01" if last else "\x00")
+        return self.aead.encrypt(prefix + struct.pack(">I", index), data, aad)
+
+    def unseal(self, header, index, data, last):
+        """Decrypt frame number *index* of the object with *header*."""
+        prefix = header[-8:]
+        aad = header + ("\x01" if last else "\x00")
+        try:
+            return self.aead.decrypt(prefix + struct.pack(">I", index), data,
+                                     aad)
+        except Exception, e:
+            raise DecryptionError("frame %d failed to decrypt: %r" % (index, e))
+
+    def encrypting_file(self, fp):
+        """A file object reading *fp* encrypted; see `EncryptingFile`."""
+        return EncryptingFile(fp, self)
+
+    def decrypting_file(self, fp):
+        """A file object reading encrypted *fp* decrypted, such as the
+        response to `OSSBucket.get`; see `DecryptingFile`."""
+        return DecryptingFile(fp, self)
+
+    def open(self, bucket, key, **kwds):
+        """Open encrypted *key* in *bucket* for seekable, decrypted reads;
+        see `DecryptingReader`."""
+        return DecryptingReader(bucket, key, self, **kwds)
+
+def parse_header(header):
+    """Check *header*, returning the frame size it gives."""
+    if len(header) < header_size:
+        raise DecryptionError("too short to be encrypted")
+    got_magic, frame_size, prefix = struct.unpack(header_format, header)
+    if got_magic != magic or not frame_size:
+        raise DecryptionError("not encrypted by simpleoss")
+    return frame_size
+
+class EncryptingFile(object):
+    """Reads *fp* encrypted by `FrameCipher` *cipher*, a frame at a time.
+
+    Only seeking back to the start is supported, which reads *fp* again from
+    where it was, for hashing before upload.
+    """
+
+    def __init__(self, fp, cipher):
+        self.fp = fp
+        self.cipher = cipher
+        self.header = cipher.make_header()
+        self._start = fp.tell() if hasattr(fp, "tell") else None
+        self._reset()
+
+    def _reset(self):
+        self._buf = self.header
+        self._index = 0
+        self._done = False
+        self._pos = 0
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=0):
+        if (offset, whence) != (0, 0) or self._start is None:
+            raise IOError("can only seek to the start")
+        self.fp.seek(self._start)
+        self._reset()
+
+    def _next_frame(self):
+        data = _read_full(self.fp, self.cipher.frame_size)
+        last = len(data) < self.cipher.frame_size
+        frame = self.cipher.seal(self.header, self._index, data, last)
+        self._index += 1
+        self._done = last
+        return frame
+
+    def read(self, n=-1):
+        while not self._done and (n < 0 or len(self._buf) < n):
+            self._buf += self._next_frame()
+        if n < 0:
+            n = len(self._buf)
+        chunk, self._buf = self._buf[:n], self._buf[n:]
+        self._pos += len(chunk)
+        return chunk
+
+    def close(self):
+        self.fp.close()
+
+class DecryptingFile(object):
+    """Reads encrypted *fp* decrypted by `FrameCipher` *cipher*, a frame at
+    a time. A frame that fails to decrypt raises `DecryptionError`."""
+
+    def __init__(self, fp, cipher):
+        self.fp = fp
+        self.cipher = cipher
+        self.header = _read_full(fp, header_size)
+        self.frame_size = parse_header(self.header)
+        self._buf = ""
+        self._index = 0
+        self._done = False
+
+    def _next_frame(self):
+        n = self.frame_size + tag_size
+        data = _read_full(self.fp, n)
+        last = len(data) < n
+        if len(data) < tag_size:
+            raise DecryptionError("truncated after frame %d" % self._index)
+        frame = self.cipher.unseal(self.header, self._index, data, last)
+        self._index += 1
+        self._done = last
+        return frame
+
+    def read(self, n=-1):
+        while not self._done and (n < 0 or len(self._buf) < n):
+            self._buf += self._next_frame()
+        if n < 0:
+            n = len(self._buf)
+        chunk, self._buf = self._buf[:n], self._buf[n:]
+        return chunk
+
+    def close(self):
+        self.fp.close()
+
+class DecryptingReader(io.RawIOBase):
+    """Seekable, decrypted reads of encrypted *key* in *bucket*.
+
+    Ciphertext is read through an `OSSReader`, given *kwds*, so only the
+    frames covering what is read are fetched. The most recently decrypted
+    frame is kept.
+    """
+
+    def __init__(self, bucket, key, cipher, **kwds):
+        super(DecryptingReader, self).__init__()
+        self.raw = OSSReader(bucket, key, **kwds)
+        self.cipher = cipher
+        self.name = key
+        self.header = _read_full(self.raw, header_size)
+        self.frame_size = parse_header(self.header)
+        n = self.raw.size - header_size
+        n_full, rest = divmod(n, self.frame_size + tag_size)
+        if rest < tag_size:
+            raise DecryptionError("%r is truncated" % (key,))
+        self.n_frames = n_full + 1
+        self.size = n - self.n_frames * tag_size
+        self._pos = 0
+        self._frame = (None, None)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("invalid whence %r" % (whence,))
+        if pos < 0:
+            raise IOError("negative seek position %d" % (pos,))
+        self._pos = pos
+        return pos
+
+    def _get_frame(self, index):
+        if self._frame[0] != index:
+            ct_size = self.frame_size + tag_size
+            self.raw.seek(header_size + index * ct_size)
+            data = _read_full(self.raw, ct_size)
+            last = index == self.n_frames - 1
+            self._frame = (index, self.cipher.unseal(self.header, index, data,
+                                                     last))
+        return self._frame[1]
+
+    def readinto(self, b):
+        self._checkClosed()
+        n = 0
+        want = len(b)
+        while n < want and self._pos < self.size:
+            index, offset = divmod(self._pos, self.frame_size)
+            chunk = self._get_frame(index)[offset:offset + want - n]
+            b[n:n + len(chunk)] = chunk
+            n += len(chunk)
+            self._pos += len(chunk)
+        return n
+
+    def close(self):
+        if not self.closed:
+            self.raw.close()
+            self._frame = (None, None)
+        super(DecryptingReader, self).close()
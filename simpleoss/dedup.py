@@ -0,0 +1,243 @@
+"""Deduplicated storage of large, similar objects
+
+A `DedupStore` splits content into variable-sized chunks at boundaries picked
+by a rolling hash of the content itself, so that an edit only changes the
+chunks around it. Chunks are stored once each, named by their SHA-256, and
+each stored object is a small JSON manifest listing its chunks::
+
+    >>> store = DedupStore(bucket, index=ChunkIndex("chunks.idx"))
+    >>> with open("build-1.2.tar", "rb") as fp:
+    ...     store.put("builds/1.2.tar", fp)
+    {'size': 73400320, 'chunks': 71, 'new_chunks': 3, 'uploaded': 3145728}
+    >>> with open("out.tar", "wb") as fp:
+    ...     store.get("builds/1.2.tar", fp)
+
+Chunks known from the local `ChunkIndex` are not uploaded again; others are
+checked for with a HEAD request first. Chunking is done in pure Python, at
+roughly 10 MB/s, so it pays off when the network is the slower part.
+"""
+
+from __future__ import with_statement
+
+import json
+import struct
+import hashlib
+import threading
+from collections import deque
+
+from .bucket import KeyNotFound
+from .workers import WorkerPool
+
+def _gear_table():
+    # Derived from MD5 rather than a random generator so that chunk
+    # boundaries never change between versions or platforms.
+    return [struct.unpack(">I", hashlib.md5(chr(i)).digest()[:4])[0]
+            for i in xrange(256)]
+
+class Chunker(object):
+    """Content-defined chunking with a gear hash, as in FastCDC.
+
+    Chunks are at least *min_size* and at most *max_size* bytes, and about
+    *avg_size* on average.
+    """
+
+    gear = _gear_table()
+    read_size = 1 << 20
+
+    def __init__(self, min_size=256 << 10, avg_size=1 << 20, max_size=4 << 20):
+        if not 0 < min_size < avg_size < max_size:
+            raise ValueError("need 0 < min_size < avg_size < max_size")
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        bits = max(1, (avg_size - min_size).bit_length() - 1)
+        # The high bits of the hash depend on the most bytes.
+        self.mask = ((1 << bits) - 1) << (32 - bits)
+
+    def split(self, fp):
+        """Yield the chunks of file-like object *fp* as strings."""
+        buf = bytearray()
+        eof = False
+        while True:
+            while not eof and len(buf) < self.max_size:
+                data = fp.read(self.read_size)
+                if not data:
+                    eof = True
+                buf.extend(data)
+            if not buf:
+                return
+            n = self._cut(buf)
+            yield str(buf[:n])
+            del buf[:n]
+
+    def _cut(self, buf):
+        end = min(len(buf), self.max_size)
+        gear, mask, h = self.gear, self.mask, 0
+        for i in xrange(self.min_size, end):
+            h = ((h << 1) + gear[buf[i]]) & 0xffffffff
+            if not h & mask:
+                return i + 1
+        return end
+
+class ChunkIndex(object):
+    """The set of chunk hashes known to be stored, kept in memory and, if
+    *path* is given, in that file, one hash per line."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._hashes = set()
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path) as fp:
+                    self._hashes.update(line.strip() for line in fp)
+            except IOError:
+                pass
+            self._hashes.discard("")
+
+    def __contains__(self, digest):
+        return digest in self._hashes
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add(self, digest):
+        with self._lock:
+            if digest in self._hashes:
+                return
+            self._hashes.add(digest)
+            if self.path:
+                with open(self.path, "a") as fp:
+                    fp.write(digest + "\n")
+
+class DedupStore(object):
+    """Deduplicated objects in *bucket*, with chunks kept under
+    *chunk_prefix*. Chunks are transferred on *n_workers* threads.
+
+    If the bucket has a `MemoryBudget`, chunks are charged to it while
+    waiting to be uploaded, or fetched ahead of being read.
+    """
+
+    manifest_version = 1
+
+    def __init__(self, bucket, chunk_prefix="chunks/", index=None,
+                 chunker=None, n_workers=8):
+        self.bucket = bucket
+        self.chunk_prefix = chunk_prefix
+        self.index = index if index is not None else ChunkIndex()
+        self.chunker = chunker or Chunker()
+        self.n_workers = n_workers
+
+    def chunk_key(self, digest):
+        return "%s%s/%s" % (self.chunk_prefix, digest[:2], digest)
+
+    def _store_chunk(self, digest, chunk):
+        # Returns the number of bytes uploaded.
+        if digest in self.index:
+            return 0
+        key = self.chunk_key(digest)
+        try:
+            self.bucket.info(key)
+        except KeyNotFound:
+            self.bucket.put(key, chunk, mimetype="application/octet-stream")
+            self.index.add(digest)
+            return len(chunk)
+        self.index.add(digest)
+        return 0
+
+    def put(self, key, fp):
+        """Store the contents of file-like object *fp* as *key*.
+
+        Returns a dict of statistics: the *size* of the content, the number
+        of *chunks*, how many of those were *new_chunks*, and the bytes
+        *uploaded*.
+        """
+        chunks = []
+        stats = {"size": 0, "chunks": 0, "new_chunks": 0, "uploaded": 0}
+        pending = deque()
+        budget = getattr(self.bucket, "memory_budget", None)
+        def finish(fut):
+            uploaded = fut.result()
+            if uploaded:
+                stats["new_chunks"] += 1
+                stats["uploaded"] += uploaded
+        pool = WorkerPool(self.n_workers)
+        try:
+            for chunk in self.chunker.split(fp):
+                digest = hashlib.sha256(chunk).hexdigest()
+                chunks.append([digest, len(chunk)])
+                stats["size"] += len(chunk)
+                if budget:
+                    budget.acquire(len(chunk))
+                fut = pool.submit(self._store_chunk, digest, chunk)
+                if budget:
+                    fut.add_done_callback(
+                        lambda fut, n=len(chunk): budget.release(n))
+                pending.append(fut)
+                # Bound the chunks held in memory.
+                if len(pending) >= 2 * self.n_workers:
+                    finish(pending.popleft())
+            while pending:
+                finish(pending.popleft())
+        finally:
+            pool.shutdown(wait=False, cancel=True)
+        stats["chunks"] = len(chunks)
+        manifest = {"version": self.manifest_version, "size": stats["size"],
+                    "chunks": chunks}
+        self.bucket.put(key, json.dumps(manifest), mimetype="application/json")
+        return stats
+
+    def manifest(self, key):
+        """Fetch the manifest of *key*, a dict with *size* and *chunks*, a
+        list of [sha256, size] pairs."""
+        manifest = json.loads(self.bucket.get(key).read())
+        if manifest.get("version") != self.manifest_version:
+            raise ValueError("%r is not a version %d manifest"
+                             % (key, self.manifest_version))
+        return manifest
+
+    def _fetch_chunk(self, digest, size):
+        chunk = self.bucket.get(self.chunk_key(digest)).read()
+        if len(chunk) != size or hashlib.sha256(chunk).hexdigest() != digest:
+            raise ValueError("chunk %s is corrupt" % (digest,))
+        return chunk
+
+    def iter_content(self, key):
+        """Yield the content of *key* chunk by chunk, fetching ahead
+        concurrently."""
+        chunks = self.manifest(key)["chunks"]
+        pending = deque()
+        budget = getattr(self.bucket, "memory_budget", None)
+        def take():
+            # The chunk is the caller's once yielded.
+            fut, size = pending.popleft()
+            try:
+                return fut.result()
+            finally:
+                if budget:
+                    budget.release(size)
+        pool = WorkerPool(self.n_workers)
+        try:
+            for digest, size in chunks:
+                if budget:
+                    # Hand over the chunks held before waiting on others.
+                    while pending and not budget.acquire(size, block=False):
+                        yield take()
+                    if not pending:
+                        budget.acquire(size)
+                pending.append((pool.submit(self._fetch_chunk, digest, size),
+                                size))
+                if len(pending) >= 2 * self.n_workers:
+                    yield take()
+            while pending:
+                yield take()
+        finally:
+            pool.shutdown(wait=False, cancel=True)
+            while budget and pending:
+                fut, size = pending.popleft()
+                fut.add_done_callback(lambda fut, n=size: budget.release(n))
+
+    def get(self, key, fp):
+        """Write the content of *key* to file-like object *fp*."""
+        for chunk in self.iter_content(key):
+            fp.write(chunk)
@@ -0,0 +1,181 @@
+"""Load balancing and failover across equivalent OSS endpoints
+
+When a bucket is reachable through several endpoints (say the internal VPC
+one, the public one and an accelerated one), `MultiEndpointOSSBucket` spreads
+requests over all of them::
+
+    >>> bucket = MultiEndpointOSSBucket("my-bucket",
+    ...     endpoints=["oss-cn-hangzhou-internal.aliyuncs.com",
+    ...                "oss-cn-hangzhou.aliyuncs.com"],
+    ...     access_key=access_key, secret_key=secret_key)
+
+Endpoints are picked by fewest outstanding requests, or with
+``strategy="latency"``, by outstanding requests weighted by latency.
+Endpoints that fail repeatedly are ejected for a while, and a request that
+fails on one endpoint is retried on another.
+"""
+
+from __future__ import with_statement
+
+import copy
+import time
+import urllib2
+import threading
+
+from .bucket import OSSBucket
+from .utils import oss_urlquote, rfc822_fmtdate
+
+class Endpoint(object):
+    """Health and load bookkeeping for the endpoint at base URL *url*."""
+
+    __slots__ = ("url", "outstanding", "latency", "n_failures",
+                 "ejected_until", "n_requests")
+
+    def __init__(self, url):
+        self.url = url
+        self.outstanding = 0
+        self.latency = None
+        self.n_failures = 0
+        self.ejected_until = 0
+        self.n_requests = 0
+
+    def __repr__(self):
+        return "<%s %r outstanding=%d>" % (self.__class__.__name__, self.url,
+                                           self.outstanding)
+
+class EndpointPool(object):
+    """Choose among *urls*, passively tracking how each one is doing.
+
+    After *max_failures* consecutive failures, an endpoint is ejected for
+    *eject_time* seconds. Latency is tracked as a moving average with weight
+    *alpha* for new samples. If every endpoint is ejected, the one due back
+    first is used regardless.
+    """
+
+    strategies = ("least-outstanding", "latency")
+
+    def __init__(self, urls, strategy="least-outstanding", max_failures=3,
+                 eject_time=30.0, alpha=0.3, clock=time.time):
+        if not urls:
+            raise ValueError("need at least one endpoint")
+        if strategy not in self.strategies:
+            raise ValueError("unknown strategy %r" % (strategy,))
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.strategy = strategy
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+        self.alpha = alpha
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._n_picks = 0
+
+    def acquire(self):
+        """Pick an endpoint and count a request as outstanding on it."""
+        with self._lock:
+            now = self.clock()
+            healthy = [ep for ep in self.endpoints if ep.ejected_until <= now]
+            if not healthy:
+                healthy = [min(self.endpoints, key=lambda ep: ep.ejected_until)]
+            # Rotate the starting point so that ties are spread out.
+            self._n_picks += 1
+            offset = self._n_picks % len(healthy)
+            healthy = healthy[offset:] + healthy[:offset]
+            endpoint = min(healthy, key=self._cost)
+            endpoint.outstanding += 1
+            endpoint.n_requests += 1
+            return endpoint
+
+    def _cost(self, endpoint):
+        if self.strategy == "latency":
+            # Unmeasured endpoints are tried eagerly to get a measurement.
+            return (endpoint.outstanding + 1) * (endpoint.latency or 0.0)
+        return endpoint.outstanding
+
+    def release(self, endpoint, latency=None, failed=False):
+        """Finish a request on *endpoint*, which took *latency* seconds."""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if failed:
+                endpoint.n_failures += 1
+                if endpoint.n_failures >= self.max_failures:
+                    endpoint.n_failures = 0
+                    endpoint.ejected_until = self.clock() + self.eject_time
+            else:
+                endpoint.n_failures = 0
+                if latency is not None:
+                    if endpoint.latency is None:
+                        endpoint.latency = latency
+                    else:
+                        endpoint.latency += self.alpha * (latency - endpoint.latency)
+
+    def snapshot(self):
+        """List the state of each endpoint as dicts, for monitoring."""
+        now = self.clock()
+        with self._lock:
+            return [{"url": ep.url, "outstanding": ep.outstanding,
+                     "latency": ep.latency, "requests": ep.n_requests,
+                     "ejected": ep.ejected_until > now}
+                    for ep in self.endpoints]
+
+def is_endpoint_failure(e):
+    """Tell whether error *e* reflects on the endpoint rather than the request."""
+    code = getattr(e, "code", None)
+    if code is None:
+        return isinstance(e, (urllib2.URLError, EnvironmentError))
+    return code >= 500
+
+class MultiEndpointOSSBucket(OSSBucket):
+    """An `OSSBucket` served by several equivalent *endpoints*.
+
+    Endpoints are base URLs, or bare host names to which the scheme and
+    bucket path are added as for *base_url*. Any extra keyword arguments go
+    to the `EndpointPool`.
+    """
+
+    def __init__(self, name=None, endpoints=(), access_key=None,
+                 secret_key=None, secure=False, clock=time.time, **kwds):
+        pool_kwds = {}
+        for arg in ("strategy", "max_failures", "eject_time", "alpha"):
+            if arg in kwds:
+                pool_kwds[arg] = kwds.pop(arg)
+        scheme = ("http", "https")[int(bool(secure))]
+        urls = []
+        for endpoint in endpoints:
+            if "://" not in endpoint:
+                endpoint = "%s://%s" % (scheme, endpoint)
+                if name:
+                    endpoint += "/%s" % oss_urlquote(name)
+            urls.append(endpoint.rstrip("/"))
+        self.endpoint_pool = EndpointPool(urls, clock=clock, **pool_kwds)
+        self.clock = clock
+        super(MultiEndpointOSSBucket, self).__init__(
+            name, access_key=access_key, secret_key=secret_key,
+            base_url=urls[0], secure=None, **kwds)
+
+    def warmup(self, n_connections=4):
+        """Open *n_connections* to each endpoint; see `OSSBucket.warmup`."""
+        n_idle = 0
+        for endpoint in self.endpoint_pool.endpoints:
+            n_idle += super(MultiEndpointOSSBucket, self).warmup(
+                n_connections, base_url=endpoint.url)
+        return n_idle
+
+    def _should_retry(self, e):
+        return is_endpoint_failure(e)
+
+    def _attempt(self, ossreq, base_url=None):
+        endpoint = self.endpoint_pool.acquire()
+        # Sign a copy for each attempt, so that a retry on another endpoint
+        # carries a fresh date without disturbing concurrent attempts.
+        ossreq = copy.copy(ossreq)
+        ossreq.headers = dict(ossreq.headers, Date=rfc822_fmtdate())
+        ossreq.sign(self)
+        start = self.clock()
+        try:
+            resp = super(MultiEndpointOSSBucket, self)._attempt(ossreq,
+                                                                endpoint.url)
+        except Exception, e:
+            self.endpoint_pool.release(endpoint, failed=is_endpoint_failure(e))
+            raise
+        self.endpoint_pool.release(endpoint, latency=self.clock() - start)
+        return resp
@@ -2,13 +2,21 @@
 
 Use as you would normally do with :mod:`simpleoss`, only instead of
 :class:`simpleoss.OSSBucket`, use :class:`simpleoss.gae.AppEngineOSSBucket`.
+
+Several objects can be fetched at once with `AppEngineOSSBucket.get_many`,
+`info_many` and `put_many`, which issue their urlfetch calls concurrently
+and wait on them together::
+
+    >>> bucket.get_many(["a.txt", "b.txt"])
+    [<addinfourl ...>, <addinfourl ...>]
 """
 
 import urllib2
 from StringIO import StringIO
 from urllib import addinfourl
 from google.appengine.api import urlfetch
-from simpleoss.bucket import OSSBucket
+from simpleoss.bucket import OSSBucket, KeyNotFound, OSSError
+from simpleoss.utils import ObjectInfo
 
 class _FakeDict(list):
     def iteritems(self):
@@ -19,8 +27,11 @@ def _http_open(req):
                           payload=req.get_data(),
                           method=req.get_method(),
                           headers=_FakeDict(req.header_items()))
+    return _wrap_response(resp, req.get_full_url())
+
+def _wrap_response(resp, url):
     fp = StringIO(resp.content)
-    rv = addinfourl(fp, resp.headers, req.get_full_url())
+    rv = addinfourl(fp, resp.headers, url)
     rv.code = resp.status_code
     rv.msg = "?"
     return rv
@@ -47,3 +58,70 @@ class AppEngineOSSBucket(OSSBucket):
         # of a situation.
         return urllib2.build_opener(UrlFetchHTTPHandler, UrlFetchHTTPSHandler,
                                     urllib2.ProxyHandler(proxies={}))
+
+    max_rpcs = 32
+
+    def _start_fetch(self, ossreq):
+        ossreq.sign(self)
+        req = ossreq.urllib(self)
+        rpc = urlfetch.create_rpc(deadline=ossreq.timeout or self.timeout)
+        urlfetch.make_fetch_call(rpc, req.get_full_url(),
+                                 payload=req.get_data(),
+                                 method=req.get_method(),
+                                 headers=_FakeDict(req.header_items()))
+        return rpc, req.get_full_url()
+
+    def _finish_fetch(self, ossreq, fetch):
+        rpc, url = fetch
+        resp = _wrap_response(rpc.get_result(), url)
+        if 200 <= resp.code < 300:
+            return resp
+        e = urllib2.HTTPError(url, resp.code, resp.msg, resp.info(), resp)
+        if self._should_retry(e):
+            # Leave retries to the blocking path.
+            return self.send(ossreq)
+        exc_cls = KeyNotFound if resp.code == 404 else OSSError
+        raise exc_cls.from_urllib(e, key=ossreq.key)
+
+    def send_many(self, ossreqs, name="send"):
+        """Send *ossreqs* concurrently, at most `max_rpcs` at a time.
+
+        Returns the responses in order once all are done. If any requests
+        fail, raises a `simpleoss.batch.BatchError` listing them as
+        operations *name* on their keys.
+        """
+        ossreqs = list(ossreqs)
+        results, errors = [], []
+        for start in xrange(0, len(ossreqs), self.max_rpcs):
+            window = ossreqs[start:start + self.max_rpcs]
+            fetches = [self._start_fetch(ossreq) for ossreq in window]
+            for ossreq, fetch in zip(window, fetches):
+                try:
+                    results.append(self._finish_fetch(ossreq, fetch))
+                except (urllib2.URLError, OSSError, urlfetch.Error), e:
+                    errors.append(((name, (ossreq.key,), {}), e))
+        if errors:
+            from simpleoss.batch import BatchError
+            raise BatchError(errors, len(ossreqs))
+        return results
+
+    def get_many(self, keys):
+        """Get each of *keys* concurrently; see `send_many`."""
+        resps = self.send_many((self.request(key=key) for key in keys), "get")
+        for resp in resps:
+            resp.oss_info = ObjectInfo(resp.info())
+        return resps
+
+    def info_many(self, keys):
+        """Get the `ObjectInfo` of each of *keys* concurrently."""
+        resps = self.send_many((self.request(method="HEAD", key=key)
+                                for key in keys), "info")
+        return [ObjectInfo(resp.info()) for resp in resps]
+
+    def put_many(self, items, **kwds):
+        """Put (key, data) *items* concurrently; keyword arguments are as
+        for `put`."""
+        if hasattr(items, "iteritems"):
+            items = items.iteritems()
+        self.send_many((self._put_request(key, data, **kwds)
+                        for (key, data) in items), "put")
@@ -0,0 +1,133 @@
+"""Hedged requests for idempotent reads
+
+A `HedgePolicy` fights tail latency on `get` and `info`: when the first attempt
+has not produced response headers within a high percentile of recently seen
+latencies, an identical second request is sent, and whichever comes back first
+wins::
+
+    >>> bucket = OSSBucket("my-bucket", hedge_policy=HedgePolicy(budget=0.05))
+
+Only a *budget* fraction of requests may be hedged, which caps the extra load
+on the service. The losing attempt cannot be interrupted mid-flight, but its
+response is closed as soon as it arrives.
+"""
+
+from __future__ import with_statement
+
+import sys
+import time
+import Queue
+import threading
+from collections import deque
+
+class HedgePolicy(object):
+    """Decide when to hedge, and keep track of the hedging budget.
+
+    The hedge delay is the *percentile* of the last *n_samples* header
+    latencies, kept within [*min_delay*, *max_delay*] seconds. Until
+    *min_samples* latencies have been seen, *initial_delay* is used.
+    """
+
+    def __init__(self, percentile=95, budget=0.05, initial_delay=0.1,
+                 min_delay=0.005, max_delay=2.0, n_samples=1000,
+                 min_samples=20, clock=time.time):
+        self.percentile = percentile
+        self.budget = budget
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.clock = clock
+        self.samples = deque(maxlen=n_samples)
+        self.n_requests = 0
+        self.n_hedges = 0
+        self.n_hedge_wins = 0
+        self._delay = initial_delay
+        self._n_stale = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<%s delay=%.3f hedged %d/%d>" % (
+            self.__class__.__name__, self.delay(), self.n_hedges,
+            self.n_requests)
+
+    def delay(self):
+        """How long to wait for the first attempt before hedging."""
+        with self._lock:
+            if self._n_stale:
+                self._update_delay()
+            return self._delay
+
+    def _update_delay(self):
+        self._n_stale = 0
+        if len(self.samples) < self.min_samples:
+            return
+        ordered = sorted(self.samples)
+        idx = int(len(ordered) * self.percentile / 100.0)
+        delay = ordered[min(idx, len(ordered) - 1)]
+        self._delay = max(self.min_delay, min(self.max_delay, delay))
+
+    def record(self, latency):
+        with self._lock:
+            self.samples.append(latency)
+            self._n_stale += 1
+
+    def allow_hedge(self):
+        """Spend from the budget if there is any left, and say if there was."""
+        with self._lock:
+            if self.n_hedges + 1 > self.budget * self.n_requests:
+                return False
+            self.n_hedges += 1
+            return True
+
+    def send(self, bucket, ossreq):
+        """Send *ossreq* through *bucket*, hedging if it takes too long."""
+        with self._lock:
+            self.n_requests += 1
+        results = Queue.Queue()
+        self._start(bucket, ossreq, results, 0)
+        n_attempts = 1
+        try:
+            result = results.get(timeout=self.delay())
+        except Queue.Empty:
+            if self.allow_hedge():
+                self._start(bucket, ossreq, results, 1)
+                n_attempts += 1
+            result = results.get()
+        n_attempts -= 1
+        # A failed first result might still be saved by the other attempt.
+        if result[2] and n_attempts:
+            result = results.get()
+            n_attempts -= 1
+        if n_attempts:
+            self._discard(results)
+        attempt_no, resp, exc_info = result
+        if exc_info:
+            raise exc_info[0], exc_info[1], exc_info[2]
+        if attempt_no:
+            with self._lock:
+                self.n_hedge_wins += 1
+        return resp
+
+    def _start(self, bucket, ossreq, results, attempt_no):
+        def attempt():
+            start = self.clock()
+            try:
+                resp = bucket.send(ossreq)
+            except BaseException:
+                results.put((attempt_no, None, sys.exc_info()))
+            else:
+                self.record(self.clock() - start)
+                results.put((attempt_no, resp, None))
+        thread = threading.Thread(target=attempt)
+        thread.daemon = True
+        thread.start()
+
+    def _discard(self, results):
+        def close_loser():
+            attempt_no, resp, exc_info = results.get()
+            if resp is not None:
+                resp.close()
+        thread = threading.Thread(target=close_loser)
+        thread.daemon = True
+        thread.start()
@@ -0,0 +1,234 @@
+"""HTTP/2 transport, multiplexing requests over a few shared connections
+
+With hyper_ installed, a bucket can send its requests as HTTP/2 streams,
+many at a time over each connection, rather than holding a connection per
+request in flight::
+
+    >>> bucket = OSSBucket("my-bucket", base_url="https://oss.example.com")
+    >>> bucket.use_http2(HTTP2Pool(max_connections=2))
+
+Requests are signed exactly as before; only how they travel changes. Plain
+http URLs speak HTTP/2 from the start ("prior knowledge"), so the server
+must support that.
+
+A stream can't time out on its own without the connection it shares, so
+timeouts are set on the pool, for every read on its connections. Requests
+with a timeout shorter than the pool's, or sent by a bucket whose timeout
+is, are refused rather than left to wait longer than asked::
+
+    >>> bucket = OSSBucket("my-bucket", timeout=30)
+    >>> bucket.use_http2(HTTP2Pool(timeout=30))
+
+.. _hyper: https://pypi.python.org/pypi/hyper
+"""
+
+from __future__ import with_statement
+
+import socket
+import httplib
+import urllib2
+import threading
+from urllib import addinfourl, splitport
+from cStringIO import StringIO
+
+try:
+    import hyper
+    from hyper.http20.exceptions import StreamResetError
+except ImportError:
+    hyper = None
+
+#: Headers meaningless in HTTP/2, or set by the connection itself.
+connection_headers = frozenset(["connection", "host", "keep-alive",
+                                "proxy-connection", "transfer-encoding",
+                                "upgrade"])
+
+default_ports = {"http": 80, "https": 443}
+
+def hyper_connection(scheme, host, port, timeout=None):
+    """Open a hyper HTTP/2 connection; the default connection factory."""
+    return hyper.HTTP20Connection(host, port, secure=(scheme == "https"),
+                                  timeout=timeout)
+
+class HTTP2Pool(object):
+    """Up to *max_connections* HTTP/2 connections per host, each carrying up
+    to *max_streams* requests at a time. Requests beyond that wait for a
+    stream to finish.
+
+    Connections are made by *connection_factory(scheme, host, port)*, which
+    defaults to making hyper connections, and is also passed *timeout* if
+    one is given. Safe to share between threads and buckets.
+    """
+
+    #: Errors that fail only the stream they happen on, not its connection.
+    stream_errors = (StreamResetError,) if hyper else ()
+
+    def __init__(self, max_connections=2, max_streams=100,
+                 connection_factory=None, timeout=None):
+        if connection_factory is None:
+            if hyper is None:
+                raise ImportError("HTTP/2 needs hyper, "
+                                  "try ``pip install hyper``")
+            connection_factory = hyper_connection
+        self.max_connections = max_connections
+        self.max_streams = max_streams
+        self.connection_factory = connection_factory
+        self.timeout = timeout
+        # (scheme, host) to a list of [connection, streams in use].
+        self._conns = {}
+        self._cond = threading.Condition(threading.Lock())
+
+    def acquire(self, scheme, host):
+        """Get a stream slot on a connection to *host*, an entry to give
+        back to `release`. Its connection is ``entry[0]``."""
+        with self._cond:
+            conns = self._conns.setdefault((scheme, host), [])
+            while True:
+                free = [entry for entry in conns if entry[1] < self.max_streams]
+                # Spread load over connections until all are open.
+                if free and (len(conns) >= self.max_connections or
+                             not min(entry[1] for entry in free)):
+                    entry = min(free, key=lambda entry: entry[1])
+                    entry[1] += 1
+                    return entry
+                if len(conns) < self.max_connections:
+                    break
+                self._cond.wait()
+            # Connections only connect on their first request, so this is
+            # cheap to do under the lock.
+            name, port = splitport(host)
+            port = int(port) if port else default_ports[scheme]
+            if self.timeout is None:
+                conn = self.connection_factory(scheme, name, port)
+            else:
+                conn = self.connection_factory(scheme, name, port,
+                                               timeout=self.timeout)
+            entry = [conn, 1]
+            conns.append(entry)
+            return entry
+
+    def release(self, entry, broken=False):
+        """Give back a stream slot; a *broken* connection is dropped."""
+        with self._cond:
+            entry[1] -= 1
+            if broken:
+                for conns in self._conns.itervalues():
+                    if entry in conns:
+                        conns.remove(entry)
+            self._cond.notify()
+        if broken:
+            entry[0].close()
+
+    def __len__(self):
+        with self._cond:
+            return sum(len(conns) for conns in self._conns.itervalues())
+
+    def allows_timeout(self, timeout):
+        """Tell whether requests with *timeout*, None for none, can be sent
+        without waiting longer than that."""
+        if timeout is None or timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+            return True
+        return self.timeout is not None and self.timeout <= timeout
+
+    def close(self):
+        """Close all connections."""
+        with self._cond:
+            conns, self._conns = self._conns, {}
+        for entries in conns.itervalues():
+            for conn, n_streams in entries:
+                conn.close()
+
+class HTTP2ResponseFile(object):
+    """File object over HTTP/2 response *r*, which gives its stream slot
+    back through *release(broken)* once the body is read or closed, or
+    reading it fails: *is_broken(err)* tells if the connection failed too.
+    """
+
+    def __init__(self, r, release, is_broken=lambda err: True):
+        self._r = r
+        self._release = release
+        self._is_broken = is_broken
+        self._fp = socket._fileobject(self, close=False)
+
+    def recv(self, n):
+        try:
+            data = self._r.read(n)
+        except Exception, err:
+            self._done(self._is_broken(err))
+            raise
+        if not data:
+            self._done()
+        return data
+
+    def _done(self, broken=False):
+        if self._release:
+            release, self._release = self._release, None
+            release(broken)
+
+    def read(self, *a):
+        return self._fp.read(*a)
+
+    def readline(self, *a):
+        return self._fp.readline(*a)
+
+    def readlines(self, *a):
+        return self._fp.readlines(*a)
+
+    def close(self):
+        self._fp.close()
+        self._r.close()
+        self._done()
+
+def http_message(headers):
+    """An `httplib.HTTPMessage` of (name, value) *headers*."""
+    lines = "".join("%s: %s\r\n" % (name, value) for (name, value) in headers)
+    return httplib.HTTPMessage(StringIO(lines + "\r\n"))
+
+class HTTP2Handler(urllib2.BaseHandler):
+    """Open http and https requests as streams on the connections of
+    `HTTP2Pool` *pool*."""
+
+    # Run before the stock and pooled handlers, which speak HTTP/1.1.
+    handler_order = urllib2.HTTPHandler.handler_order - 2
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def _is_broken(self, err):
+        # A reset stream leaves its connection to the others.
+        return not isinstance(err, self.pool.stream_errors)
+
+    def http_open(self, req):
+        return self.stream_open("http", req)
+
+    def https_open(self, req):
+        return self.stream_open("https", req)
+
+    def stream_open(self, scheme, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError("no host given")
+        headers = dict(req.unredirected_hdrs)
+        headers.update(req.headers)
+        headers = dict((name.lower(), str(val)) for (name, val) in headers.items()
+                       if name.lower() not in connection_headers)
+        timeout = getattr(req, "timeout", None)
+        if not self.pool.allows_timeout(timeout):
+            raise ValueError("can't keep to a timeout of %rs over HTTP/2 "
+                             "connections with a timeout of %r"
+                             % (timeout, self.pool.timeout))
+        entry = self.pool.acquire(scheme, host)
+        conn = entry[0]
+        try:
+            stream_id = conn.request(req.get_method(), req.get_selector(),
+                                     body=req.get_data(), headers=headers)
+            r = conn.get_response(stream_id)
+        except Exception, err:
+            self.pool.release(entry, broken=self._is_broken(err))
+            raise urllib2.URLError(err)
+        release = lambda broken: self.pool.release(entry, broken=broken)
+        resp = addinfourl(HTTP2ResponseFile(r, release, self._is_broken),
+                          http_message(r.headers.iter_raw()),
+                          req.get_full_url())
+        resp.code = r.status
+        resp.msg = getattr(r, "reason", None) or httplib.responses.get(r.status, "")
+        return resp
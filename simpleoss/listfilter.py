@@ -0,0 +1,80 @@
+"""Filtering bucket listings as they are parsed
+
+`OSSBucket.listdir` takes filter arguments, which it hands to a
+`ListingFilter`::
+
+    >>> for key, modify, etag, size in bucket.listdir(
+    ...         glob="logs/2010-*.gz", min_size=1 << 20,
+    ...         modified_before=datetime.datetime(2011, 1, 1)):
+    ...     print key
+
+The filter looks at the raw text of each listing entry, key predicates
+first, and only entries that pass are decoded into tuples, so their dates
+are the only ones parsed. OSS itself only filters by prefix, which is taken
+from the literal start of a glob when no prefix is given.
+"""
+
+import re
+import fnmatch
+
+def glob_prefix(pattern):
+    """The part of glob *pattern* before its first wildcard.
+
+    >>> glob_prefix("logs/2010-*.gz")
+    'logs/2010-'
+    """
+    match = re.search(r"[*?[]", pattern)
+    return pattern[:match.start()] if match else pattern
+
+def _iso8601_text(dt):
+    # Listing dates are ISO 8601 in UTC, so their text sorts like the dates.
+    return "%04d-%02d-%02dT%02d:%02d:%02d" % (dt.year, dt.month, dt.day,
+                                              dt.hour, dt.minute, dt.second)
+
+class ListingFilter(object):
+    """Accept listing entries by key and attributes.
+
+    *suffix* is a string keys must end with; *glob* a shell-style pattern
+    and *regex* a regular expression (or compiled pattern) that keys must
+    match, from the start. Sizes must be within *min_size* and *max_size*,
+    inclusive, and modification times (naive UTC datetimes) at or after
+    *modified_after* and before *modified_before*.
+    """
+
+    def __init__(self, glob=None, regex=None, suffix=None, min_size=None,
+                 max_size=None, modified_after=None, modified_before=None):
+        self.glob = glob
+        self.suffix = suffix
+        self.min_size = min_size
+        self.max_size = max_size
+        self.patterns = []
+        if glob is not None:
+            self.patterns.append(re.compile(fnmatch.translate(glob)))
+        if regex is not None:
+            if isinstance(regex, basestring):
+                regex = re.compile(regex)
+            self.patterns.append(regex)
+        self.after = modified_after and _iso8601_text(modified_after)
+        self.before = modified_before and _iso8601_text(modified_before)
+
+    def __call__(self, key, get):
+        """Whether to accept the entry for *key*, where *get(name)* gives
+        the text of the entry's field *name*, such as "Size"."""
+        if self.suffix is not None and not key.endswith(self.suffix):
+            return False
+        for pattern in self.patterns:
+            if not pattern.match(key):
+                return False
+        if self.min_size is not None or self.max_size is not None:
+            size = int(get("Size"))
+            if self.min_size is not None and size < self.min_size:
+                return False
+            if self.max_size is not None and size > self.max_size:
+                return False
+        if self.after or self.before:
+            modify = get("LastModified")[:19]
+            if self.after and modify < self.after:
+                return False
+            if self.before and modify >= self.before:
+                return False
+        return True
@@ -0,0 +1,132 @@
+"""A shared byte budget for transfer buffers
+
+Part buffers of `OSSWriter` and blocks cached by `OSSReader` are taken from
+the `MemoryBudget` of their bucket, if it has one, as are the ranges
+`simpleoss.pack.PackReader` fetches and the chunks `simpleoss.dedup.DedupStore`
+holds in flight. So however many of those transfers run at once, their
+buffers stay within one limit::
+
+    >>> OSSBucket.memory_budget = MemoryBudget(512 << 20)
+
+Set on the class like that, the budget covers every bucket in the process;
+it can also be given to buckets one by one, as *memory_budget*. Taking more
+than is left blocks until other transfers give some back, so the budget
+also throttles them.
+
+Other transfers don't hold bodies in memory, and are not charged:
+`simpleoss.upload.upload_tree` streams files from disk, and
+`simpleoss.hedge` closes the slower of two responses unread. Bodies read
+whole from `OSSBucket.get` are the caller's to account for.
+
+Part buffers given back are kept for reuse, rather than allocating a new
+part's worth each time, and still count against the budget while kept. They
+are dropped when the budget is needed for something else.
+"""
+
+from __future__ import with_statement
+
+import threading
+
+class MemoryBudget(object):
+    """Up to *limit* bytes of buffers, held or pooled for reuse.
+
+    Buffers are `bytearray` objects, as those can be refilled in place.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        # Buffer size to the buffers of that size free for reuse.
+        self._free = {}
+        self._free_bytes = 0
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return "<%s %d of %d bytes used, %d pooled>" % (
+            self.__class__.__name__, self.used, self.limit, self._free_bytes)
+
+    def _reserve(self, n, block):
+        if n > self.limit:
+            raise ValueError("%d bytes is over the budget of %d"
+                             % (n, self.limit))
+        waited = False
+        while self.used + self._free_bytes + n > self.limit:
+            if self._free_bytes:
+                self._drop_free(self.used + self._free_bytes + n - self.limit)
+                continue
+            if not block:
+                return False
+            waited = True
+            self._cond.wait()
+        if waited:
+            self.waits += 1
+        self.used += n
+        self.peak = max(self.peak, self.used)
+        return True
+
+    def _drop_free(self, n):
+        # Largest buffers first, the fewest to drop.
+        for size in sorted(self._free, reverse=True):
+            bufs = self._free[size]
+            while bufs and n > 0:
+                bufs.pop()
+                self._free_bytes -= size
+                n -= size
+            if not bufs:
+                del self._free[size]
+            if n <= 0:
+                break
+
+    def acquire(self, n, block=True):
+        """Take *n* bytes, waiting for them unless *block* is false, in
+        which case return whether they were taken."""
+        with self._cond:
+            return self._reserve(n, block)
+
+    def release(self, n):
+        """Give back *n* bytes."""
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+    def get_buffer(self, size):
+        """Take a buffer of *size* bytes, reusing a free one if any."""
+        with self._cond:
+            bufs = self._free.get(size)
+            if bufs:
+                buf = bufs.pop()
+                self._free_bytes -= size
+                self.used += size
+                self.peak = max(self.peak, self.used)
+                return buf
+            self._reserve(size, True)
+        try:
+            return bytearray(size)
+        except MemoryError:
+            self.release(size)
+            raise
+
+    def put_buffer(self, buf):
+        """Give back *buf*, from `get_buffer`, for reuse."""
+        size = len(buf)
+        with self._cond:
+            self.used -= size
+            self._free.setdefault(size, []).append(buf)
+            self._free_bytes += size
+            self._cond.notify_all()
+
+    def clear(self):
+        """Drop the buffers kept for reuse."""
+        with self._cond:
+            self._free.clear()
+            self._free_bytes = 0
+            self._cond.notify_all()
+
+    def snapshot(self):
+        """Bytes in use, pooled, at most in use, and waits for the budget."""
+        with self._cond:
+            return {"limit": self.limit, "used": self.used,
+                    "pooled": self._free_bytes, "peak": self.peak,
+                    "waits": self.waits}
@@ -0,0 +1,136 @@
+"""Moving every key under a prefix to another prefix
+
+OSS has no rename, so `move_prefix` copies each key server-side and then
+deletes the sources::
+
+    >>> bucket.move_prefix("tmp/job123/", "final/job123/",
+    ...                    checkpoint="job123.move")
+    {'copied': 48213, 'skipped': 0, 'deleted': 48213}
+
+The listing is streamed, copies run concurrently, and sources are deleted in
+batches of up to 1000 keys, only once their copies have succeeded. With a
+*checkpoint* file, the keys copied so far are recorded, and running the
+same move again after a crash does not copy them again.
+"""
+
+from __future__ import with_statement
+
+import os
+import threading
+from collections import deque
+
+from .workers import WorkerPool
+
+#: The most keys OSS deletes in one request.
+max_delete_keys = 1000
+
+class MoveCheckpoint(object):
+    """The keys already copied in a move, with their ETags, kept in the file
+    *path* so that the move can resume."""
+
+    def __init__(self, path):
+        self.path = path
+        self.copied = {}
+        try:
+            with open(path) as fp:
+                for line in fp:
+                    etag, key = line.rstrip("\n").split("\t", 1)
+                    self.copied[key.decode("utf-8")] = etag
+        except IOError:
+            pass
+        self._fp = open(path, "a")
+        self._lock = threading.Lock()
+
+    def is_copied(self, key, etag):
+        """Whether *key*, as of *etag*, was copied already."""
+        return self.copied.get(key) == etag
+
+    def add(self, key, etag):
+        if isinstance(key, unicode):
+            key = key.encode("utf-8")
+        with self._lock:
+            self._fp.write("%s\t%s\n" % (etag, key))
+            self._fp.flush()
+
+    def close(self):
+        self._fp.close()
+
+def move_prefix(bucket, src, dst, n_workers=16, checkpoint=None,
+                **copy_kwds):
+    """Move the keys under *src* in *bucket* to *dst*, keeping the rest of
+    the key, and return counts of keys copied, skipped and deleted.
+
+    Copies are made on *n_workers* threads, given *copy_kwds* (note that
+    the ACL is not copied, see `OSSBucket.copy`). If *checkpoint* is a path,
+    progress is recorded there, and the file removed once the move is done.
+
+    Sources whose copy failed are left in place, and a `BatchError` listing
+    the failures, of copies and of deletes, is raised at the end.
+    """
+    from .batch import BatchError
+    from .bucket import OSSError
+    if not src or dst.startswith(src):
+        raise ValueError("cannot move %r into itself" % (src,))
+    ckpt = MoveCheckpoint(checkpoint) if checkpoint else None
+    stats = {"copied": 0, "skipped": 0, "deleted": 0}
+    errors = []
+    in_flight = deque()
+    to_delete = []
+    n_keys = 0
+
+    def copy(key, etag):
+        source = "%s/%s" % (bucket.name, key)
+        bucket.copy(source, dst + key[len(src):], **copy_kwds)
+        if ckpt:
+            ckpt.add(key, etag)
+
+    def finish(key, fut):
+        try:
+            fut.result()
+        except Exception, e:
+            errors.append((("copy", (key,), copy_kwds), e))
+            return
+        stats["copied"] += 1
+        queue_delete(key)
+
+    def queue_delete(key):
+        to_delete.append(key)
+        if len(to_delete) >= max_delete_keys:
+            flush_deletes()
+
+    def flush_deletes():
+        if to_delete:
+            failed = bucket.delete_many(to_delete)
+            for (key, code, message) in failed:
+                errors.append((("delete", (key,), {}),
+                               OSSError(message or "delete failed",
+                                        key=key, code=code)))
+            stats["deleted"] += len(to_delete) - len(failed)
+            del to_delete[:]
+
+    pool = WorkerPool(n_workers)
+    try:
+        for (key, modify, etag, size) in bucket.listdir(prefix=src):
+            n_keys += 1
+            if ckpt and ckpt.is_copied(key, etag):
+                stats["skipped"] += 1
+                queue_delete(key)
+                continue
+            in_flight.append((key, pool.submit(copy, key, etag)))
+            # Bound the listing read ahead of the copies.
+            if len(in_flight) >= 4 * n_workers:
+                finish(*in_flight.popleft())
+        while in_flight:
+            finish(*in_flight.popleft())
+        flush_deletes()
+    finally:
+        # Copies still running would record themselves in the checkpoint,
+        # so they must be done with before it is closed.
+        pool.shutdown(wait=True, cancel=True)
+        if ckpt:
+            ckpt.close()
+    if errors:
+        raise BatchError(errors, n_keys)
+    if ckpt:
+        os.remove(checkpoint)
+    return stats
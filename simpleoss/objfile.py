@@ -0,0 +1,376 @@
+"""File objects over OSS keys
+
+`OSSBucket.open` returns these::
+
+    >>> fp = bucket.open("data/archive.zip")
+    >>> fp.seek(-22, os.SEEK_END)
+    >>> fp.read(22)
+    'PK\\x05\\x06...'
+
+`OSSReader` is a seekable `io.RawIOBase` serving reads through Range
+requests. Blocks are kept in a small LRU cache, and once reads look
+sequential, the blocks ahead are fetched concurrently before they are asked
+for.
+
+`OSSWriter` uploads what is written to it, without needing to know the size
+up front::
+
+    >>> with bucket.open("exports/today.csv", "wb") as fp:
+    ...     for row in rows:
+    ...         fp.write(format_row(row))
+
+Content is sent as a multipart upload, parts going up in the background
+while more is written, or as a single PUT if it all fits in one part.
+"""
+
+from __future__ import with_statement
+
+import io
+from collections import OrderedDict, deque
+
+from .workers import WorkerPool
+
+#: OSS rejects smaller parts, except for the last.
+min_part_size = 100 << 10
+
+class OSSReader(io.RawIOBase):
+    """Random-access reads of *key* in *bucket*, *block_size* bytes at a
+    time.
+
+    At most *cache_blocks* blocks are cached. After two reads of consecutive
+    blocks, up to *readahead* blocks ahead are prefetched on *n_workers*
+    threads. The object must not change while open: reads are made
+    conditional on the ETag seen when opening.
+
+    If the bucket has a `MemoryBudget`, cached blocks are charged to it.
+    Blocks are then only prefetched while the budget allows, and the
+    reader's own oldest blocks are dropped before waiting for it.
+    """
+
+    def __init__(self, bucket, key, block_size=1 << 20, cache_blocks=16,
+                 readahead=4, n_workers=4):
+        super(OSSReader, self).__init__()
+        if cache_blocks <= readahead:
+            raise ValueError("cache_blocks must be larger than readahead")
+        self.bucket = bucket
+        self.key = key
+        self.name = key
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.readahead = readahead
+        info = bucket.info(key)
+        self.size = info["size"]
+        self.etag = getattr(info, "etag", None)
+        self.budget = getattr(bucket, "memory_budget", None)
+        self._pos = 0
+        self._cache = OrderedDict()
+        self._last_block = None
+        self._streak = 0
+        self._pool = WorkerPool(n_workers) if readahead else None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        self._checkClosed()
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        self._checkClosed()
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError("invalid whence %r" % (whence,))
+        if pos < 0:
+            raise IOError("negative seek position %d" % (pos,))
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        self._checkClosed()
+        n = 0
+        want = len(b)
+        while n < want and self._pos < self.size:
+            block_no, offset = divmod(self._pos, self.block_size)
+            chunk = self._block(block_no)[offset:offset + want - n]
+            b[n:n + len(chunk)] = chunk
+            n += len(chunk)
+            self._pos += len(chunk)
+        return n
+
+    def close(self):
+        if not self.closed and self._pool:
+            self._pool.shutdown(wait=False, cancel=True)
+        while self._cache:
+            self._discard(*self._cache.popitem())
+        super(OSSReader, self).close()
+
+    def _block_len(self, block_no):
+        first = block_no * self.block_size
+        return min(first + self.block_size, self.size) - first
+
+    def _charge(self, block_no):
+        n = self._block_len(block_no)
+        while not self.budget.acquire(n, block=False):
+            for old in self._cache:
+                if isinstance(self._cache[old], str):
+                    self._discard(old, self._cache.pop(old))
+                    break
+            else:
+                self.budget.acquire(n)
+                break
+
+    def _discard(self, block_no, entry):
+        if not self.budget:
+            return
+        n = self._block_len(block_no)
+        if isinstance(entry, str):
+            self.budget.release(n)
+        else:
+            # Still being fetched, so still using memory until it's done.
+            entry.add_done_callback(lambda fut: self.budget.release(n))
+
+    def _fetch(self, block_no):
+        first = block_no * self.block_size
+        last = min(first + self.block_size, self.size) - 1
+        headers = {"Range": "bytes=%d-%d" % (first, last)}
+        if self.etag:
+            headers["If-Match"] = self.etag
+        resp = self.bucket.get(self.key, headers=headers)
+        try:
+            data = resp.read()
+        finally:
+            resp.close()
+        if getattr(resp, "code", 206) == 200:
+            # Ranges not honoured, so this is the whole object.
+            data = data[first:last + 1]
+        if len(data) != last - first + 1:
+            # Served short, so a read of it would never get any further.
+            raise IOError("got %d bytes of %s for bytes %d-%d"
+                          % (len(data), self.key, first, last))
+        return data
+
+    def _block(self, block_no):
+        if block_no == self._last_block:
+            pass
+        elif self._last_block is not None and block_no == self._last_block + 1:
+            self._streak += 1
+        else:
+            self._streak = 0
+        self._last_block = block_no
+        if self._pool and self._streak >= 1:
+            n_blocks = (self.size + self.block_size - 1) // self.block_size
+            for ahead in xrange(block_no + 1,
+                                min(block_no + 1 + self.readahead, n_blocks)):
+                if ahead in self._cache:
+                    continue
+                if self.budget and not self.budget.acquire(
+                        self._block_len(ahead), block=False):
+                    break
+                self._cache[ahead] = self._pool.submit(self._fetch, ahead)
+        entry = self._cache.pop(block_no, None)
+        if entry is None and self.budget:
+            self._charge(block_no)
+        try:
+            if entry is None:
+                data = self._fetch(block_no)
+            elif isinstance(entry, str):
+                data = entry
+            else:
+                data = entry.result()
+        except:
+            if self.budget:
+                self.budget.release(self._block_len(block_no))
+            raise
+        self._cache[block_no] = data
+        while len(self._cache) > self.cache_blocks:
+            self._discard(*self._cache.popitem(last=False))
+        return data
+
+class OSSWriter(io.RawIOBase):
+    """Upload to *key* in *bucket* what is written, in parts of *part_size*.
+
+    At most *max_in_flight* parts are uploaded at a time, on as many
+    threads; writes block while that many are, so memory use stays below
+    about (*max_in_flight* + 1) * *part_size*. Content that fits in one part
+    is sent with a single `OSSBucket.put`, given the keyword arguments
+    *put_kwds*, which also apply to the multipart upload. *timeout* applies
+    to that PUT or to each part.
+
+    The upload completes on `close`. Leaving a ``with`` block on an
+    exception aborts it instead, as does `abort`, or dropping the writer
+    without closing it. If the bucket checks CRCs,
+    each part is checked, and the object against the CRCs of the parts
+    combined. If it has a `MemoryBudget`, part buffers are taken from it,
+    and writes wait while it is spent.
+    """
+
+    def __init__(self, bucket, key, part_size=8 << 20, max_in_flight=4,
+                 timeout=None, **put_kwds):
+        super(OSSWriter, self).__init__()
+        if part_size < min_part_size:
+            raise ValueError("part_size must be at least %d" % min_part_size)
+        self.bucket = bucket
+        self.key = key
+        self.name = key
+        self.part_size = part_size
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.put_kwds = put_kwds
+        self.upload_id = None
+        self.budget = getattr(bucket, "memory_budget", None)
+        # The part being written, which is the first _buf_len bytes of _buf.
+        self._buf = None
+        self._buf_len = 0
+        self._parts = []
+        self._part_crcs = {}
+        self._in_flight = deque()
+        self._pool = None
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def __del__(self):
+        # io.IOBase would close it, completing the upload with whatever was
+        # written before the writer was dropped, likely on an exception.
+        try:
+            self.abort()
+        except Exception:
+            pass
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._checkClosed()
+        if isinstance(b, memoryview):
+            b = b.tobytes()
+        b = bytes(b)
+        offset = 0
+        while offset < len(b):
+            # Only cut a part once there's more, so that content of exactly
+            # one part still goes as a single PUT.
+            if self._buf_len == self.part_size:
+                self._upload_part(*self._take_buffer())
+            if self._buf is None:
+                if self.budget:
+                    self._buf = self.budget.get_buffer(self.part_size)
+                else:
+                    self._buf = bytearray()
+            n = min(len(b) - offset, self.part_size - self._buf_len)
+            self._buf[self._buf_len:self._buf_len + n] = buffer(b, offset, n)
+            self._buf_len += n
+            offset += n
+        return len(b)
+
+    def _take_buffer(self):
+        buf, n = self._buf, self._buf_len
+        self._buf, self._buf_len = None, 0
+        return buf, n
+
+    def _give_back(self, buf):
+        if self.budget and buf is not None:
+            self.budget.put_buffer(buf)
+
+    def _upload_part(self, buf, n):
+        # Parts are sent straight from the buffer, which is given back once
+        # the part is done with.
+        try:
+            if self.upload_id is None:
+                self.upload_id = self.bucket.initiate_multipart(self.key,
+                                                                **self.put_kwds)
+                self._pool = WorkerPool(self.max_in_flight)
+            while len(self._in_flight) >= self.max_in_flight:
+                self._part_done(self._in_flight.popleft())
+            part_no = len(self._parts) + len(self._in_flight) + 1
+            fut = self._pool.submit(_send_part, self.bucket, self.key,
+                                    self.upload_id, part_no,
+                                    buffer(buf, 0, n), self.timeout)
+        except:
+            self._give_back(buf)
+            self.abort()
+            raise
+        # Not bound to self, which would make a cycle through _in_flight.
+        budget = self.budget
+        if budget:
+            fut.add_done_callback(lambda fut: budget.put_buffer(buf))
+        self._in_flight.append(fut)
+
+    def _part_done(self, fut):
+        part_no, etag, crc = fut.result()
+        self._parts.append((part_no, etag))
+        self._part_crcs[part_no] = crc
+
+    def _combined_crc(self):
+        if not getattr(self.bucket, "check_crc64", False):
+            return None
+        crcs = [self._part_crcs[n] for (n, etag) in sorted(self._parts)]
+        return reduce(lambda a, b: a.combine(b), crcs).crc
+
+    def close(self):
+        """Upload what remains and complete the upload."""
+        if self.closed:
+            return
+        buf, n = self._take_buffer()
+        if self.upload_id is None:
+            try:
+                data = str(buffer(buf, 0, n)) if buf is not None else ""
+                self._give_back(buf)
+                self.bucket.put(self.key, data, timeout=self.timeout,
+                                **self.put_kwds)
+            finally:
+                super(OSSWriter, self).close()
+            return
+        if n:
+            self._upload_part(buf, n)
+        else:
+            self._give_back(buf)
+        try:
+            while self._in_flight:
+                self._part_done(self._in_flight.popleft())
+            crc = self._combined_crc()
+            if crc is None:
+                self.bucket.complete_multipart(self.key, self.upload_id,
+                                               self._parts)
+            else:
+                self.bucket.complete_multipart(self.key, self.upload_id,
+                                               self._parts, crc=crc)
+        except:
+            self.abort()
+            raise
+        self._pool.shutdown()
+        super(OSSWriter, self).close()
+
+    def abort(self):
+        """Discard what was written, aborting any multipart upload."""
+        if self.closed:
+            return
+        self._give_back(self._take_buffer()[0])
+        super(OSSWriter, self).close()
+        self._in_flight.clear()
+        if self.upload_id is not None:
+            self._pool.shutdown(wait=True, cancel=True)
+            self.bucket.abort_multipart(self.key, self.upload_id)
+
+def _send_part(bucket, key, upload_id, part_no, data, timeout):
+    # Not a method, so that parts in flight don't keep a dropped writer from
+    # being collected and aborted.
+    if not getattr(bucket, "check_crc64", False):
+        etag = bucket.upload_part(key, upload_id, part_no, data,
+                                  timeout=timeout)
+        return part_no, etag, None
+    from .crc64 import CRC64
+    crc = CRC64(data)
+    etag = bucket.upload_part(key, upload_id, part_no, data, timeout=timeout,
+                              crc=crc.crc)
+    return part_no, etag, crc
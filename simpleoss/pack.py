@@ -0,0 +1,194 @@
+"""Packing many small blobs into one object
+
+Storing millions of tiny objects costs a request apiece. A pack puts many
+members into one object, followed by an index, and members are then read
+with HTTP Range requests::
+
+    >>> with PackWriter(bucket, "packs/0001.pack") as pack:
+    ...     for name, data in thumbnails:
+    ...         pack.add(name, data)
+    >>> reader = PackReader(bucket, "packs/0001.pack")
+    >>> reader.read("thumbs/1.jpg")
+    '\\xff\\xd8...'
+    >>> reader.read_many(["thumbs/1.jpg", "thumbs/2.jpg"])
+    {'thumbs/1.jpg': '\\xff\\xd8...', 'thumbs/2.jpg': '\\xff\\xd8...'}
+
+The layout is the members back to back, then the index as JSON (a list of
+[name, offset, size]), then a trailer of the index offset and length as two
+big-endian 64-bit integers and the magic ``OSSPACK1``. The reader fetches
+the tail of the pack once to get the index, and `read_many` fetches members
+lying close together in a single range request.
+"""
+
+from __future__ import with_statement
+
+import json
+import struct
+import tempfile
+import threading
+
+pack_magic = "OSSPACK1"
+trailer_format = ">QQ8s"
+trailer_size = struct.calcsize(trailer_format)
+
+class PackWriter(object):
+    """Write a pack to *key* in *bucket*, spooling it to a temporary file
+    once over *max_memory* bytes. Uploads on `close`."""
+
+    def __init__(self, bucket, key, max_memory=8 << 20, **put_kwds):
+        self.bucket = bucket
+        self.key = key
+        self.put_kwds = put_kwds
+        self.index = []
+        self._names = set()
+        self._fp = tempfile.SpooledTemporaryFile(max_size=max_memory)
+        self._offset = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._fp.close()
+
+    def add(self, name, data):
+        """Add member *name* with contents *data*."""
+        if name in self._names:
+            raise ValueError("duplicate member %r" % (name,))
+        self._names.add(name)
+        self._fp.write(data)
+        self.index.append([name, self._offset, len(data)])
+        self._offset += len(data)
+
+    def close(self):
+        """Write the index and upload the pack."""
+        index = json.dumps(self.index, separators=(",", ":"))
+        self._fp.write(index)
+        self._fp.write(struct.pack(trailer_format, self._offset, len(index),
+                                   pack_magic))
+        size = self._fp.tell()
+        self._fp.seek(0)
+        put_kwds = dict(self.put_kwds)
+        put_kwds["headers"] = dict(put_kwds.get("headers", {}),
+                                   **{"Content-Length": str(size)})
+        put_kwds.setdefault("mimetype", "application/octet-stream")
+        try:
+            self.bucket.put(self.key, data=self._fp, **put_kwds)
+        finally:
+            self._fp.close()
+
+class PackReader(object):
+    """Read members of the pack *key* in *bucket*.
+
+    The index is fetched on first use, in a request for the last *tail_size*
+    bytes of the pack, and kept. Members less than *max_gap* bytes apart are
+    fetched together by `read_many`, in ranges of up to *max_range* bytes.
+    If the bucket has a `MemoryBudget`, those ranges are charged to it.
+    """
+
+    def __init__(self, bucket, key, tail_size=64 << 10, max_gap=16 << 10,
+                 max_range=8 << 20):
+        self.bucket = bucket
+        self.key = key
+        self.tail_size = tail_size
+        self.max_gap = max_gap
+        self.max_range = max_range
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _get_range(self, first, last=None):
+        # A negative *first* asks for the last -first bytes.
+        if first < 0:
+            spec = "bytes=%d" % (first,)
+        else:
+            spec = "bytes=%d-%d" % (first, last)
+        resp = self.bucket.get(self.key, headers={"Range": spec})
+        data = resp.read()
+        resp.close()
+        if getattr(resp, "code", 206) == 200:
+            # Ranges not honoured, so this is the whole pack.
+            if first < 0:
+                return data[first:]
+            return data[first:last + 1]
+        return data
+
+    @property
+    def index(self):
+        """Map member names to (offset, size)."""
+        with self._lock:
+            if self._index is None:
+                self._index = self._fetch_index()
+            return self._index
+
+    def _fetch_index(self):
+        tail = self._get_range(-self.tail_size)
+        if len(tail) < trailer_size:
+            raise ValueError("%r is too short to be a pack" % (self.key,))
+        index_offset, index_len, magic = struct.unpack(
+            trailer_format, tail[-trailer_size:])
+        if magic != pack_magic:
+            raise ValueError("%r is not a pack" % (self.key,))
+        tail = tail[:-trailer_size]
+        if index_len > len(tail):
+            # The index is larger than the tail we guessed at.
+            more = self._get_range(index_offset,
+                                   index_offset + index_len - len(tail) - 1)
+            tail = more + tail
+        index = json.loads(tail[len(tail) - index_len:])
+        return dict((name, (offset, size)) for (name, offset, size) in index)
+
+    def names(self):
+        """List the member names, in pack order."""
+        index = self.index
+        return sorted(index, key=index.__getitem__)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def read(self, name):
+        """Fetch the contents of member *name*."""
+        return self.read_many([name])[name]
+
+    def read_many(self, names):
+        """Fetch the contents of members *names*, as a dict.
+
+        Raises `KeyError` for names not in the pack.
+        """
+        index = self.index
+        members = sorted((index[name] + (name,) for name in set(names)))
+        budget = getattr(self.bucket, "memory_budget", None)
+        result = {}
+        for first, last, group in self._coalesce(members):
+            # The range is charged to any budget while members are cut out
+            # of it; the members are the caller's.
+            n = max(0, last - first + 1)
+            if budget and n:
+                budget.acquire(n)
+            try:
+                data = self._get_range(first, last) if n else ""
+                for offset, size, name in group:
+                    result[name] = data[offset - first:offset - first + size]
+            finally:
+                if budget and n:
+                    budget.release(n)
+        return result
+
+    def _coalesce(self, members):
+        # Group (offset, size, name) sorted by offset into ranges, yielding
+        # (first byte, last byte, members).
+        group = []
+        for member in members:
+            offset, size = member[:2]
+            if group:
+                first = group[0][0]
+                last = max(o + s for (o, s, n) in group) - 1
+                if (offset - last - 1 <= self.max_gap and
+                        offset + size - first <= self.max_range):
+                    group.append(member)
+                    continue
+                yield first, last, group
+            group = [member]
+        if group:
+            yield (group[0][0], max(o + s for (o, s, n) in group) - 1, group)
@@ -0,0 +1,117 @@
+"""Client-side rate limiting of requests and bandwidth
+
+Give a bucket a `RateLimiter` to keep it from tripping server-side
+throttling::
+
+    >>> limiter = RateLimiter(requests_per_sec=50, upload_bps=4 << 20)
+    >>> bucket = OSSBucket("my-bucket", rate_limiter=limiter)
+
+The limiter is thread-safe, and the same instance can be given to several
+buckets to have them share one budget. Bodies are throttled chunk by chunk as
+they are read, so bandwidth is smoothed out rather than spent in bursts.
+"""
+
+from __future__ import with_statement
+
+import time
+import threading
+
+class TokenBucket(object):
+    """Hand out *rate* tokens per second, saving up at most *burst*.
+
+    Consuming more tokens than are available puts the bucket in debt, and the
+    consumer sleeps until the debt is paid off. That way amounts larger than
+    *burst* can still be consumed, and concurrent consumers queue up fairly.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive, got %r" % (rate,))
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.burst
+        self.stamp = clock()
+        self._lock = threading.Lock()
+
+    def consume(self, n=1):
+        """Take *n* tokens, blocking as long as it takes to earn them."""
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= n
+            delay = -self.tokens / self.rate
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+class ThrottledFile(object):
+    """Wrap file-like *fp* so that reads spend tokens via *consume*."""
+
+    __slots__ = ("fp", "consume")
+
+    def __init__(self, fp, consume):
+        self.fp = fp
+        self.consume = consume
+
+    def __getattr__(self, attnam):
+        return getattr(self.fp, attnam)
+
+    def read(self, *a, **k):
+        chunk = self.fp.read(*a, **k)
+        if chunk:
+            self.consume(len(chunk))
+        return chunk
+
+class RateLimiter(object):
+    """Cap requests per second and upload/download bytes per second.
+
+    Each limit is optional, and `None` means unlimited. Up to *burst_seconds*
+    worth of unused capacity is saved up for later.
+    """
+
+    def __init__(self, requests_per_sec=None, upload_bps=None,
+                 download_bps=None, burst_seconds=1.0, **bucket_kwds):
+        def make_bucket(rate):
+            if rate:
+                return TokenBucket(rate, burst=rate * burst_seconds,
+                                   **bucket_kwds)
+        self.requests = make_bucket(requests_per_sec)
+        self.upload = make_bucket(upload_bps)
+        self.download = make_bucket(download_bps)
+
+    def acquire_request(self):
+        if self.requests:
+            self.requests.consume()
+
+    def wrap_upload(self, data):
+        """Throttle request body *data*, a string or a file-like object."""
+        if not self.upload or data is None:
+            return data
+        elif hasattr(data, "read"):
+            return ThrottledFile(data, self.upload.consume)
+        else:
+            # A string body is written in one go by httplib, so all we can do
+            # is pay for it up front.
+            self.upload.consume(len(data))
+            return data
+
+    def wrap_response(self, resp):
+        """Throttle the reads of response *resp*, keeping its identity."""
+        if self.download:
+            for attnam in ("read", "readline"):
+                setattr(resp, attnam,
+                        self._throttled(getattr(resp, attnam)))
+        return resp
+
+    def _throttled(self, read):
+        consume = self.download.consume
+        def throttled_read(*a, **k):
+            chunk = read(*a, **k)
+            if chunk:
+                consume(len(chunk))
+            return chunk
+        return throttled_read
@@ -0,0 +1,260 @@
+"""Recording bucket traffic, and replaying it as a load test
+
+A `TraceRecorder` given to a bucket as *recorder* logs the shape of each
+request sent: when, the method, a hash of the key, the size, how long it
+took and the status. Keys themselves are not recorded::
+
+    >>> recorder = TraceRecorder("traffic.trace")
+    >>> bucket = OSSBucket("my-bucket", recorder=recorder)
+
+`replay` re-issues a trace against any bucket, at the original pace or
+scaled, and reports latencies and throughput. From the command line::
+
+    python -m simpleoss.replay traffic.trace --base-url http://staging/bucket \\
+        --access-key ... --secret-key ... --speed 2 --workers 32
+
+The trace format is tab-separated lines of milliseconds since the start,
+method, key hash, size in bytes, duration in milliseconds and HTTP status
+(0 for network errors), after a ``#`` header line.
+"""
+
+from __future__ import with_statement
+
+import sys
+import time
+import hashlib
+import threading
+
+from .bucket import OSSBucket, OSSError
+from .utils import ObjectInfo
+from .workers import WorkerPool
+
+trace_header = "# simpleoss trace v1\n"
+
+def key_hash(key):
+    """Hash *key* for a trace, or "-" for requests without one."""
+    if not key:
+        return "-"
+    if isinstance(key, unicode):
+        key = key.encode("utf-8")
+    return hashlib.sha1(key).hexdigest()[:16]
+
+class TraceRecorder(object):
+    """Append request records to the file *path*, or file object *fp*."""
+
+    def __init__(self, path=None, fp=None, clock=time.time):
+        if fp is None:
+            fp = open(path, "a")
+        self.fp = fp
+        self.clock = clock
+        self.started = clock()
+        self._lock = threading.Lock()
+        with self._lock:
+            if not fp.tell():
+                fp.write(trace_header)
+
+    def record(self, ossreq, start, resp=None, error=None):
+        """Log *ossreq*, sent at *start*, which got *resp* or *error*."""
+        now = self.clock()
+        if error is not None:
+            status = error.extra.get("code") or 0
+        else:
+            status = getattr(resp, "code", None) or 200
+        size = ossreq.headers.get("Content-Length")
+        if size is None and isinstance(ossreq.data, str):
+            size = len(ossreq.data)
+        if size is None and resp is not None and ossreq.method == "GET":
+            size = ObjectInfo(resp.info()).size
+        line = "%d\t%s\t%s\t%d\t%d\t%d\n" % (
+            (start - self.started) * 1000, ossreq.method,
+            key_hash(ossreq.key), int(size or 0), (now - start) * 1000, status)
+        with self._lock:
+            self.fp.write(line)
+
+    def close(self):
+        self.fp.close()
+
+def read_trace(fp):
+    """Yield (offset, method, key_hash, size, duration, status) from trace
+    file object *fp*, with times in seconds."""
+    for line in fp:
+        if line.startswith("#") or not line.strip():
+            continue
+        offset, method, khash, size, duration, status = line.split("\t")
+        yield (int(offset) / 1000.0, method, khash, int(size),
+               int(duration) / 1000.0, int(status))
+
+def percentile(values, p):
+    """The *p*th percentile of sorted *values*.
+
+    >>> percentile([1, 2, 3, 4], 50)
+    2
+    """
+    if not values:
+        return None
+    return values[max(0, int(round(len(values) * p / 100.0)) - 1)]
+
+class Replayer(object):
+    """Issue trace records against *bucket*, naming keys *prefix* plus
+    their hash, on *n_workers* threads."""
+
+    def __init__(self, bucket, prefix="replay/", n_workers=16,
+                 clock=time.time, sleep=time.sleep):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.n_workers = n_workers
+        self.clock = clock
+        self.sleep = sleep
+        self.latencies = {}
+        self.n_errors = 0
+        self.n_skipped = 0
+        self.n_bytes = 0
+        self._payloads = {}
+        self._lock = threading.Lock()
+
+    def key(self, khash):
+        return self.prefix + khash
+
+    def _payload(self, size):
+        try:
+            return self._payloads[size]
+        except KeyError:
+            return self._payloads.setdefault(size, "\0" * size)
+
+    def prepare(self, records):
+        """Create the objects that *records* read before writing them."""
+        written, created = set(), set()
+        for offset, method, khash, size, duration, status in records:
+            if khash == "-" or khash in written or khash in created:
+                continue
+            if method in ("GET", "HEAD") and status != 404:
+                self.bucket.put(self.key(khash), self._payload(size))
+                created.add(khash)
+            elif method == "PUT":
+                written.add(khash)
+
+    def issue(self, method, khash, size):
+        """Send one request like the one recorded, returning bytes moved."""
+        key = self.key(khash)
+        if method == "GET":
+            resp = self.bucket.get(key)
+            try:
+                return len(resp.read())
+            finally:
+                resp.close()
+        elif method == "HEAD":
+            self.bucket.info(key)
+            return 0
+        elif method == "PUT":
+            self.bucket.put(key, self._payload(size))
+            return size
+        elif method == "DELETE":
+            self.bucket.delete(key)
+            return 0
+        raise ValueError("cannot replay %s" % (method,))
+
+    def _run(self, scheduled, method, khash, size):
+        # Latency counts from when the trace says to send, so time spent
+        # waiting for a free worker under load is not left out.
+        try:
+            n_bytes = self.issue(method, khash, size)
+        except (OSSError, EnvironmentError):
+            with self._lock:
+                self.n_errors += 1
+            return
+        elapsed = self.clock() - scheduled
+        with self._lock:
+            self.latencies.setdefault(method, []).append(elapsed)
+            self.n_bytes += n_bytes
+
+    def replay(self, records, speed=1.0):
+        """Issue *records* at *speed* times their original pace, or as fast
+        as possible if *speed* is zero. Returns a report dict; see
+        `report`."""
+        pool = WorkerPool(self.n_workers)
+        started = self.clock()
+        try:
+            for offset, method, khash, size, duration, status in records:
+                if khash == "-" or method not in ("GET", "HEAD", "PUT", "DELETE"):
+                    self.n_skipped += 1
+                    continue
+                if speed:
+                    scheduled = started + offset / speed
+                    delay = scheduled - self.clock()
+                    if delay > 0:
+                        self.sleep(delay)
+                else:
+                    scheduled = self.clock()
+                pool.submit(self._run, scheduled, method, khash, size)
+        finally:
+            pool.shutdown(wait=True)
+        return self.report(self.clock() - started)
+
+    def report(self, elapsed):
+        """Summarize: per method, the count and latency percentiles; overall,
+        requests and bytes per second, errors and skipped records."""
+        methods = {}
+        n_requests = 0
+        for method, latencies in self.latencies.iteritems():
+            latencies = sorted(latencies)
+            n_requests += len(latencies)
+            methods[method] = {"count": len(latencies),
+                               "p50": percentile(latencies, 50),
+                               "p90": percentile(latencies, 90),
+                               "p99": percentile(latencies, 99),
+                               "max": latencies[-1]}
+        elapsed = elapsed or 1e-9
+        return {"methods": methods, "elapsed": elapsed,
+                "requests_per_sec": n_requests / elapsed,
+                "bytes_per_sec": self.n_bytes / elapsed,
+                "errors": self.n_errors, "skipped": self.n_skipped}
+
+def replay(trace_path, bucket, speed=1.0, n_workers=16, prefix="replay/",
+           prepare=True):
+    """Replay the trace at *trace_path* against *bucket*; see `Replayer`."""
+    with open(trace_path) as fp:
+        records = list(read_trace(fp))
+    replayer = Replayer(bucket, prefix=prefix, n_workers=n_workers)
+    if prepare:
+        replayer.prepare(records)
+    return replayer.replay(records, speed=speed)
+
+def format_report(report):
+    lines = ["%d requests in %.1f s: %.1f req/s, %.1f KiB/s, %d errors, "
+             "%d skipped" % (sum(m["count"] for m in report["methods"].values()),
+                             report["elapsed"], report["requests_per_sec"],
+                             report["bytes_per_sec"] / 1024.0,
+                             report["errors"], report["skipped"])]
+    for method, m in sorted(report["methods"].iteritems()):
+        lines.append("%-6s %6d  p50 %7.1f ms  p90 %7.1f ms  p99 %7.1f ms  "
+                     "max %7.1f ms" % (method, m["count"], m["p50"] * 1000,
+                                       m["p90"] * 1000, m["p99"] * 1000,
+                                       m["max"] * 1000))
+    return "\n".join(lines)
+
+def main(argv=None):
+    from optparse import OptionParser
+    parser = OptionParser(usage="%prog [options] TRACE")
+    parser.add_option("--base-url", help="bucket URL to replay against")
+    parser.add_option("--bucket", help="bucket name, if no base URL")
+    parser.add_option("--access-key")
+    parser.add_option("--secret-key")
+    parser.add_option("--speed", type="float", default=1.0,
+                      help="pace relative to the trace, 0 for flat out")
+    parser.add_option("--workers", type="int", default=16)
+    parser.add_option("--prefix", default="replay/",
+                      help="prefix for the replayed keys")
+    parser.add_option("--no-prepare", action="store_false", dest="prepare",
+                      default=True, help="don't create objects read first")
+    opts, args = parser.parse_args(argv)
+    if len(args) != 1:
+        parser.error("expected one trace file")
+    bucket = OSSBucket(opts.bucket, access_key=opts.access_key,
+                       secret_key=opts.secret_key, base_url=opts.base_url,
+                       secure=None)
+    report = replay(args[0], bucket, speed=opts.speed, n_workers=opts.workers,
+                    prefix=opts.prefix, prepare=opts.prepare)
+    print format_report(report)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Scheduling requests by priority, so bulk transfers leave room for the rest
+
+A `TransferScheduler` caps the requests a bucket has in flight, and when
+they queue, lets small interactive ones go first::
+
+    >>> scheduler = TransferScheduler(limit=8)
+    >>> bucket = OSSBucket("my-bucket", scheduler=scheduler)
+    >>> with scheduler.priority(BULK):
+    ...     bucket.put_file("backups/db.dump", "db.dump")
+
+The priority set by the with-block carries over to work the thread hands to
+a `simpleoss.workers.WorkerPool`, such as the parts of that upload.
+
+Requests are queued by class, `INTERACTIVE` or `BULK`, and let through by
+weighted fair queuing: each costs one plus its size in units of *cost_unit*
+bytes, divided by its class's weight, so a queue of multi-GB parts holds up
+a GET for about one part at most. Bulk requests are also kept to a share of
+the slots, leaving the rest to interactive ones.
+
+A slot is held while a request is sent and its response headers come back:
+the whole transfer for uploads, but download bodies are read after the slot
+is given back, so bulk downloads are best made in ranges, as `OSSReader`
+does.
+"""
+
+from __future__ import with_statement
+
+import re
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from . import workers
+
+INTERACTIVE, BULK = "interactive", "bulk"
+
+# Schedulers to the classes set by priority(), for the current thread.
+_local = threading.local()
+
+def _priorities():
+    try:
+        return _local.classes
+    except AttributeError:
+        _local.classes = {}
+        return _local.classes
+
+@contextmanager
+def _use_priorities(classes):
+    outer = _priorities()
+    _local.classes = classes
+    try:
+        yield
+    finally:
+        _local.classes = outer
+
+def _carry_priorities():
+    classes = _priorities()
+    if classes:
+        return _use_priorities(dict(classes))
+
+workers.context_hooks.append(_carry_priorities)
+
+_range_re = re.compile(r"bytes=(\d+)-(\d+)$")
+
+def request_size(req):
+    """The bytes *req*, a urllib2 request, sends or asks for, if known."""
+    length = req.get_header("Content-length")
+    if length is not None:
+        return int(length)
+    data = req.get_data()
+    if isinstance(data, str):
+        return len(data)
+    match = _range_re.match(req.get_header("Range", "").strip())
+    if match:
+        return int(match.group(2)) - int(match.group(1)) + 1
+    return 0
+
+class TransferScheduler(object):
+    """Let through up to *limit* requests at a time, queueing the rest.
+
+    *weights* maps priority classes to their share of the queue, and
+    *limits* to how many slots each may hold at most; by default
+    interactive requests weigh eight times as much as bulk ones, and bulk
+    requests get all but a quarter of the slots.
+
+    Requests are classed by *classify(req, size)*, which defaults to
+    `classify`, unless the sending thread is within `priority`.
+    """
+
+    def __init__(self, limit=8, weights=None, limits=None, classify=None,
+                 cost_unit=1 << 20):
+        if weights is None:
+            weights = {INTERACTIVE: 8.0, BULK: 1.0}
+        if limits is None:
+            limits = {BULK: max(1, limit - limit // 4)}
+        self.limit = limit
+        self.weights = weights
+        self.limits = limits
+        if classify is not None:
+            self.classify = classify
+        self.cost_unit = cost_unit
+        self.in_flight = dict.fromkeys(weights, 0)
+        self.counts = dict.fromkeys(weights, 0)
+        self._waiting = dict((cls, deque()) for cls in weights)
+        self._finish = dict.fromkeys(weights, 0.0)
+        self._vtime = 0.0
+        self._cond = threading.Condition()
+
+    def __repr__(self):
+        return "<%s limit=%d in_flight=%d>" % (
+            self.__class__.__name__, self.limit, sum(self.in_flight.values()))
+
+    def classify(self, req, size):
+        """Bulk if *req* is a multipart upload part or moves a megabyte or
+        more, interactive otherwise."""
+        if "partNumber=" in req.get_full_url() or size >= (1 << 20):
+            return BULK
+        return INTERACTIVE
+
+    @contextmanager
+    def priority(self, cls):
+        """Send the requests this thread makes in the with-block, or has
+        a `WorkerPool` make, as *cls*."""
+        classes = _priorities()
+        outer = classes.get(self)
+        classes[self] = cls
+        try:
+            yield
+        finally:
+            if outer is None:
+                del classes[self]
+            else:
+                classes[self] = outer
+
+    def acquire(self, req):
+        """Wait for a slot for urllib2 request *req*, returning a ticket to
+        `release` it with."""
+        size = request_size(req)
+        cls = _priorities().get(self) or self.classify(req, size)
+        cost = (1.0 + float(size) / self.cost_unit) / self.weights[cls]
+        with self._cond:
+            tag = max(self._vtime, self._finish[cls]) + cost
+            self._finish[cls] = tag
+            ticket = [cls, tag, False]
+            self._waiting[cls].append(ticket)
+            self._dispatch()
+            while not ticket[2]:
+                self._cond.wait()
+        return ticket
+
+    def release(self, ticket):
+        with self._cond:
+            self.in_flight[ticket[0]] -= 1
+            self._dispatch()
+
+    def _dispatch(self):
+        granted = False
+        while sum(self.in_flight.values()) < self.limit:
+            heads = [queue[0] for (cls, queue) in self._waiting.iteritems()
+                     if queue and self.in_flight[cls] <
+                                  self.limits.get(cls, self.limit)]
+            if not heads:
+                break
+            ticket = min(heads, key=lambda ticket: ticket[1])
+            cls = ticket[0]
+            self._waiting[cls].popleft()
+            self._vtime = ticket[1]
+            self.in_flight[cls] += 1
+            self.counts[cls] += 1
+            ticket[2] = granted = True
+        if granted:
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, req):
+        """Hold a slot for *req* for the duration of a with-block."""
+        ticket = self.acquire(req)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def snapshot(self):
+        """Requests in flight, waiting and let through so far, by class."""
+        with self._cond:
+            return dict((cls, {"in_flight": self.in_flight[cls],
+                               "waiting": len(self._waiting[cls]),
+                               "sent": self.counts[cls]})
+                        for cls in self.weights)
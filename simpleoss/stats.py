@@ -0,0 +1,207 @@
+"""Transfer statistics across many concurrent uploads and downloads
+
+A `TransferStats` given to one or more buckets follows every request body
+sent and response body read through them::
+
+    >>> stats = TransferStats()
+    >>> bucket = OSSBucket("my-bucket", transfer_stats=stats)
+    >>> stats.snapshot()
+    {'active': 3, 'finished': 120, 'bytes_done': 73400320,
+     'bytes_total': 104857600, 'rate': 10485760.0, 'eta': 3.0}
+
+*rate* is in bytes per second over the last few seconds, and *eta* is the
+time left for the active transfers of known size at that rate.
+"""
+
+from __future__ import with_statement
+
+import time
+import threading
+from collections import deque
+
+from .utils import ObjectInfo
+
+class Transfer(object):
+    """One upload or download, of *size* bytes if known."""
+
+    __slots__ = ("stats", "name", "direction", "size", "done", "finished")
+
+    def __init__(self, stats, name, direction, size=None):
+        self.stats = stats
+        self.name = name
+        self.direction = direction
+        self.size = size
+        self.done = 0
+        self.finished = False
+
+    def __repr__(self):
+        return "<%s %s %r %d/%s>" % (self.__class__.__name__, self.direction,
+                                     self.name, self.done, self.size)
+
+    def add(self, n):
+        """Count *n* more bytes transferred."""
+        self.stats._add(self, n)
+
+    def finish(self):
+        self.stats._finish(self)
+
+    def reset(self, n=0):
+        """Count only *n* bytes transferred so far, as when the body is sent
+        again from there."""
+        self.stats._reset(self, n)
+
+    def abort(self):
+        """Drop the transfer, taking back its bytes, as it failed."""
+        self.stats._reset(self, 0, abort=True)
+
+class CountingFile(object):
+    """Counts bytes read from *fp* towards *transfer*, finishing it on EOF."""
+
+    __slots__ = ("fp", "transfer")
+
+    def __init__(self, fp, transfer):
+        self.fp = fp
+        self.transfer = transfer
+
+    def __getattr__(self, attnam):
+        return getattr(self.fp, attnam)
+
+    def read(self, *a, **k):
+        chunk = self.fp.read(*a, **k)
+        if chunk:
+            self.transfer.add(len(chunk))
+        else:
+            self.transfer.finish()
+        return chunk
+
+class SeekableCountingFile(CountingFile):
+    """A `CountingFile` that starts counting again from where it is seeked
+    to, so that a body sent twice is counted once."""
+
+    __slots__ = ()
+
+    def seek(self, *a, **k):
+        self.fp.seek(*a, **k)
+        self.transfer.reset(self.fp.tell())
+
+class TransferStats(object):
+    """Totals of the transfers reporting to it, safe to share between threads
+    and buckets. The rate is measured over the last *window* seconds."""
+
+    def __init__(self, window=5.0, clock=time.time):
+        self.window = window
+        self.clock = clock
+        self.active = set()
+        self.n_finished = 0
+        self.bytes_done = 0
+        self._samples = deque([(clock(), 0)])
+        self._lock = threading.Lock()
+
+    def start(self, name, direction, size=None):
+        """Begin a `Transfer` of *name* in *direction*, "up" or "down"."""
+        transfer = Transfer(self, name, direction, size)
+        with self._lock:
+            self.active.add(transfer)
+        return transfer
+
+    def _add(self, transfer, n):
+        now = self.clock()
+        with self._lock:
+            # Keep about twenty samples per window, each of the bytes done
+            # up to then.
+            if now - self._samples[-1][0] >= self.window / 20:
+                self._samples.append((now, self.bytes_done))
+            while len(self._samples) > 1 and \
+                    now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+            transfer.done += n
+            self.bytes_done += n
+        if transfer.size is not None and transfer.done >= transfer.size:
+            self._finish(transfer)
+
+    def _finish(self, transfer):
+        with self._lock:
+            if transfer in self.active:
+                transfer.finished = True
+                self.active.discard(transfer)
+                self.n_finished += 1
+
+    def _reset(self, transfer, n, abort=False):
+        with self._lock:
+            self.bytes_done += n - transfer.done
+            transfer.done = n
+            if transfer.finished:
+                transfer.finished = False
+                self.n_finished -= 1
+            if abort:
+                self.active.discard(transfer)
+            else:
+                self.active.add(transfer)
+
+    def rate(self):
+        """Bytes per second over the last *window* seconds."""
+        now = self.clock()
+        with self._lock:
+            then, bytes_then = self._samples[0]
+            bytes_done = self.bytes_done
+        if now <= then:
+            return 0.0
+        # Bytes taken back by resets can leave less done than before.
+        return max(0.0, (bytes_done - bytes_then) / float(now - then))
+
+    def snapshot(self):
+        """Summarize the transfers as a dict, for monitoring."""
+        rate = self.rate()
+        with self._lock:
+            active = list(self.active)
+            rv = {"active": len(active), "finished": self.n_finished,
+                  "bytes_done": self.bytes_done}
+        sized = [t for t in active if t.size is not None]
+        remaining = sum(max(0, t.size - t.done) for t in sized)
+        rv["bytes_total"] = rv["bytes_done"] + remaining
+        rv["rate"] = rate
+        rv["eta"] = remaining / rate if rate else None
+        return rv
+
+    def track_upload(self, req):
+        """Follow the body of urllib2 request *req*, returning the transfer.
+
+        A string body is sent in one go, so it is counted up front. A file
+        body is counted as it is read, and again from the start if rewound
+        to be resent.
+        """
+        data = req.get_data()
+        size = req.get_header("Content-length")
+        if size is None and not hasattr(data, "read"):
+            size = len(data)
+        transfer = self.start(req.get_full_url(), "up",
+                              None if size is None else int(size))
+        if hasattr(data, "seek"):
+            req.add_data(SeekableCountingFile(data, transfer))
+        elif hasattr(data, "read"):
+            req.add_data(CountingFile(data, transfer))
+        else:
+            transfer.add(len(data))
+        return transfer
+
+    def track_download(self, resp):
+        """Follow the reads of response *resp*, keeping its identity."""
+        transfer = self.start(resp.geturl(), "down",
+                              ObjectInfo(resp.info()).size)
+        def counted(read):
+            def counted_read(*a, **k):
+                chunk = read(*a, **k)
+                if chunk:
+                    transfer.add(len(chunk))
+                else:
+                    transfer.finish()
+                return chunk
+            return counted_read
+        for attnam in ("read", "readline"):
+            setattr(resp, attnam, counted(getattr(resp, attnam)))
+        close = resp.close
+        def counted_close():
+            transfer.finish()
+            close()
+        resp.close = counted_close
+        return resp
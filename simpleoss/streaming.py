@@ -8,18 +8,33 @@ Usage::
     ...     bucket.put_file("memdump.bin", fp)
 """
 
+from __future__ import with_statement
+
 import os
+import stat
+import time
 import urllib2
 from simpleoss.bucket import OSSBucket
 
 class ProgressCallingFile(object):
-    __slots__ = ("fp", "pos", "size", "progress")
+    """Calls *progress* as *fp* is read, at most every *min_interval*
+    seconds or *min_bytes* bytes, besides once on EOF."""
+
+    __slots__ = ("fp", "pos", "size", "progress", "min_interval", "min_bytes",
+                 "clock", "last_time", "last_pos")
 
-    def __init__(self, fp, size, progress):
+    def __init__(self, fp, size, progress, min_interval=0.0, min_bytes=0,
+                 clock=time.time, pos=None):
         self.fp = fp
-        self.pos = fp.tell()
+        if pos is None:
+            pos = fp.tell()
+        self.pos = self.last_pos = pos
         self.size = size
         self.progress = progress
+        self.min_interval = min_interval
+        self.min_bytes = min_bytes
+        self.clock = clock
+        self.last_time = clock() if min_interval else 0.0
 
     def __getattr__(self, attnam):
         return getattr(self.fp, attnam)
@@ -27,25 +42,44 @@ class ProgressCallingFile(object):
     def read(self, *a, **k):
         chunk = self.fp.read(*a, **k)
         self.pos += len(chunk)
-        self.progress(self.pos, self.size, len(chunk))
+        if chunk:
+            if self.pos - self.last_pos < self.min_bytes:
+                return chunk
+            if self.min_interval:
+                now = self.clock()
+                if now - self.last_time < self.min_interval:
+                    return chunk
+                self.last_time = now
+        elif self.pos > self.last_pos:
+            # Flush what was read since the last call, so the EOF call
+            # reports zero.
+            self.progress(self.pos, self.size, self.pos - self.last_pos)
+            self.last_pos = self.pos
+        self.progress(self.pos, self.size, self.pos - self.last_pos)
+        self.last_pos = self.pos
         return chunk
 
 class StreamingMixin(object):
     def put_file(self, key, fp, acl=None, metadata={}, progress=None,
-                 size=None, mimetype=None, transformer=None, headers={}):
+                 size=None, mimetype=None, transformer=None, headers={},
+                 timeout=None, progress_interval=0.1, encryption=None):
         """Put file-like object or filename *fp* on OSS as *key*.
 
         *fp* must have a read method that takes a buffer size, and must behave
         correctly with regards to seeking and telling.
 
         *size* can be specified as a size hint. Otherwise the size is figured
-        out via ``os.fstat``, and requires that *fp* have a functioning
-        ``fileno()`` method.
+        out via ``os.fstat`` if *fp* is a regular file. Failing that, as for
+        pipes, *fp* is read through and streamed up with `OSSBucket.open`.
 
         *progress* is a callback that might look like ``p(current, total,
         last_read)``. ``current`` is the current position, ``total`` is the
-        size, and ``last_read`` is how much was last read. ``last_read`` is
-        zero on EOF.
+        size (None if unknown), and ``last_read`` is how much was read since
+        the previous call. ``last_read`` is zero on EOF. Calls come at most
+        every *progress_interval* seconds, besides the one on EOF.
+
+        *encryption*, a `simpleoss.crypto.FrameCipher`, encrypts the content
+        as it is read; progress then counts encrypted bytes.
         """
         headers = headers.copy()
         do_close = False
@@ -54,23 +88,57 @@ class StreamingMixin(object):
             do_close = True
 
         if size is None and hasattr(fp, "fileno"):
-            size = os.fstat(fp.fileno()).st_size
+            try:
+                st = os.fstat(fp.fileno())
+            except (EnvironmentError, ValueError):
+                pass
+            else:
+                if stat.S_ISREG(st.st_mode):
+                    size = st.st_size
+        if encryption:
+            if size is None and "Content-Length" in headers:
+                size = headers.pop("Content-Length")
+            fp = encryption.encrypting_file(fp)
+            if size is not None:
+                size = encryption.encrypted_size(int(size))
+        if size is None and "Content-Length" not in headers:
+            if transformer:
+                raise TypeError("transformer needs a size, and fp has none")
+            if progress:
+                # Pipes can't tell, but they do start at the start.
+                fp = ProgressCallingFile(fp, None, progress, pos=0,
+                                         min_interval=progress_interval)
+            try:
+                self._put_stream(key, fp, acl=acl, metadata=metadata,
+                                 mimetype=mimetype, headers=headers,
+                                 timeout=timeout)
+            finally:
+                if do_close:
+                    fp.close()
+            return
         if "Content-Length" not in headers:
-            if size is None:
-                raise TypeError("no size given and fp does not have a fileno")
             headers["Content-Length"] = str(size)
 
         if progress:
-            fp = ProgressCallingFile(fp, int(size), progress)
+            fp = ProgressCallingFile(fp, int(size), progress,
+                                     min_interval=progress_interval)
 
         try:
             self.put(key, data=fp, acl=acl, metadata=metadata,
                      mimetype=mimetype, transformer=transformer,
-                     headers=headers)
+                     headers=headers, timeout=timeout)
         finally:
             if do_close:
                 fp.close()
 
+    def _put_stream(self, key, fp, **kwds):
+        with self.open(key, "wb", **kwds) as writer:
+            while True:
+                chunk = fp.read(writer.part_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+
 class UnimplementedStreamingMixin(StreamingMixin):
     exc_text = """it appears you forgot to install a streaming http library\n
 for example, you could run ``sudo easy_install poster``
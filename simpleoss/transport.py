@@ -0,0 +1,24 @@
+"""urllib2 plumbing for sending requests
+
+Kept apart from :mod:`simpleoss.bucket` because urllib2 (and with it httplib
+and ssl) is slow to import, and not needed by code that only signs URLs.
+"""
+
+import urllib2
+
+class StreamHTTPHandler(urllib2.HTTPHandler):
+    pass
+
+class StreamHTTPSHandler(urllib2.HTTPSHandler):
+    pass
+
+class AnyMethodRequest(urllib2.Request):
+    def __init__(self, method, *args, **kwds):
+        self.method = method
+        urllib2.Request.__init__(self, *args, **kwds)
+
+    def get_method(self):
+        return self.method
+
+def build_opener():
+    return urllib2.build_opener(StreamHTTPHandler, StreamHTTPSHandler)
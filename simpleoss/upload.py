@@ -0,0 +1,116 @@
+"""Pipelined uploads of whole directory trees
+
+`upload_tree` walks a local directory, hashes files on a pool of hashers and
+uploads them on a pool of uploaders, so that hashing one file overlaps with
+sending others::
+
+    >>> bucket.upload_tree("build/static", "static/")
+    ['static/app.js', 'static/css/site.css', ...]
+
+Hashers are threads by default, which is enough since hashlib releases the
+GIL on the large reads used here; pass ``processes=True`` to hash on a
+`multiprocessing` pool instead. Each stage is bounded, so a huge tree is
+never all in memory at once.
+"""
+
+from __future__ import with_statement
+
+import os
+import hashlib
+from base64 import b64encode
+from collections import deque
+
+from .workers import WorkerPool
+
+hash_chunk_size = 1 << 20
+
+def iter_tree(local_dir, prefix=""):
+    """Yield (path, key) for each file below *local_dir*, in sorted order."""
+    for dirpath, dirnames, filenames in os.walk(local_dir):
+        dirnames.sort()
+        reldir = os.path.relpath(dirpath, local_dir)
+        for filename in sorted(filenames):
+            relpath = os.path.normpath(os.path.join(reldir, filename))
+            key = prefix + relpath.replace(os.sep, "/")
+            yield os.path.join(dirpath, filename), key
+
+def hash_file(entry):
+    """Hash (path, key) *entry*, returning (path, key, size, content_md5)."""
+    path, key = entry
+    hasher = hashlib.md5()
+    size = 0
+    with open(path, "rb") as fp:
+        while True:
+            chunk = fp.read(hash_chunk_size)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+    return path, key, size, b64encode(hasher.digest())
+
+def _bounded_map(submit, iterable, max_pending):
+    # Like WorkerPool.map, but consuming *iterable* at most *max_pending*
+    # items ahead of the caller. *submit(item)* starts work on an item and
+    # returns a callable waiting for its result.
+    pending = deque()
+    for item in iterable:
+        pending.append(submit(item))
+        if len(pending) >= max_pending:
+            yield pending.popleft()()
+    while pending:
+        yield pending.popleft()()
+
+def upload_tree(bucket, local_dir, prefix="", n_hashers=4, n_uploaders=8,
+                processes=False, max_pending=32, headers={}, **put_kwds):
+    """Upload each file below *local_dir* to *bucket* as *prefix* plus its
+    relative path, with ``/`` as separator.
+
+    *max_pending* bounds the files hashed but not yet uploaded, and the
+    uploads in flight. Any other keyword arguments go to `OSSBucket.put`.
+    The first failed upload stops the pipeline and is raised.
+
+    Returns the list of keys uploaded, in walk order.
+    """
+    files = iter_tree(local_dir, prefix)
+    uploaders = WorkerPool(n_uploaders)
+    if processes:
+        import multiprocessing
+        hashers = multiprocessing.Pool(n_hashers)
+        # Not imap, which would read the whole tree ahead.
+        hashed = _bounded_map(
+            lambda entry: hashers.apply_async(hash_file, (entry,)).get,
+            files, min(max_pending, 2 * n_hashers))
+    else:
+        hashers = WorkerPool(n_hashers)
+        hashed = _bounded_map(
+            lambda entry: hashers.submit(hash_file, entry).result,
+            files, max_pending)
+
+    def put(path, key, size, content_md5):
+        put_headers = dict(headers)
+        put_headers["Content-Length"] = str(size)
+        put_headers["Content-MD5"] = content_md5
+        with open(path, "rb") as fp:
+            bucket.put(key, data=fp, headers=put_headers, **put_kwds)
+        return key
+
+    keys = []
+    uploads = deque()
+    finished = False
+    try:
+        for entry in hashed:
+            uploads.append(uploaders.submit(put, *entry))
+            if len(uploads) >= max_pending:
+                keys.append(uploads.popleft().result())
+        while uploads:
+            keys.append(uploads.popleft().result())
+        finished = True
+    finally:
+        # On failure, drop queued work rather than wait for it.
+        if processes:
+            hashers.terminate()
+            hashers.join()
+        else:
+            hashers.shutdown(wait=finished, cancel=not finished)
+        uploaders.shutdown(wait=finished, cancel=not finished)
+    return keys
@@ -1,12 +1,86 @@
 """Misc. OSS-related utilities."""
 
-import time
-import hashlib
+import sys
 import datetime
-import mimetypes
 from base64 import b64encode
-from urllib import quote
-from calendar import timegm
+
+class lazy_module(object):
+    """Stand-in for the module *name*, imported on first attribute access.
+
+    >>> json = lazy_module("json")
+    >>> json.dumps([1])
+    '[1]'
+    """
+
+    def __init__(self, name):
+        self._lazy_name = name
+
+    def __repr__(self):
+        return "<%s %r>" % (self.__class__.__name__, self._lazy_name)
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        __import__(self._lazy_name)
+        module = sys.modules[self._lazy_name]
+        # From now on, attributes are found without coming here.
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+class lazy_class(object):
+    """Stand-in for class *name* in module *module*, imported when first
+    used: called, subclassed, or checked with `isinstance`. As a class
+    attribute, it gives the class itself.
+
+    >>> OrderedDict = lazy_class("collections", "OrderedDict")
+    >>> class D(OrderedDict): pass
+    >>> isinstance(D(), OrderedDict)
+    True
+    """
+
+    def __new__(cls, *args):
+        if len(args) == 3:
+            # Being subclassed, as the metaclass of the class statement.
+            name, bases, dct = args
+            bases = tuple(b._resolve() if isinstance(b, lazy_class) else b
+                          for b in bases)
+            return type(bases[0])(name, bases, dct)
+        return object.__new__(cls)
+
+    def __init__(self, module, name):
+        self._lazy_module = module
+        self._lazy_name = name
+        self._cls = None
+
+    def __repr__(self):
+        return "<%s %s.%s>" % (self.__class__.__name__, self._lazy_module,
+                               self._lazy_name)
+
+    def _resolve(self):
+        if self._cls is None:
+            __import__(self._lazy_module)
+            self._cls = getattr(sys.modules[self._lazy_module], self._lazy_name)
+        return self._cls
+
+    def __get__(self, obj, objtype=None):
+        return self._resolve()
+
+    def __call__(self, *args, **kwds):
+        return self._resolve()(*args, **kwds)
+
+    def __instancecheck__(self, obj):
+        return isinstance(obj, self._resolve())
+
+    def __subclasscheck__(self, cls):
+        return issubclass(cls, self._resolve())
+
+    def __getattr__(self, attr):
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self._resolve(), attr)
+
+hashlib = lazy_module("hashlib")
+mimetypes = lazy_module("mimetypes")
 
 def _oss_canonicalize(headers):
     r"""Canonicalize OSS headers in that certain OSS way.
@@ -38,15 +112,37 @@ def headers_metadata(headers):
 
 iso8601_fmt = '%Y-%m-%dT%H:%M:%S.000Z'
 
+rfc822_days = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+rfc822_months = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+                 "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_rfc822_month_nos = dict((m, i + 1) for (i, m) in enumerate(rfc822_months))
+
 def _iso8601_dt(v): return datetime.datetime.strptime(v, iso8601_fmt)
 def rfc822_fmtdate(t=None):
-    from email.utils import formatdate
+    r"""Format UTC datetime *t*, or the current time, as OSS dates go.
+
+    >>> rfc822_fmtdate(datetime.datetime(2010, 9, 6, 19, 34, 18))
+    'Mon, 06 Sep 2010 19:34:18 GMT'
+    """
     if t is None:
         t = datetime.datetime.utcnow()
-    return formatdate(timegm(t.timetuple()), usegmt=True)
+    return "%s, %02d %s %04d %02d:%02d:%02d GMT" % (
+        rfc822_days[t.weekday()], t.day, rfc822_months[t.month - 1],
+        t.year, t.hour, t.minute, t.second)
 def rfc822_parsedate(v):
+    # OSS always sends the one format, which is cheap to parse by hand.
+    # Anything else is left to the email package.
+    try:
+        wday, day, month, year, hms, zone = v.split()
+        if zone == "GMT":
+            hour, minute, second = hms.split(":")
+            return datetime.datetime(int(year), _rfc822_month_nos[month],
+                                     int(day), int(hour), int(minute),
+                                     int(second))
+    except (ValueError, KeyError):
+        pass
     from email.utils import parsedate
-    return datetime.datetime.fromtimestamp(time.mktime(parsedate(v)))
+    return datetime.datetime(*parsedate(v)[:6])
 
 def expire2datetime(expire, base=None):
     """Force *expire* into a datetime relative to *base*.
@@ -108,7 +204,62 @@ def oss_urlquote(value):
     """
     if isinstance(value, unicode):
         value = value.encode("utf-8")
-    return quote(value, "/")
+    return urlquote(value, "/")
+
+_always_safe = ("ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+                "abcdefghijklmnopqrstuvwxyz"
+                "0123456789" "_.-")
+_quote_tables = {}
+
+def urlquote(value, safe="/"):
+    """Quote *value* like `urllib.quote`, which is slow to import.
+
+    >>> urlquote("a b/c?d=\xe5")
+    'a%20b/c%3Fd%3D%E5'
+    """
+    try:
+        table = _quote_tables[safe]
+    except KeyError:
+        safe_chars = _always_safe + safe
+        table = _quote_tables[safe] = [
+            c if c in safe_chars else "%%%02X" % ord(c)
+            for c in map(chr, xrange(256))]
+    return "".join([table[ord(c)] for c in value])
+
+def urlquote_plus(value, safe=""):
+    """Quote *value* like `urllib.quote_plus`.
+
+    >>> urlquote_plus("a b&c")
+    'a+b%26c'
+    """
+    if " " in value:
+        return urlquote(value, safe + " ").replace(" ", "+")
+    return urlquote(value, safe)
+
+def xml_escape(value):
+    """Escape *value* for use as XML character data.
+
+    >>> xml_escape("<Key>&</Key>")
+    '&lt;Key&gt;&amp;&lt;/Key&gt;'
+    """
+    return value.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+# Common types, so that guessing them doesn't cost initializing mimetypes,
+# which reads the system's mime.types files.
+builtin_mimetypes = {
+    "txt": "text/plain", "html": "text/html", "htm": "text/html",
+    "css": "text/css", "csv": "text/csv", "json": "application/json",
+    "jpeg": "image/jpeg", "png": "image/png", "gif": "image/gif",
+    "svg": "image/svg+xml", "ico": "image/vnd.microsoft.icon",
+    "tif": "image/tiff", "tiff": "image/tiff", "pdf": "application/pdf",
+    "zip": "application/zip", "tar": "application/x-tar",
+    "mp3": "audio/mpeg", "wav": "audio/x-wav", "mp4": "video/mp4",
+    "avi": "video/x-msvideo", "mov": "video/quicktime",
+    "mpeg": "video/mpeg", "mpg": "video/mpeg", "py": "text/x-python",
+    "doc": "application/msword", "xls": "application/vnd.ms-excel",
+    "ppt": "application/vnd.ms-powerpoint", "ps": "application/postscript",
+    "bin": "application/octet-stream",
+}
 
 def guess_mimetype(fn, default="application/octet-stream"):
     """Guess a mimetype from filename *fn*.
@@ -122,6 +273,8 @@ def guess_mimetype(fn, default="application/octet-stream"):
         return default
     bfn, ext = fn.lower().rsplit(".", 1)
     if ext == "jpg": ext = "jpeg"
+    if ext in builtin_mimetypes:
+        return builtin_mimetypes[ext]
     return mimetypes.guess_type(bfn + "." + ext)[0] or default
 
 def info_dict(headers):
@@ -136,6 +289,136 @@ def info_dict(headers):
         rv["modify"] = rfc822_parsedate(headers["last-modified"])
     return rv
 
+class ObjectInfo(object):
+    """Object information parsed lazily from the response headers *headers*.
+
+    Fields are only decoded when accessed, so asking for the size of an object
+    does not cost parsing dates or scanning for metadata. Dict-style access
+    works just like the dict returned by `info_dict`:
+
+    >>> info = ObjectInfo({"content-length": "3", "etag": '"abc"',
+    ...                    "last-modified": "Mon, 06 Sep 2010 19:34:18 GMT",
+    ...                    "x-oss-meta-hairdo": "Secret"})
+    >>> info.size, info.etag
+    (3, '"abc"')
+    >>> info["modify"]
+    datetime.datetime(2010, 9, 6, 19, 34, 18)
+    >>> info.keys()
+    ['modify', 'headers', 'size', 'metadata']
+    >>> info["metadata"]
+    {'hairdo': 'Secret'}
+    >>> info["mimetype"]
+    Traceback (most recent call last):
+      ...
+    KeyError: 'mimetype'
+    >>> info == info_dict(dict(info.headers))
+    True
+    """
+
+    __slots__ = ("_msg", "_headers", "_metadata", "_date", "_modify")
+
+    # Keys and the headers they derive from, ordered like an info_dict's.
+    _fields = (("mimetype", "content-type"), ("modify", "last-modified"),
+               ("headers", None), ("date", "date"),
+               ("size", "content-length"), ("metadata", None))
+
+    def __init__(self, headers):
+        self._msg = headers
+
+    def __repr__(self):
+        return "%s(%r)" % (self.__class__.__name__, self.copy())
+
+    def _header(self, name):
+        try:
+            return self._msg[name]
+        except KeyError:
+            return None
+
+    @property
+    def headers(self):
+        try:
+            return self._headers
+        except AttributeError:
+            self._headers = dict(self._msg)
+            return self._headers
+
+    @property
+    def metadata(self):
+        try:
+            return self._metadata
+        except AttributeError:
+            self._metadata = headers_metadata(self.headers)
+            return self._metadata
+
+    @property
+    def size(self):
+        value = self._header("content-length")
+        if value is not None:
+            return int(value)
+
+    @property
+    def etag(self): return self._header("etag")
+    @property
+    def mimetype(self): return self._header("content-type")
+
+    @property
+    def crc64(self):
+        value = self._header("x-oss-hash-crc64ecma")
+        if value is not None:
+            return int(value)
+
+    @property
+    def date(self):
+        try:
+            return self._date
+        except AttributeError:
+            value = self._header("date")
+            self._date = value and rfc822_parsedate(value)
+            return self._date
+
+    @property
+    def modify(self):
+        try:
+            return self._modify
+        except AttributeError:
+            value = self._header("last-modified")
+            self._modify = value and rfc822_parsedate(value)
+            return self._modify
+
+    def keys(self):
+        return [key for (key, header) in self._fields
+                    if header is None or self._header(header) is not None]
+
+    def __getitem__(self, key):
+        for (field, header) in self._fields:
+            if field == key:
+                if header is None or self._header(header) is not None:
+                    return getattr(self, key)
+                break
+        raise KeyError(key)
+
+    def __contains__(self, key): return key in self.keys()
+    def __iter__(self): return iter(self.keys())
+    def __len__(self): return len(self.keys())
+    def __eq__(self, other): return self.copy() == other
+    def __ne__(self, other): return not self == other
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def iterkeys(self): return iter(self.keys())
+    def itervalues(self): return (self[key] for key in self.keys())
+    def iteritems(self): return ((key, self[key]) for key in self.keys())
+    def values(self): return list(self.itervalues())
+    def items(self): return list(self.iteritems())
+
+    def copy(self):
+        """Fully parse into a plain dict, as `info_dict` would give."""
+        return dict(self.iteritems())
+
 def name(o):
     """Find the name of *o*.
 
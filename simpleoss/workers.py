@@ -0,0 +1,185 @@
+"""Bounded worker pools for fanning out bucket requests.
+
+A minimal take on the futures pattern, since the standard library in Python 2
+has no such thing::
+
+    >>> pool = WorkerPool(2)
+    >>> fut = pool.submit(sum, [1, 2, 3])
+    >>> fut.result()
+    6
+    >>> [f.result() for f in as_completed([pool.submit(abs, -1)])]
+    [1]
+    >>> pool.shutdown()
+"""
+
+from __future__ import with_statement
+
+import sys
+import Queue
+import threading
+
+#: Called as work is submitted, each returning a context manager for the
+#: work to run in, or None: this is how settings of the submitting thread,
+#: such as `simpleoss.scheduler.TransferScheduler.priority`, follow its work
+#: onto the pool's threads.
+context_hooks = []
+
+def _call_in(contexts, fn, args, kwds):
+    if not contexts:
+        return fn(*args, **kwds)
+    with contexts[0]:
+        return _call_in(contexts[1:], fn, args, kwds)
+
+class Future(object):
+    """The pending result of a call submitted to a `WorkerPool`."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._done = False
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+
+    def __repr__(self):
+        state = ("pending", "finished")[int(self._done)]
+        return "<%s at %#x %s>" % (self.__class__.__name__, id(self), state)
+
+    def done(self):
+        return self._done
+
+    def result(self, timeout=None):
+        """Wait for and return the result, re-raising the call's exception."""
+        self.wait(timeout)
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        self.wait(timeout)
+        if self._exc_info:
+            return self._exc_info[1]
+
+    def wait(self, timeout=None):
+        with self._cond:
+            if timeout is None:
+                while not self._done:
+                    self._cond.wait()
+            elif not self._done:
+                self._cond.wait(timeout)
+            if not self._done:
+                raise RuntimeError("timed out waiting for %r" % (self,))
+
+    def add_done_callback(self, fn):
+        """Call *fn(future)* when done, or immediately if already done."""
+        with self._cond:
+            if not self._done:
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def set_result(self, result):
+        self._finish(result, None)
+
+    def set_exc_info(self, exc_info):
+        self._finish(None, exc_info)
+
+    def _finish(self, result, exc_info):
+        with self._cond:
+            self._result, self._exc_info = result, exc_info
+            self._done = True
+            self._cond.notify_all()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+
+def as_completed(futures):
+    """Yield *futures* in the order they finish."""
+    futures = list(futures)
+    finished = Queue.Queue()
+    for fut in futures:
+        fut.add_done_callback(finished.put)
+    for i in xrange(len(futures)):
+        yield finished.get()
+
+class WorkerPool(object):
+    """Run callables on at most *n_workers* daemon threads.
+
+    Threads are started lazily as work is submitted, so a pool that never
+    gets used costs nothing.
+    """
+
+    def __init__(self, n_workers=8):
+        if n_workers < 1:
+            raise ValueError("n_workers must be positive, got %r" % (n_workers,))
+        self.n_workers = n_workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def submit(self, fn, *args, **kwds):
+        fut = Future()
+        contexts = filter(None, [hook() for hook in context_hooks])
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit to a shut down pool")
+            self._queue.put((fut, fn, args, kwds, contexts))
+            if len(self._threads) < self.n_workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        return fut
+
+    def map(self, fn, *iterables):
+        """Like the builtin `map`, but yields results as an iterator."""
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+        for fut in futures:
+            yield fut.result()
+
+    def shutdown(self, wait=True, cancel=False):
+        """Stop the workers once the queue is drained.
+
+        If *cancel* is true, work that has not yet started is dropped and its
+        futures fail with a `RuntimeError`.
+        """
+        with self._lock:
+            if self._shutdown:
+                return
+            self._shutdown = True
+            while cancel:
+                try:
+                    fut = self._queue.get_nowait()[0]
+                except Queue.Empty:
+                    break
+                try:
+                    raise RuntimeError("cancelled by pool shutdown")
+                except RuntimeError:
+                    fut.set_exc_info(sys.exc_info())
+            for thread in self._threads:
+                self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            fut, fn, args, kwds, contexts = item
+            try:
+                result = _call_in(contexts, fn, args, kwds)
+            except BaseException:
+                fut.set_exc_info(sys.exc_info())
+                sys.exc_clear()
+            else:
+                fut.set_result(result)
+            # Don't keep the last call, or what it returned, alive while idle.
+            item = fut = fn = args = kwds = contexts = result = None
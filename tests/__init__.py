@@ -97,6 +97,77 @@ class MockBucketMixin(object):
 class MockBucket(MockBucketMixin, simpleoss.OSSBucket):
     pass
 
+class MemoryResponse(object):
+    def __init__(self, data, code=200, headers=None):
+        self.fp = BytesIO(data)
+        self.read = self.fp.read
+        self.code = code
+        self.headers = MockHTTPMessage(headers)
+
+    def info(self): return self.headers
+    def close(self): self.fp.close()
+
+class MemoryBucket(object):
+    """Stand-in for a bucket kept in a dict, which understands Range."""
+
+    honour_ranges = True
+
+    def __init__(self):
+        self.data = {}
+        self.ranges = []
+        self.uploads = {}
+
+    def put(self, key, data=None, headers={}, **kwds):
+        if hasattr(data, "read"):
+            data = data.read()
+        if "Content-Length" in headers:
+            eq_(headers["Content-Length"], str(len(data)))
+        self.data[key] = data
+
+    def get(self, key, headers={}):
+        try:
+            data = self.data[key]
+        except KeyError:
+            raise simpleoss.KeyNotFound("not found", key=key)
+        if "Range" not in headers:
+            return MemoryResponse(data)
+        spec = headers["Range"][len("bytes="):]
+        self.ranges.append(spec)
+        if not self.honour_ranges:
+            return MemoryResponse(data)
+        first, last = spec.split("-")
+        if not first:
+            return MemoryResponse(data[-int(last):], 206)
+        return MemoryResponse(data[int(first):int(last) + 1], 206)
+
+    def info(self, key):
+        return {"size": len(self.get(key).read())}
+
+    def delete(self, key):
+        try:
+            del self.data[key]
+        except KeyError:
+            raise simpleoss.KeyNotFound("not found", key=key)
+
+    def initiate_multipart(self, key, **kwds):
+        upload_id = "upload%d" % len(self.uploads)
+        self.uploads[upload_id] = {}
+        return upload_id
+
+    def upload_part(self, key, upload_id, part_no, data, timeout=None):
+        # Parts may be sent from a buffer that is reused afterwards.
+        self.uploads[upload_id][part_no] = str(data)
+        return '"etag%d"' % part_no
+
+    def complete_multipart(self, key, upload_id, parts):
+        eq_([etag for (n, etag) in sorted(parts)],
+            ['"etag%d"' % n for n in sorted(self.uploads[upload_id])])
+        uploaded = self.uploads.pop(upload_id)
+        self.data[key] = "".join(uploaded[n] for n in sorted(uploaded))
+
+    def abort_multipart(self, key, upload_id):
+        del self.uploads[upload_id]
+
 g = type("Globals", (object,), {})()
 
 def setup_package():
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""Time a cold ``import simpleoss``, each run in a fresh interpreter.
+
+Not collected by the test runner; run it directly::
+
+    python tests/bench_import.py [n_runs]
+"""
+
+import sys
+import subprocess
+
+timing_script = """
+import time
+t0 = time.time()
+import simpleoss
+print time.time() - t0
+"""
+
+def main(n_runs=20):
+    times = []
+    for i in xrange(n_runs):
+        out = subprocess.Popen([sys.executable, "-c", timing_script],
+                               stdout=subprocess.PIPE).communicate()[0]
+        times.append(float(out))
+    times.sort()
+    print "import simpleoss: min %.1f ms, median %.1f ms over %d runs" % (
+        times[0] * 1000, times[len(times) // 2] * 1000, n_runs)
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
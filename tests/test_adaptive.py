@@ -0,0 +1,129 @@
+import gc
+import socket
+import urllib2
+import unittest
+from nose.tools import eq_
+
+from simpleoss import adaptive
+from simpleoss.adaptive import AdaptiveLimiter
+from tests import MockBucket, MockHTTPResponse, H
+
+class ClassifyTests(unittest.TestCase):
+    def _http_error(self, code):
+        return urllib2.HTTPError("http://x/", code, "?", {}, None)
+
+    def test_classify(self):
+        eq_(adaptive.classify(self._http_error(503)), adaptive.THROTTLED)
+        eq_(adaptive.classify(self._http_error(500)), adaptive.ERROR)
+        eq_(adaptive.classify(self._http_error(404)), adaptive.OK)
+        eq_(adaptive.classify(socket.timeout()), adaptive.TIMEOUT)
+        eq_(adaptive.classify(urllib2.URLError(socket.timeout())),
+            adaptive.TIMEOUT)
+        eq_(adaptive.classify(ValueError()), adaptive.ERROR)
+
+class AdaptiveLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.limiter = AdaptiveLimiter(initial=4, max_limit=8,
+                                       latency_target=1.0,
+                                       clock=lambda: self.now)
+
+    def _request(self, outcome=adaptive.OK, latency=0.1):
+        token = self.limiter.acquire()
+        self.now += latency
+        self.limiter.release(token, outcome)
+
+    def test_additive_increase(self):
+        for i in xrange(4):
+            self._request()
+        eq_(self.limiter.snapshot()["limit"], 4)
+        self._request()
+        eq_(self.limiter.snapshot()["limit"], 5)
+        eq_(list(self.limiter.decisions), [(0.5, "ok", 4, 5)])
+
+    def test_slow_is_not_healthy(self):
+        for i in xrange(10):
+            self._request(latency=2.0)
+        eq_(self.limiter.snapshot()["limit"], 4)
+
+    def test_multiplicative_decrease(self):
+        self._request(adaptive.THROTTLED)
+        eq_(self.limiter.snapshot()["limit"], 2)
+        # Within the cooldown, the same burst of failures counts once.
+        self._request(adaptive.TIMEOUT)
+        eq_(self.limiter.snapshot()["limit"], 2)
+        self.now += 1.0
+        self._request(adaptive.TIMEOUT)
+        eq_(self.limiter.snapshot()["limit"], 1)
+        self.now += 1.0
+        self._request(adaptive.TIMEOUT)
+        eq_(self.limiter.snapshot(),
+            {"limit": 1, "in_flight": 0, "ok": 0, "throttled": 1,
+             "timeout": 3, "error": 0})
+
+    def test_bucket_send(self):
+        bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                            base_url="http://johnsmith.s3.amazonaws.com",
+                            concurrency_limiter=self.limiter)
+        bucket.add_resp("/foo.txt", H("text/plain"), "", status="503 Slow Down")
+        try:
+            bucket.info("foo.txt")
+        except Exception:
+            pass
+        else:
+            assert False, "did not raise exception"
+        eq_(self.limiter.snapshot()["throttled"], 1)
+        eq_(self.limiter.snapshot()["in_flight"], 0)
+        eq_(self.limiter.snapshot()["limit"], 2)
+
+class HeldSlotTests(unittest.TestCase):
+    def setUp(self):
+        self.limiter = AdaptiveLimiter(initial=4, max_limit=8)
+        self.bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                                 base_url="http://johnsmith.s3.amazonaws.com",
+                                 concurrency_limiter=self.limiter)
+
+    def in_flight(self):
+        return self.limiter.snapshot()["in_flight"]
+
+    def test_held_until_read(self):
+        self.bucket.add_resp("/foo.txt", H("text/plain"), "hello")
+        resp = self.bucket.get("foo.txt")
+        eq_(self.in_flight(), 1)
+        eq_(resp.read(2), "he")
+        eq_(self.in_flight(), 1)
+        eq_(resp.read(), "llo")
+        eq_(self.in_flight(), 0)
+        resp.close()
+        eq_(self.limiter.snapshot()["ok"], 1)
+
+    def test_held_until_closed(self):
+        self.bucket.add_resp("/foo.txt", H("text/plain"), "hello")
+        resp = self.bucket.get("foo.txt")
+        resp.readline()
+        eq_(self.in_flight(), 1)
+        resp.close()
+        eq_(self.in_flight(), 0)
+
+    def test_dropped(self):
+        self.bucket.add_resp("/foo.txt", H("text/plain"), "hello")
+        self.bucket.get("foo.txt")
+        gc.collect()
+        eq_(self.in_flight(), 0)
+
+    def test_no_body(self):
+        self.bucket.add_resp("/foo.txt", H("text/plain"), "")
+        self.bucket.info("foo.txt")
+        eq_(self.in_flight(), 0)
+
+    def test_read_error(self):
+        class TimingOut(object):
+            def read(self, *a):
+                raise socket.timeout("timed out")
+            readline = readlines = read
+        self.bucket.add_resp_obj(MockHTTPResponse(TimingOut(), H("text/plain"),
+            "http://johnsmith.s3.amazonaws.com/foo.txt"))
+        resp = self.bucket.get("foo.txt")
+        self.assertRaises(socket.timeout, resp.read)
+        eq_(self.limiter.snapshot()["timeout"], 1)
+        eq_(self.in_flight(), 0)
@@ -0,0 +1,73 @@
+from __future__ import with_statement
+
+import time
+import unittest
+import threading
+from nose.tools import eq_
+
+from simpleoss import KeyNotFound
+from simpleoss.batch import Batch, BatchError
+from tests import MockBucket, H
+
+class DictBucket(object):
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def put(self, key, data):
+        with self.lock:
+            self.data[key] = data
+
+    def get(self, key, delay=0):
+        time.sleep(delay)
+        with self.lock:
+            try:
+                return self.data[key]
+            except KeyError:
+                raise KeyNotFound("not found", key=key)
+
+class BatchTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = DictBucket()
+
+    def test_results_ordered(self):
+        with Batch(self.bucket, n_workers=4) as batch:
+            for i in xrange(10):
+                batch.put("key%d" % i, i)
+        batch = Batch(self.bucket, n_workers=4)
+        for i in xrange(10):
+            batch.get("key%d" % i)
+        eq_(batch.results(), range(10))
+
+    def test_as_completed(self):
+        self.bucket.put("slow", "slow")
+        self.bucket.put("fast", "fast")
+        batch = Batch(self.bucket, n_workers=2)
+        batch.get("slow", delay=0.2)
+        batch.get("fast")
+        eq_([fut.result() for fut in batch.as_completed()], ["fast", "slow"])
+        batch.wait()
+
+    def test_errors_gathered(self):
+        self.bucket.put("there", 1)
+        try:
+            with Batch(self.bucket) as batch:
+                batch.get("missing1")
+                there = batch.get("there")
+                batch.get("missing2")
+        except BatchError, e:
+            eq_(str(e), "2 of 3 operations failed")
+            eq_(sorted(op[1][0] for (op, exc) in e.errors),
+                ["missing1", "missing2"])
+            assert all(isinstance(exc, KeyNotFound) for (op, exc) in e.errors)
+        else:
+            assert False, "expected BatchError"
+        eq_(there.result(), 1)
+
+    def test_bucket_batch(self):
+        bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                            base_url="http://johnsmith.s3.amazonaws.com")
+        bucket.add_resp("/foo.txt", H("text/plain"), "hello")
+        with bucket.batch(n_workers=1) as batch:
+            fut = batch.get("foo.txt")
+        eq_(fut.result().read(), "hello")
@@ -0,0 +1,202 @@
+from __future__ import with_statement
+
+import time
+import socket
+import unittest
+import threading
+import BaseHTTPServer
+import SocketServer
+from nose.tools import eq_
+
+from simpleoss import OSSBucket, OSSError
+from simpleoss.connpool import ConnectionPool, CachingResolver
+from simpleoss.crc64 import crc64
+from tests import BytesIO
+
+class CountingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.lock:
+            self.server.n_connections += 1
+
+    def _respond(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        return body
+
+    def do_GET(self):
+        self.wfile.write(self._respond("hello from " + self.path))
+        if self.path.endswith("/drop"):
+            # Close without saying so, as servers timing out idle
+            # connections do.
+            self.close_connection = 1
+
+    def do_HEAD(self):
+        self._respond("hello from " + self.path)
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.methods.append(self.command)
+        if self.path.endswith("/slow"):
+            time.sleep(0.5)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.send_header("x-oss-hash-crc64ecma", str(crc64(body)))
+        self.end_headers()
+
+    do_POST = do_PUT
+
+    def log_message(self, *a):
+        pass
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients dropping connections is part of the tests.
+        pass
+
+class ConnectionPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.server = Server(("127.0.0.1", 0), CountingHandler)
+        self.server.lock = threading.Lock()
+        self.server.n_connections = 0
+        self.server.methods = []
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.base_url = "http://127.0.0.1:%d/bucket" % self.server.server_port
+        self.pool = ConnectionPool()
+        self.bucket = OSSBucket("bucket", access_key="a", secret_key="b",
+                                base_url=self.base_url, connection_pool=self.pool)
+
+    def tearDown(self):
+        self.pool.clear()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_warmup(self):
+        eq_(self.bucket.warmup(2), 2)
+        eq_(len(self.pool), 2)
+        eq_(self.bucket.warmup(2), 2)
+        for i in xrange(3):
+            fp = self.bucket.get("foo.txt")
+            eq_(fp.read(), "hello from /bucket/foo.txt")
+            fp.close()
+        eq_(self.server.n_connections, 2)
+
+    def test_reuse(self):
+        for i in xrange(3):
+            eq_(self.bucket.info("foo.txt").size, 26)
+            eq_(self.bucket.get("foo.txt").read(), "hello from /bucket/foo.txt")
+        eq_(self.server.n_connections, 1)
+        eq_(len(self.pool), 1)
+
+    def test_shared_between_threads(self):
+        errors = []
+        def worker(n):
+            try:
+                for i in xrange(5):
+                    key = "%d-%d.txt" % (n, i)
+                    eq_(self.bucket.get(key, timeout=5).read(),
+                        "hello from /bucket/" + key)
+            except Exception, e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker, args=(n,)) for n in xrange(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        eq_(errors, [])
+        assert self.server.n_connections <= 8
+        assert len(self.pool) <= 8
+
+    def test_batch_keep_alive(self):
+        with self.bucket.batch(n_workers=2) as batch:
+            infos = [batch.info("%d.txt" % i) for i in xrange(6)]
+        eq_([fut.result().size for fut in infos], [24] * 6)
+        assert self.server.n_connections <= 2
+
+    def test_batch_leaves_bucket_alone(self):
+        bucket = OSSBucket("bucket", access_key="a", secret_key="b",
+                           base_url=self.base_url)
+        opener = bucket.opener
+        with bucket.batch(n_workers=2) as batch:
+            batch.info("foo.txt")
+        eq_(bucket.connection_pool, None)
+        assert bucket.opener is opener
+
+    def test_stale_retry_crc(self):
+        # The server drops the connection once idle, so the PUT on it fails
+        # and is sent again, rewinding the body and its CRC.
+        self.bucket.check_crc64 = True
+        eq_(self.bucket.get("drop").read(), "hello from /bucket/drop")
+        eq_(len(self.pool), 1)
+        time.sleep(0.1)
+        body = "x" * 100000
+        self.bucket.put("k", BytesIO(body),
+                        headers={"Content-Length": str(len(body))})
+        eq_(self.server.n_connections, 2)
+
+    def test_timeout_not_resent(self):
+        eq_(self.bucket.get("foo.txt").read(), "hello from /bucket/foo.txt")
+        eq_(len(self.pool), 1)
+        for method in ("PUT", "POST"):
+            req = self.bucket.request(key="slow", method=method, data="x",
+                                      timeout=0.2)
+            self.assertRaises(OSSError, self.bucket.send, req)
+        time.sleep(0.1)
+        eq_(self.server.methods, ["PUT", "POST"])
+
+    def test_post_not_resent(self):
+        # Unlike the PUT in test_stale_retry_crc, a POST on a connection
+        # found closed may not be sent again.
+        eq_(self.bucket.get("drop").read(), "hello from /bucket/drop")
+        time.sleep(0.1)
+        req = self.bucket.request(key="k", method="POST", data="x")
+        self.assertRaises(OSSError, self.bucket.send, req)
+        eq_(self.server.methods, [])
+
+    def test_unread_not_reused(self):
+        self.bucket.get("foo.txt").close()
+        eq_(len(self.pool), 0)
+
+    def test_warmup_without_pool(self):
+        bucket = OSSBucket("bucket", access_key="a", secret_key="b",
+                           base_url=self.base_url)
+        eq_(bucket.warmup(1), 1)
+        eq_(bucket.get("foo.txt").read(), "hello from /bucket/foo.txt")
+        eq_(self.server.n_connections, 1)
+        bucket.connection_pool.clear()
+
+class CachingResolverTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.lookups = []
+        self.resolver = CachingResolver(ttl=10, clock=lambda: self.now,
+                                        getaddrinfo=self.getaddrinfo)
+
+    def getaddrinfo(self, host, port, family, socktype):
+        self.lookups.append(host)
+        return [(socket.AF_INET, socktype, 6, "", ("10.0.0.1", port)),
+                (socket.AF_INET, socktype, 6, "", ("10.0.0.2", port))]
+
+    def test_cached(self):
+        first = self.resolver.resolve("oss.example.com", 80)
+        second = self.resolver.resolve("oss.example.com", 80)
+        eq_(self.lookups, ["oss.example.com"])
+        eq_([sa for (af, st, proto, sa) in first],
+            [("10.0.0.1", 80), ("10.0.0.2", 80)])
+        eq_([sa for (af, st, proto, sa) in second],
+            [("10.0.0.2", 80), ("10.0.0.1", 80)])
+
+    def test_expiry(self):
+        self.resolver.resolve("oss.example.com", 80)
+        self.now += 10
+        self.resolver.resolve("oss.example.com", 80)
+        eq_(len(self.lookups), 2)
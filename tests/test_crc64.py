@@ -0,0 +1,116 @@
+import random
+import unittest
+from nose.tools import eq_
+
+from simpleoss import ChecksumMismatch
+from simpleoss.crc64 import (crc64, crc64_combine, _py_crc64, _crc64, CRC64,
+                             CRC64File)
+from simpleoss.objfile import OSSWriter
+from tests import MockBucket, MemoryBucket, H, BytesIO
+
+check_value = 0x995DC9BBDF1939FA  # CRC-64/XZ of "123456789"
+
+class CRC64Tests(unittest.TestCase):
+    def test_check_value(self):
+        eq_(crc64("123456789"), check_value)
+        eq_(_py_crc64("123456789"), check_value)
+        eq_(crc64(""), 0)
+
+    def test_incremental(self):
+        data = "".join(chr(random.randrange(256)) for i in xrange(1000))
+        crc = 0
+        for i in xrange(0, len(data), 37):
+            crc = _py_crc64(data[i:i + 37], crc)
+        eq_(crc, _py_crc64(data))
+        eq_(_crc64(data), _py_crc64(data))
+
+    def test_combine(self):
+        data = "".join(chr(random.randrange(256)) for i in xrange(3000))
+        for split in (0, 1, 7, 8, 1024, 2999, 3000):
+            a, b = data[:split], data[split:]
+            eq_(crc64_combine(crc64(a), crc64(b), len(b)), crc64(data))
+
+    def test_hasher(self):
+        parts = [CRC64("1234"), CRC64("5"), CRC64(""), CRC64("6789")]
+        combined = reduce(lambda a, b: a.combine(b), parts)
+        eq_((combined.crc, combined.length), (check_value, 9))
+
+    def test_file(self):
+        fp = CRC64File(BytesIO("123456789"))
+        while fp.read(4):
+            pass
+        eq_(fp.crc.crc, check_value)
+
+class ReadingMockBucket(MockBucket):
+    # Reads file bodies, as a real connection would.
+    def _open(self, req, timeout=None):
+        data = req.get_data()
+        if hasattr(data, "read"):
+            while data.read(4):
+                pass
+        return MockBucket._open(self, req, timeout)
+
+class BucketTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = ReadingMockBucket("johnsmith", access_key="a", secret_key="b",
+                                 base_url="http://johnsmith.s3.amazonaws.com",
+                                 check_crc64=True)
+
+    def crc_resp(self, crc, *hpairs):
+        return H("text/plain", ("x-oss-hash-crc64ecma", str(crc)), *hpairs)
+
+    def test_put(self):
+        self.bucket.add_resp("/a.txt", self.crc_resp(check_value), "")
+        self.bucket.put("a.txt", "123456789")
+        self.bucket.add_resp("/a.txt", self.crc_resp(check_value + 1), "")
+        try:
+            self.bucket.put("a.txt", "123456789")
+        except ChecksumMismatch, e:
+            eq_(e.key, "a.txt")
+        else:
+            self.fail("no ChecksumMismatch")
+
+    def test_put_file(self):
+        headers = {"Content-Length": "9", "Content-MD5": "x"}
+        self.bucket.add_resp("/a.txt", self.crc_resp(check_value), "")
+        self.bucket.put("a.txt", BytesIO("123456789"), headers=headers)
+        self.bucket.add_resp("/a.txt", self.crc_resp(check_value), "")
+        self.assertRaises(ChecksumMismatch, self.bucket.put, "a.txt",
+                          BytesIO("123456780"), headers=headers)
+
+    def test_get(self):
+        self.bucket.add_resp("/a.txt", self.crc_resp(check_value,
+                                                     ("Content-Length", "9")),
+                             "123456789")
+        eq_(self.bucket.get("a.txt").read(), "123456789")
+        self.bucket.add_resp("/a.txt", self.crc_resp(check_value), "123456780")
+        resp = self.bucket.get("a.txt")
+        eq_(resp.read(5), "12345")
+        self.assertRaises(ChecksumMismatch, resp.read)
+
+    def test_get_range(self):
+        self.bucket.add_resp("/a.txt", self.crc_resp(check_value), "345",
+                             status="206 Partial Content")
+        resp = self.bucket.get("a.txt", headers={"Range": "bytes=2-4"})
+        eq_(resp.read(), "345")
+
+class CheckingMemoryBucket(MemoryBucket):
+    check_crc64 = True
+
+    def upload_part(self, key, upload_id, part_no, data, timeout=None,
+                    crc=None):
+        eq_(crc, crc64(data))
+        return MemoryBucket.upload_part(self, key, upload_id, part_no, data)
+
+    def complete_multipart(self, key, upload_id, parts, crc=None):
+        MemoryBucket.complete_multipart(self, key, upload_id, parts)
+        eq_(crc, crc64(self.data[key]))
+
+class WriterTests(unittest.TestCase):
+    def test_combined(self):
+        bucket = CheckingMemoryBucket()
+        data = "".join("%06d\n" % i for i in xrange(100000))
+        with OSSWriter(bucket, "k", part_size=100 << 10) as fp:
+            for i in xrange(0, len(data), 30000):
+                fp.write(data[i:i + 30000])
+        eq_(bucket.data["k"], data)
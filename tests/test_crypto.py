@@ -0,0 +1,117 @@
+import hmac
+import hashlib
+import unittest
+from nose.tools import eq_
+from nose.plugins.skip import SkipTest
+
+from simpleoss.crypto import FrameCipher, DecryptionError, header_size
+from simpleoss.objfile import OSSWriter
+from simpleoss.streaming import StreamingMixin
+from tests import MemoryBucket, BytesIO
+
+class ToyAEAD(object):
+    """Same interface as AESGCM, not at all secure: a SHA-256 keystream and
+    a truncated HMAC tag. Enough to exercise the frame format."""
+
+    def __init__(self, key):
+        self.key = key
+
+    def _xor(self, nonce, data):
+        stream = []
+        for i in xrange(0, len(data), 32):
+            stream.append(hashlib.sha256(self.key + nonce + str(i)).digest())
+        stream = "".join(stream)
+        return "".join(chr(ord(a) ^ ord(b)) for (a, b) in zip(data, stream))
+
+    def _tag(self, nonce, data, aad):
+        return hmac.new(self.key, nonce + aad + data, hashlib.sha256).digest()[:16]
+
+    def encrypt(self, nonce, data, aad):
+        ct = self._xor(nonce, data)
+        return ct + self._tag(nonce, ct, aad)
+
+    def decrypt(self, nonce, data, aad):
+        ct, tag = data[:-16], data[-16:]
+        if tag != self._tag(nonce, ct, aad):
+            raise ValueError("invalid tag")
+        return self._xor(nonce, ct)
+
+class StreamingMemoryBucket(StreamingMixin, MemoryBucket):
+    def open(self, key, mode="rb", **kwds):
+        return OSSWriter(self, key, **kwds)
+
+data = "".join("%06d\n" % i for i in xrange(300))
+
+class FrameCipherTests(unittest.TestCase):
+    def setUp(self):
+        self.cipher = FrameCipher("k" * 32, frame_size=100,
+                                  aead=ToyAEAD("k" * 32))
+
+    def encrypt(self, plain):
+        return self.cipher.encrypting_file(BytesIO(plain)).read()
+
+    def test_roundtrip(self):
+        for size in (0, 1, 99, 100, 101, 1000, len(data)):
+            enc = self.encrypt(data[:size])
+            eq_(len(enc), self.cipher.encrypted_size(size))
+            dec = self.cipher.decrypting_file(BytesIO(enc))
+            eq_(dec.read(7) + dec.read(), data[:size])
+
+    def test_seek_start(self):
+        fp = self.cipher.encrypting_file(BytesIO(data))
+        first = fp.read(250)
+        fp.seek(0)
+        eq_(fp.tell(), 0)
+        eq_(fp.read(250), first)
+
+    def test_tampered(self):
+        enc = self.encrypt(data)
+        enc = enc[:500] + chr(ord(enc[500]) ^ 1) + enc[501:]
+        dec = self.cipher.decrypting_file(BytesIO(enc))
+        self.assertRaises(DecryptionError, dec.read)
+
+    def test_truncated(self):
+        enc = self.encrypt(data[:300])
+        # Drop the empty last frame; every frame left is full and authentic.
+        dec = self.cipher.decrypting_file(BytesIO(enc[:-16]))
+        self.assertRaises(DecryptionError, dec.read)
+        dec = self.cipher.decrypting_file(BytesIO(enc[:-16 - 116]))
+        self.assertRaises(DecryptionError, dec.read)
+
+    def test_range_reads(self):
+        bucket = MemoryBucket()
+        bucket.data["k"] = self.encrypt(data)
+        fp = self.cipher.open(bucket, "k", block_size=200, readahead=0)
+        eq_(fp.size, len(data))
+        fp.seek(7 * 150)
+        eq_(fp.read(14), "000150\n000151\n")
+        fp.seek(-7, 2)
+        eq_(fp.read(), "000299\n")
+        # Only the blocks covering the header and those frames were fetched.
+        eq_(bucket.ranges, ["0-199", "1000-1199", "1200-1399",
+                            "2200-2399", "2400-2471"])
+
+    def test_put_file(self):
+        bucket = StreamingMemoryBucket()
+        bucket.put_file("k", BytesIO(data), size=len(data),
+                        encryption=self.cipher)
+        eq_(len(bucket.data["k"]), self.cipher.encrypted_size(len(data)))
+        eq_(self.cipher.open(bucket, "k").read(), data)
+
+    def test_put_file_unknown_size(self):
+        class Pipe(object):
+            def __init__(self, fp):
+                self.read = fp.read
+        bucket = StreamingMemoryBucket()
+        bucket.put_file("k", Pipe(BytesIO(data)), encryption=self.cipher)
+        eq_(self.cipher.open(bucket, "k").read(), data)
+
+class AESGCMTests(unittest.TestCase):
+    def test_roundtrip(self):
+        try:
+            cipher = FrameCipher(FrameCipher.generate_key(), frame_size=100)
+        except ImportError:
+            raise SkipTest("cryptography is not installed")
+        enc = cipher.encrypting_file(BytesIO(data)).read()
+        eq_(enc[header_size:][:10] == data[:10], False)
+        eq_(cipher.decrypting_file(BytesIO(enc)).read(), data)
@@ -0,0 +1,118 @@
+from __future__ import with_statement
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import threading
+from nose.tools import eq_
+
+from simpleoss import KeyNotFound
+from simpleoss.dedup import Chunker, ChunkIndex, DedupStore
+from tests import BytesIO
+
+class DictBucket(object):
+    def __init__(self):
+        self.data = {}
+        self.n_puts = 0
+        self.lock = threading.Lock()
+
+    def put(self, key, data, mimetype=None):
+        with self.lock:
+            self.data[key] = data
+            self.n_puts += 1
+
+    def get(self, key):
+        try:
+            return BytesIO(self.data[key])
+        except KeyError:
+            raise KeyNotFound("not found", key=key)
+
+    def info(self, key):
+        self.get(key)
+        return {}
+
+def random_bytes(n, seed):
+    rnd = random.Random(seed)
+    return "".join(chr(rnd.randrange(256)) for i in xrange(n))
+
+class ChunkerTests(unittest.TestCase):
+    chunker = Chunker(min_size=64, avg_size=256, max_size=1024)
+
+    def split(self, data):
+        return list(self.chunker.split(BytesIO(data)))
+
+    def test_sizes(self):
+        data = random_bytes(20000, 1)
+        chunks = self.split(data)
+        eq_("".join(chunks), data)
+        assert all(64 < len(c) <= 1024 for c in chunks[:-1])
+
+    def test_edit_is_local(self):
+        data = random_bytes(20000, 2)
+        before = self.split(data)
+        after = self.split(data[:10000] + "inserted" + data[10000:])
+        common = set(before) & set(after)
+        assert len(common) >= len(before) - 3, (len(common), len(before))
+
+    def test_empty(self):
+        eq_(self.split(""), [])
+
+class DedupStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = DictBucket()
+        self.store = DedupStore(self.bucket, n_workers=2,
+            chunker=Chunker(min_size=64, avg_size=256, max_size=1024))
+
+    def test_roundtrip(self):
+        data = random_bytes(10000, 3)
+        stats = self.store.put("v1", BytesIO(data))
+        eq_(stats["size"], 10000)
+        eq_(stats["uploaded"], 10000)
+        eq_(stats["new_chunks"], stats["chunks"])
+        out = BytesIO()
+        self.store.get("v1", out)
+        eq_(out.getvalue(), data)
+        eq_(self.store.manifest("v1")["size"], 10000)
+
+    def test_incremental(self):
+        data = random_bytes(10000, 4)
+        self.store.put("v1", BytesIO(data))
+        stats = self.store.put("v2", BytesIO(data[:5000] + "x" + data[5000:]))
+        assert stats["uploaded"] < 2048, stats
+        out = BytesIO()
+        self.store.get("v2", out)
+        eq_(out.getvalue(), data[:5000] + "x" + data[5000:])
+
+    def test_existing_chunks_not_uploaded(self):
+        data = random_bytes(5000, 5)
+        self.store.put("v1", BytesIO(data))
+        n_puts = self.bucket.n_puts
+        # A fresh index has to find out from the bucket.
+        store = DedupStore(self.bucket, chunker=self.store.chunker)
+        eq_(store.put("v1-again", BytesIO(data))["uploaded"], 0)
+        eq_(self.bucket.n_puts, n_puts + 1)
+
+    def test_corrupt_chunk(self):
+        self.store.put("v1", BytesIO(random_bytes(500, 6)))
+        digest = self.store.manifest("v1")["chunks"][0][0]
+        self.bucket.data[self.store.chunk_key(digest)] = "garbage"
+        self.assertRaises(ValueError, self.store.get, "v1", BytesIO())
+
+class ChunkIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "index")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_persisted(self):
+        index = ChunkIndex(self.path)
+        index.add("aa")
+        index.add("bb")
+        index.add("aa")
+        index = ChunkIndex(self.path)
+        eq_(len(index), 2)
+        assert "aa" in index and "cc" not in index
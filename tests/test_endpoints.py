@@ -0,0 +1,117 @@
+import unittest
+from nose.tools import eq_
+
+from simpleoss import OSSError
+from simpleoss.endpoints import EndpointPool, MultiEndpointOSSBucket
+from tests import MockBucketMixin, MockHTTPResponse, BytesIO, H
+
+class MockMultiBucket(MockBucketMixin, MultiEndpointOSSBucket):
+    def add_endpoint_resp(self, base_url, path, data="", status="200 OK"):
+        resp = MockHTTPResponse(BytesIO(data), H("text/plain"),
+                                base_url + path)
+        self.add_resp_obj(resp, status=status)
+
+class EndpointPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.pool = EndpointPool(["http://a", "http://b"], max_failures=2,
+                                 eject_time=10.0, clock=lambda: self.now)
+
+    def test_least_outstanding(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+        assert first is not second
+        self.pool.release(first)
+        eq_(self.pool.acquire(), first)
+
+    def test_eject(self):
+        a, b = self.pool.endpoints
+        for i in xrange(2):
+            a.outstanding += 1
+            self.pool.release(a, failed=True)
+        eq_([ep["ejected"] for ep in self.pool.snapshot()], [True, False])
+        for i in xrange(3):
+            eq_(self.pool.acquire(), b)
+        self.now += 10.0
+        eq_([ep["ejected"] for ep in self.pool.snapshot()], [False, False])
+        eq_(self.pool.acquire(), a)
+
+    def test_latency(self):
+        pool = EndpointPool(["http://a", "http://b"], strategy="latency")
+        a, b = pool.endpoints
+        pool.release(pool.acquire(), latency=0.5)
+        pool.release(pool.acquire(), latency=0.1)
+        slow, fast = sorted(pool.endpoints, key=lambda ep: -ep.latency)
+        eq_(pool.acquire(), fast)
+        eq_(pool.acquire(), fast)
+
+class MultiEndpointBucketTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = MockMultiBucket("johnsmith",
+            endpoints=["a.example.com", "http://b.example.com/johnsmith"],
+            access_key="0PN5J17HBGZHT7JJ3X82",
+            secret_key="uV3F3YluFJax1cknvbcGwgjvx4QpvB+leU8dUj2o")
+
+    def test_endpoint_urls(self):
+        eq_([ep.url for ep in self.bucket.endpoint_pool.endpoints],
+            ["http://a.example.com/johnsmith", "http://b.example.com/johnsmith"])
+        eq_(self.bucket.base_url, "http://a.example.com/johnsmith")
+
+    def test_failover(self):
+        a, b = [ep.url for ep in self.bucket.endpoint_pool.endpoints]
+        # Ties rotate, so the first pick is the second endpoint.
+        self.bucket.add_endpoint_resp(b, "/foo.txt", status="503 Unavailable")
+        self.bucket.add_endpoint_resp(a, "/foo.txt", "hello")
+        eq_(self.bucket.get("foo.txt").read(), "hello")
+        eq_(len(self.bucket.mock_requests), 2)
+        for req in self.bucket.mock_requests:
+            assert req.get_header("Authorization")
+        eq_([ep["outstanding"] for ep in self.bucket.endpoint_pool.snapshot()],
+            [0, 0])
+        eq_(self.bucket.mock_responses, [])
+
+    def test_retries_run_out(self):
+        bucket = MockMultiBucket("johnsmith", endpoints=["a.example.com"],
+                                 access_key="0PN5J17HBGZHT7JJ3X82",
+                                 secret_key="uV3F3YluFJax1cknvbcGwgjvx4QpvB+leU8dUj2o")
+        bucket.n_retries = 3
+        bucket.retry_backoff = 0
+        fps = []
+        for i in xrange(3):
+            fps.append(BytesIO("<Error><Message>Slow down</Message></Error>"))
+            resp = MockHTTPResponse(fps[-1], H("application/xml"),
+                                    bucket.base_url + "/foo.txt")
+            bucket.add_resp_obj(resp, status="503 Slow Down")
+        try:
+            bucket.get("foo.txt")
+        except OSSError, e:
+            eq_(e.code, 503)
+            eq_(e.msg, "Slow down")
+        else:
+            assert False, "didn't raise"
+        # The responses retried are closed, the last one is read for the error.
+        eq_([fp.closed for fp in fps], [True, True, False])
+
+    def test_retry_delay(self):
+        self.bucket.retry_backoff = 1.0
+        self.bucket.retry_backoff_max = 20.0
+        e500, e503 = OSSError("x", code=500), OSSError("x", code=503)
+        delays = [self.bucket._retry_delay(2, e500) for i in xrange(100)]
+        assert 0 <= min(delays) and max(delays) <= 4.0
+        assert len(set(delays)) > 1
+        delays = [self.bucket._retry_delay(2, e503) for i in xrange(100)]
+        assert max(delays) <= 16.0 and max(delays) > 4.0
+        assert max(self.bucket._retry_delay(10, e503)
+                   for i in xrange(100)) <= 20.0
+
+    def test_warmup(self):
+        warmed = []
+        class Pool(object):
+            def warm(pool, url, n_connections, timeout=None):
+                warmed.append((url, self.bucket.base_url))
+                return n_connections
+        self.bucket.connection_pool = Pool()
+        eq_(self.bucket.warmup(2), 4)
+        base_url = "http://a.example.com/johnsmith"
+        eq_(warmed, [(base_url, base_url),
+                     ("http://b.example.com/johnsmith", base_url)])
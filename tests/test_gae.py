@@ -0,0 +1,107 @@
+import sys
+import types
+import unittest
+from nose.tools import eq_
+
+from tests import MockHTTPMessage
+
+class FakeRPC(object):
+    def __init__(self, urlfetch, deadline):
+        self.urlfetch = urlfetch
+        self.deadline = deadline
+
+    def get_result(self):
+        self.urlfetch.n_waited += 1
+        return self.result
+
+class FakeResult(object):
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = MockHTTPMessage(headers)
+        self.content = content
+
+def make_urlfetch():
+    urlfetch = types.ModuleType("google.appengine.api.urlfetch")
+    urlfetch.Error = type("Error", (Exception,), {})
+    urlfetch.responses = {}
+    urlfetch.calls = []
+    urlfetch.n_waited = 0
+    urlfetch.max_outstanding = 0
+    def create_rpc(deadline=None):
+        return FakeRPC(urlfetch, deadline)
+    def make_fetch_call(rpc, url, payload=None, method="GET", headers={}):
+        urlfetch.calls.append((method, url, payload, dict(headers)))
+        outstanding = len(urlfetch.calls) - urlfetch.n_waited
+        urlfetch.max_outstanding = max(urlfetch.max_outstanding, outstanding)
+        rpc.result = FakeResult(*urlfetch.responses[method, url])
+    urlfetch.create_rpc = create_rpc
+    urlfetch.make_fetch_call = make_fetch_call
+    return urlfetch
+
+# The App Engine SDK isn't around outside App Engine, so stand in for it.
+if "google.appengine.api.urlfetch" not in sys.modules:
+    for name in ("google", "google.appengine", "google.appengine.api"):
+        sys.modules.setdefault(name, types.ModuleType(name))
+    sys.modules["google.appengine.api.urlfetch"] = make_urlfetch()
+    sys.modules["google.appengine.api"].urlfetch = \
+        sys.modules["google.appengine.api.urlfetch"]
+
+from simpleoss import gae, KeyNotFound
+from simpleoss.batch import BatchError
+
+base_url = "http://johnsmith.s3.amazonaws.com"
+
+class AppEngineBatchTests(unittest.TestCase):
+    def setUp(self):
+        self.urlfetch = gae.urlfetch = make_urlfetch()
+        self.bucket = gae.AppEngineOSSBucket("johnsmith", access_key="a",
+                                             secret_key="b", base_url=base_url,
+                                             timeout=5)
+
+    def respond(self, method, key, status=200, content="", headers=()):
+        headers = dict(headers, **{"Content-Length": str(len(content))})
+        self.urlfetch.responses[method, base_url + "/" + key] = \
+            (status, headers, content)
+
+    def test_get_many(self):
+        keys = ["k%d" % i for i in xrange(20)]
+        for key in keys:
+            self.respond("GET", key, content="data of " + key)
+        resps = self.bucket.get_many(keys)
+        eq_([resp.read() for resp in resps], ["data of " + k for k in keys])
+        eq_(resps[3].oss_info.size, len("data of k3"))
+        eq_(self.urlfetch.max_outstanding, 20)
+        for method, url, payload, headers in self.urlfetch.calls:
+            assert headers["Authorization"].startswith("OSS a:")
+
+    def test_window(self):
+        self.bucket.max_rpcs = 8
+        keys = ["k%d" % i for i in xrange(20)]
+        for key in keys:
+            self.respond("HEAD", key, headers={"Content-Type": "text/plain"})
+        infos = self.bucket.info_many(keys)
+        eq_([info.mimetype for info in infos], ["text/plain"] * 20)
+        eq_(self.urlfetch.max_outstanding, 8)
+
+    def test_put_many(self):
+        self.respond("PUT", "a.txt")
+        self.respond("PUT", "b.txt")
+        self.bucket.put_many([("a.txt", "alpha"), ("b.txt", "bravo")],
+                             acl="public-read")
+        eq_([(method, payload, headers["X-oss-object-acl"])
+             for (method, url, payload, headers) in self.urlfetch.calls],
+            [("PUT", "alpha", "public-read"), ("PUT", "bravo", "public-read")])
+
+    def test_errors(self):
+        self.respond("GET", "there", content="hi")
+        self.respond("GET", "missing", status=404,
+                     content="<Error><Message>No such key</Message></Error>")
+        try:
+            self.bucket.get_many(["there", "missing"])
+        except BatchError, e:
+            (op, exc), = e.errors
+            eq_(op, ("get", ("missing",), {}))
+            assert isinstance(exc, KeyNotFound)
+            eq_(exc.msg, "No such key")
+        else:
+            assert False, "expected BatchError"
@@ -0,0 +1,86 @@
+from __future__ import with_statement
+
+import threading
+import unittest
+from nose.tools import eq_
+
+from simpleoss.hedge import HedgePolicy
+from simpleoss import KeyNotFound
+
+class FakeResponse(object):
+    def __init__(self, name):
+        self.name = name
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+class FakeBucket(object):
+    """Answer each attempt as scripted: a response, an exception, or an
+    event to block on before answering."""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.lock = threading.Lock()
+
+    def send(self, ossreq):
+        with self.lock:
+            resp, block = self.script.pop(0)
+        if block:
+            block.wait()
+        if isinstance(resp, Exception):
+            raise resp
+        return resp
+
+class HedgePolicyTests(unittest.TestCase):
+    def policy(self, **kwds):
+        kwds.setdefault("initial_delay", 0.01)
+        kwds.setdefault("budget", 1.0)
+        policy = HedgePolicy(**kwds)
+        # Pretend some requests went unhedged, to have some budget.
+        policy.n_requests = 10
+        return policy
+
+    def test_fast_first(self):
+        policy = self.policy()
+        first = FakeResponse("first")
+        eq_(policy.send(FakeBucket((first, None)), None), first)
+        eq_(policy.n_hedges, 0)
+
+    def test_hedge_wins(self):
+        policy = self.policy()
+        release = threading.Event()
+        slow, fast = FakeResponse("slow"), FakeResponse("fast")
+        bucket = FakeBucket((slow, release), (fast, None))
+        eq_(policy.send(bucket, None), fast)
+        eq_((policy.n_hedges, policy.n_hedge_wins), (1, 1))
+        release.set()
+        assert slow.closed.wait(5.0), "losing response was not closed"
+        assert not fast.closed.is_set()
+
+    def test_no_budget(self):
+        policy = self.policy(budget=0.0)
+        release = threading.Event()
+        slow = FakeResponse("slow")
+        threading.Timer(0.05, release.set).start()
+        eq_(policy.send(FakeBucket((slow, release)), None), slow)
+        eq_(policy.n_hedges, 0)
+
+    def test_first_error_saved_by_hedge(self):
+        policy = self.policy()
+        release = threading.Event()
+        fast = FakeResponse("fast")
+        bucket = FakeBucket((KeyNotFound("boom"), release), (fast, None))
+        eq_(policy.send(bucket, None), fast)
+        release.set()
+
+    def test_error(self):
+        policy = self.policy()
+        bucket = FakeBucket((KeyNotFound("boom"), None))
+        self.assertRaises(KeyNotFound, policy.send, bucket, None)
+
+    def test_percentile_delay(self):
+        policy = self.policy(min_samples=10, percentile=90, min_delay=0.0)
+        for i in xrange(1, 11):
+            policy.record(i / 100.0)
+        eq_(policy.delay(), 0.10)
@@ -0,0 +1,214 @@
+from __future__ import with_statement
+
+import socket
+import unittest
+import threading
+from nose.tools import eq_
+from nose.plugins.skip import SkipTest
+
+from simpleoss import OSSBucket, OSSError, KeyNotFound
+from simpleoss.http2 import HTTP2Pool
+from tests import BytesIO
+
+try:
+    import hyper
+    import h2.config
+    import h2.events
+    import h2.connection
+except ImportError:
+    hyper = None
+
+class FakeHeaders(object):
+    def __init__(self, pairs):
+        self.pairs = pairs
+
+    def iter_raw(self):
+        return iter(self.pairs)
+
+class FakeResponse(object):
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = FakeHeaders(headers)
+        self.fp = BytesIO(body)
+        self.read = self.fp.read
+
+    def close(self):
+        pass
+
+class FakeStreamReset(Exception):
+    pass
+
+class FakeConnection(object):
+    """Answers requests with their path, or 404 for paths ending in
+    "missing". Paths ending in "reset" reset their stream, and in "broken"
+    fail the connection."""
+
+    def __init__(self, scheme, host, port, timeout=None):
+        self.address = scheme, host, port
+        self.timeout = timeout
+        self.requests = {}
+        self.closed = False
+
+    def request(self, method, url, body=None, headers={}):
+        stream_id = 2 * len(self.requests) + 1
+        self.requests[stream_id] = (method, url, body, headers)
+        return stream_id
+
+    def get_response(self, stream_id):
+        method, url, body, headers = self.requests[stream_id]
+        if url.endswith("reset"):
+            raise FakeStreamReset(stream_id)
+        if url.endswith("broken"):
+            raise socket.error("connection reset by peer")
+        status = 404 if url.endswith("missing") else 200
+        return FakeResponse(status, [("content-type", "text/plain"),
+                                     ("content-length", str(len(url)))], url)
+
+    def close(self):
+        self.closed = True
+
+class HTTP2PoolTests(unittest.TestCase):
+    def test_spread_then_multiplex(self):
+        pool = HTTP2Pool(max_connections=2, connection_factory=FakeConnection)
+        entries = [pool.acquire("http", "example.com") for i in xrange(5)]
+        conns = set(id(entry[0]) for entry in entries)
+        eq_(len(conns), 2)
+        eq_(sorted(entry[1] for entry in entries), [2, 2, 3, 3, 3])
+        eq_(entries[0][0].address, ("http", "example.com", 80))
+        eq_(len(pool), 2)
+
+    def test_waits_for_stream(self):
+        pool = HTTP2Pool(max_connections=1, max_streams=1,
+                         connection_factory=FakeConnection)
+        entry = pool.acquire("https", "example.com:8443")
+        eq_(entry[0].address, ("https", "example.com", 8443))
+        acquired = []
+        t = threading.Thread(target=lambda: acquired.append(
+            pool.acquire("https", "example.com:8443")))
+        t.start()
+        t.join(0.1)
+        eq_(acquired, [])
+        pool.release(entry)
+        t.join()
+        assert acquired[0] is entry
+
+    def test_broken(self):
+        pool = HTTP2Pool(connection_factory=FakeConnection)
+        entry = pool.acquire("http", "example.com")
+        pool.release(entry, broken=True)
+        assert entry[0].closed
+        eq_(len(pool), 0)
+
+class HTTP2BucketTests(unittest.TestCase):
+    def setUp(self):
+        self.pool = HTTP2Pool(max_connections=1,
+                              connection_factory=FakeConnection)
+        self.bucket = OSSBucket("johnsmith", access_key="a", secret_key="b",
+                                base_url="http://johnsmith.example.com")
+        self.bucket.use_http2(self.pool)
+
+    def test_get(self):
+        resp = self.bucket.get("a.txt")
+        eq_(resp.read(), "/a.txt")
+        eq_(resp.oss_info.size, 6)
+        (conn, n_streams), = self.pool._conns["http", "johnsmith.example.com"]
+        eq_(n_streams, 0)
+        method, url, body, headers = conn.requests[1]
+        eq_((method, url), ("GET", "/a.txt"))
+        assert "authorization" in headers
+        assert "host" not in headers
+
+    def test_not_found(self):
+        self.assertRaises(KeyNotFound, self.bucket.info, "missing")
+
+    def test_stream_reset(self):
+        self.pool.stream_errors = (FakeStreamReset,)
+        eq_(self.bucket.get("a.txt").read(), "/a.txt")
+        self.assertRaises(OSSError, self.bucket.get, "reset")
+        (conn, n_streams), = self.pool._conns["http", "johnsmith.example.com"]
+        eq_(n_streams, 0)
+        assert not conn.closed
+        self.assertRaises(OSSError, self.bucket.get, "broken")
+        assert conn.closed
+        eq_(len(self.pool), 0)
+
+    def test_timeout(self):
+        bucket = OSSBucket("johnsmith", access_key="a", secret_key="b",
+                           base_url="http://johnsmith.example.com", timeout=5)
+        self.assertRaises(ValueError, bucket.use_http2, self.pool)
+        pool = HTTP2Pool(connection_factory=FakeConnection, timeout=5)
+        bucket.use_http2(pool)
+        eq_(bucket.get("a.txt").read(), "/a.txt")
+        (conn, n_streams), = pool._conns["http", "johnsmith.example.com"]
+        eq_(conn.timeout, 5)
+        self.assertRaises(ValueError, bucket.get, "a.txt", timeout=1)
+        eq_(len(conn.requests), 1)
+
+class H2Server(threading.Thread):
+    """A local HTTP/2 server answering each request with its path."""
+
+    daemon = True
+
+    def __init__(self):
+        threading.Thread.__init__(self)
+        self.sock = socket.socket()
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(5)
+        self.port = self.sock.getsockname()[1]
+        self.n_connections = 0
+
+    def run(self):
+        while True:
+            sock, addr = self.sock.accept()
+            self.n_connections += 1
+            t = threading.Thread(target=self.serve, args=(sock,))
+            t.daemon = True
+            t.start()
+
+    def serve(self, sock):
+        config = h2.config.H2Configuration(client_side=False)
+        conn = h2.connection.H2Connection(config=config)
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+        paths = {}
+        while True:
+            data = sock.recv(65535)
+            if not data:
+                break
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    paths[event.stream_id] = dict(event.headers)[":path"]
+                elif isinstance(event, h2.events.DataReceived):
+                    conn.acknowledge_received_data(
+                        event.flow_controlled_length, event.stream_id)
+                elif isinstance(event, h2.events.StreamEnded):
+                    body = paths.pop(event.stream_id)
+                    conn.send_headers(event.stream_id,
+                                      [(":status", "200"),
+                                       ("content-type", "text/plain"),
+                                       ("content-length", str(len(body)))])
+                    conn.send_data(event.stream_id, body, end_stream=True)
+            sock.sendall(conn.data_to_send())
+
+class LiveHTTP2Tests(unittest.TestCase):
+    def setUp(self):
+        if hyper is None:
+            raise SkipTest("hyper and h2 are not installed")
+        self.server = H2Server()
+        self.server.start()
+
+    def test_multiplexed(self):
+        bucket = OSSBucket("johnsmith", access_key="a", secret_key="b",
+                           base_url="http://127.0.0.1:%d" % self.server.port)
+        bucket.use_http2(HTTP2Pool(max_connections=1))
+        results = {}
+        def get(key):
+            results[key] = bucket.get(key).read()
+        threads = [threading.Thread(target=get, args=("k%d" % i,))
+                   for i in xrange(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        eq_(results, dict(("k%d" % i, "/k%d" % i) for i in xrange(10)))
+        eq_(self.server.n_connections, 1)
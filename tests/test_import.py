@@ -0,0 +1,47 @@
+import sys
+import unittest
+import subprocess
+from nose.tools import eq_
+
+# Modules that are slow to import and not needed just to sign URLs.
+heavy_modules = ("urllib", "urllib2", "httplib", "ssl", "socket", "mimetypes",
+                 "xml.etree.cElementTree", "email.utils", "cgi", "threading")
+
+check_script = """
+import sys
+import simpleoss
+from simpleoss.bucket import ReadOnlyOSSBucket
+from simpleoss.utils import guess_mimetype
+bucket = ReadOnlyOSSBucket("johnsmith", access_key="a", secret_key="b")
+bucket.make_url_authed("photos/puppy.jpg", expire=1175139620)
+guess_mimetype("puppy.jpg")
+print " ".join(m for m in %r if m in sys.modules)
+""" % (heavy_modules,)
+
+class ImportTests(unittest.TestCase):
+    def test_no_heavy_imports(self):
+        proc = subprocess.Popen([sys.executable, "-c", check_script],
+                                stdout=subprocess.PIPE)
+        out = proc.communicate()[0]
+        eq_(proc.returncode, 0)
+        eq_(out.split(), [])
+
+class ReexportTests(unittest.TestCase):
+    def test_transport_names(self):
+        from simpleoss import bucket, transport
+        eq_(bucket.OSSRequest.urllib_request_cls, transport.AnyMethodRequest)
+        class Request(bucket.AnyMethodRequest):
+            pass
+        req = Request("DELETE", "http://johnsmith.s3.amazonaws.com/k")
+        assert isinstance(req, bucket.AnyMethodRequest)
+        assert issubclass(Request, transport.AnyMethodRequest)
+        eq_(req.get_method(), "DELETE")
+        class Handler(bucket.StreamHTTPHandler):
+            pass
+        assert issubclass(Handler, transport.StreamHTTPHandler)
+
+    def test_lazy_module_cached(self):
+        from simpleoss.utils import lazy_module
+        mod = lazy_module("hashlib")
+        mod.md5
+        assert "md5" in vars(mod)
@@ -0,0 +1,75 @@
+import datetime
+import unittest
+from nose.tools import eq_
+
+import simpleoss
+from simpleoss.listfilter import ListingFilter
+from tests import MockBucket, H
+
+entries = [("logs/2010-01-01.gz", "2010-01-01T01:00:00.000Z", 5000),
+           ("logs/2010-01-02.gz", "2010-01-02T01:00:00.000Z", 50),
+           ("logs/2010-01-02.txt", "2010-01-02T01:00:00.000Z", 5000),
+           ("logs/2011-01-01.gz", "2011-01-01T01:00:00.000Z", 5000)]
+
+def listing_xml(entries, truncated=False):
+    contents = "".join("<Contents><Key>%s</Key>"
+                       "<LastModified>%s</LastModified>"
+                       "<ETag>&quot;abc&quot;</ETag><Size>%d</Size>"
+                       "</Contents>" % entry for entry in entries)
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<ListBucketResult xmlns="%s"><IsTruncated>%s</IsTruncated>%s'
+            '</ListBucketResult>' % (simpleoss.bucket.aliyun_oss_ns_url,
+                                     str(truncated).lower(), contents))
+
+class ListdirFilterTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                                 base_url="http://johnsmith.s3.amazonaws.com")
+
+    def add_page(self, args, entries, truncated=False):
+        req = self.bucket.request(key="", args=args)
+        self.bucket.add_resp(req.url(""), H("application/xml"),
+                             listing_xml(entries, truncated))
+
+    def listdir(self, **filters):
+        return [item[0] for item in self.bucket.listdir(**filters)]
+
+    def test_suffix_and_size(self):
+        self.add_page({}, entries)
+        eq_(self.listdir(suffix=".gz", min_size=100),
+            ["logs/2010-01-01.gz", "logs/2011-01-01.gz"])
+        self.add_page({}, entries)
+        eq_(self.listdir(max_size=100), ["logs/2010-01-02.gz"])
+
+    def test_modified(self):
+        self.add_page({}, entries)
+        eq_(self.listdir(modified_after=datetime.datetime(2010, 1, 2, 1),
+                         modified_before=datetime.datetime(2011, 1, 1)),
+            ["logs/2010-01-02.gz", "logs/2010-01-02.txt"])
+
+    def test_glob_sets_prefix(self):
+        self.add_page({"prefix": "logs/2010-"}, entries[:3])
+        eq_(self.listdir(glob="logs/2010-*.gz"),
+            ["logs/2010-01-01.gz", "logs/2010-01-02.gz"])
+
+    def test_regex(self):
+        self.add_page({}, entries)
+        eq_(self.listdir(regex=r"logs/\d+-01-01"),
+            ["logs/2010-01-01.gz", "logs/2011-01-01.gz"])
+
+    def test_paging_past_filtered(self):
+        self.add_page({}, entries[:3], truncated=True)
+        self.add_page({"marker": "logs/2010-01-02.txt"}, entries[3:])
+        eq_(self.listdir(suffix=".gz", min_size=100),
+            ["logs/2010-01-01.gz", "logs/2011-01-01.gz"])
+
+    def test_filter_sees_text(self):
+        seen = []
+        def get(name):
+            seen.append(name)
+            return {"Size": "10"}[name]
+        accept = ListingFilter(suffix=".gz", min_size=5)
+        assert not accept("a.txt", get)
+        eq_(seen, [])
+        assert accept("a.gz", get)
+        eq_(seen, ["Size"])
@@ -0,0 +1,143 @@
+import threading
+import unittest
+from nose.tools import eq_
+
+from simpleoss.memory import MemoryBudget
+from simpleoss.objfile import OSSReader, OSSWriter
+from simpleoss.pack import PackWriter, PackReader
+from simpleoss.dedup import Chunker, DedupStore
+from tests import MemoryBucket, BytesIO
+
+data = "".join("%06d\n" % i for i in xrange(1000))
+
+class BudgetedMemoryBucket(MemoryBucket):
+    def __init__(self, budget):
+        MemoryBucket.__init__(self)
+        self.memory_budget = budget
+
+class MemoryBudgetTests(unittest.TestCase):
+    def test_acquire_release(self):
+        budget = MemoryBudget(100)
+        assert budget.acquire(60)
+        assert not budget.acquire(60, block=False)
+        budget.release(60)
+        assert budget.acquire(60, block=False)
+        self.assertRaises(ValueError, budget.acquire, 101)
+        eq_(budget.snapshot(), {"limit": 100, "used": 60, "pooled": 0,
+                                "peak": 60, "waits": 0})
+
+    def test_blocks_until_released(self):
+        budget = MemoryBudget(100)
+        budget.acquire(80)
+        got = []
+        t = threading.Thread(target=lambda: got.append(budget.acquire(50)))
+        t.start()
+        t.join(0.05)
+        eq_(got, [])
+        budget.release(80)
+        t.join()
+        eq_(got, [True])
+        eq_(budget.snapshot()["waits"], 1)
+
+    def test_buffer_reuse(self):
+        budget = MemoryBudget(100)
+        buf = budget.get_buffer(40)
+        eq_(len(buf), 40)
+        budget.put_buffer(buf)
+        eq_(budget.snapshot()["pooled"], 40)
+        assert budget.get_buffer(40) is buf
+        budget.put_buffer(buf)
+        # Pooled buffers are dropped to make room.
+        budget.acquire(90)
+        eq_(budget.snapshot()["pooled"], 0)
+        eq_(budget.used, 90)
+
+class WriterTests(unittest.TestCase):
+    part_size = 100 << 10
+
+    def test_parts_from_pool(self):
+        budget = MemoryBudget(3 * self.part_size)
+        bucket = BudgetedMemoryBucket(budget)
+        content = data * 60
+        fp = OSSWriter(bucket, "k", part_size=self.part_size, max_in_flight=2)
+        for i in xrange(0, len(content), 1000):
+            fp.write(content[i:i + 1000])
+        fp.close()
+        eq_(bucket.data["k"], content)
+        eq_(len(bucket.uploads), 0)
+        snap = budget.snapshot()
+        eq_(snap["used"], 0)
+        assert snap["peak"] <= 3 * self.part_size, snap
+        # Buffers were reused, rather than one allocated per part.
+        assert snap["pooled"] < 5 * self.part_size, snap
+
+    def test_single_put(self):
+        budget = MemoryBudget(self.part_size)
+        bucket = BudgetedMemoryBucket(budget)
+        fp = OSSWriter(bucket, "k", part_size=self.part_size)
+        fp.write("hello")
+        fp.close()
+        eq_(bucket.data["k"], "hello")
+        eq_(budget.used, 0)
+
+    def test_abort(self):
+        budget = MemoryBudget(3 * self.part_size)
+        bucket = BudgetedMemoryBucket(budget)
+        fp = OSSWriter(bucket, "k", part_size=self.part_size)
+        fp.write("x" * (2 * self.part_size + 1))
+        fp.abort()
+        eq_(budget.used, 0)
+
+class ReaderTests(unittest.TestCase):
+    def open(self, budget, **kwds):
+        bucket = BudgetedMemoryBucket(budget)
+        bucket.data["k"] = data
+        return OSSReader(bucket, "k", block_size=100, **kwds)
+
+    def test_cache_within_budget(self):
+        budget = MemoryBudget(300)
+        fp = self.open(budget, cache_blocks=8, readahead=4)
+        eq_(fp.read(), data)
+        assert budget.peak <= 300, budget.peak
+        fp.close()
+        eq_(budget.used, 0)
+
+    def test_shares_budget(self):
+        # Another transfer holds most of it; reads still go one at a time.
+        budget = MemoryBudget(300)
+        budget.acquire(200)
+        fp = self.open(budget, cache_blocks=8, readahead=4)
+        eq_(fp.read(), data)
+        eq_(budget.used, 300)
+        fp.close()
+        eq_(budget.used, 200)
+
+class OtherBuffersTests(unittest.TestCase):
+    def test_pack_ranges(self):
+        budget = MemoryBudget(1000)
+        bucket = BudgetedMemoryBucket(budget)
+        with PackWriter(bucket, "p.pack") as writer:
+            for i in xrange(10):
+                writer.add("m%d" % i, "%d" % i * 100)
+        reader = PackReader(bucket, "p.pack", max_gap=0, max_range=300)
+        members = reader.read_many(["m%d" % i for i in xrange(10)])
+        eq_(members["m3"], "3" * 100)
+        eq_(budget.peak, 300)
+        eq_(budget.used, 0)
+
+    def test_dedup_chunks(self):
+        budget = MemoryBudget(2048)
+        bucket = BudgetedMemoryBucket(budget)
+        store = DedupStore(bucket, n_workers=4,
+            chunker=Chunker(min_size=64, avg_size=256, max_size=1024))
+        content = "".join("%06d\n" % i for i in xrange(3000))
+        stats = store.put("v1", BytesIO(content))
+        assert stats["chunks"] > 8, stats
+        assert 0 < budget.peak <= 2048, budget.peak
+        eq_(budget.used, 0)
+        budget.peak = 0
+        out = BytesIO()
+        store.get("v1", out)
+        eq_(out.getvalue(), content)
+        assert 0 < budget.peak <= 2048, budget.peak
+        eq_(budget.used, 0)
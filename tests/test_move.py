@@ -0,0 +1,167 @@
+from __future__ import with_statement
+
+import os
+import tempfile
+import time
+import unittest
+import threading
+from nose.tools import eq_
+
+import simpleoss
+from simpleoss import OSSError
+from simpleoss.batch import BatchError
+from simpleoss.move import move_prefix
+from tests import MockBucket, H
+
+class CopyingBucket(object):
+    name = "johnsmith"
+
+    def __init__(self, data, fail_key=None):
+        self.data = dict(data)
+        self.fail_key = fail_key
+        self.fail_deletes = False
+        self.keep_keys = ()
+        self.copies = []
+        self.deletes = []
+        self.lock = threading.Lock()
+
+    def listdir(self, prefix=None):
+        for key in sorted(self.data):
+            if key.startswith(prefix):
+                yield key, None, '"%s"' % self.data[key], len(self.data[key])
+
+    def copy(self, source, key, **kwds):
+        name, source = source.split("/", 1)
+        eq_(name, self.name)
+        if source == self.fail_key:
+            raise OSSError("HTTP error", key=key, code=403)
+        with self.lock:
+            self.copies.append(source)
+            self.data[key] = self.data[source]
+
+    def delete_many(self, keys):
+        if self.fail_deletes:
+            raise OSSError("HTTP error", code=500)
+        self.deletes.append(len(keys))
+        failed = []
+        for key in keys:
+            if key in self.keep_keys:
+                failed.append((key, "AccessDenied", "Access Denied"))
+            else:
+                del self.data[key]
+        return failed
+
+data = dict(("tmp/%04d" % i, "v%d" % i) for i in xrange(2500))
+data["other"] = "x"
+
+class MovePrefixTests(unittest.TestCase):
+    def moved(self):
+        rv = dict(("final/" + key[4:], value)
+                  for (key, value) in data.items() if key.startswith("tmp/"))
+        rv["other"] = "x"
+        return rv
+
+    def test_move(self):
+        bucket = CopyingBucket(data)
+        stats = move_prefix(bucket, "tmp/", "final/", n_workers=4)
+        eq_(stats, {"copied": 2500, "skipped": 0, "deleted": 2500})
+        eq_(bucket.data, self.moved())
+        eq_(bucket.deletes, [1000, 1000, 500])
+
+    def test_into_itself(self):
+        self.assertRaises(ValueError, move_prefix, CopyingBucket(data),
+                          "tmp/", "tmp/sub/")
+
+    def test_failed_copy(self):
+        bucket = CopyingBucket(data, fail_key="tmp/0007")
+        try:
+            move_prefix(bucket, "tmp/", "final/", n_workers=4)
+        except BatchError, e:
+            eq_([op for (op, exc) in e.errors], [("copy", ("tmp/0007",), {})])
+        else:
+            self.fail("no BatchError")
+        eq_(sorted(key for key in bucket.data if key.startswith("tmp/")),
+            ["tmp/0007"])
+
+    def test_failed_delete(self):
+        bucket = CopyingBucket(data)
+        bucket.keep_keys = ("tmp/0003", "tmp/1500")
+        try:
+            move_prefix(bucket, "tmp/", "final/", n_workers=4)
+        except BatchError, e:
+            eq_([op for (op, exc) in e.errors],
+                [("delete", ("tmp/0003",), {}), ("delete", ("tmp/1500",), {})])
+            eq_(e.errors[0][1].extra["code"], "AccessDenied")
+        else:
+            self.fail("no BatchError")
+        eq_(sorted(key for key in bucket.data if key.startswith("tmp/")),
+            ["tmp/0003", "tmp/1500"])
+
+    def test_failure_waits_for_copies(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(path)
+        class Bucket(CopyingBucket):
+            def listdir(self, prefix=None):
+                for i, item in enumerate(CopyingBucket.listdir(self, prefix)):
+                    if i == 8:
+                        raise IOError("listing failed")
+                    yield item
+            def copy(self, source, key, **kwds):
+                time.sleep(0.05)
+                CopyingBucket.copy(self, source, key, **kwds)
+        bucket = Bucket(data)
+        self.assertRaises(IOError, move_prefix, bucket, "tmp/", "final/",
+                          n_workers=4, checkpoint=path)
+        n_copied = len(bucket.copies)
+        time.sleep(0.1)
+        # Nothing copied once the move was over, and all copies recorded.
+        eq_(len(bucket.copies), n_copied)
+        with open(path) as fp:
+            eq_(len(fp.readlines()), n_copied)
+        os.remove(path)
+
+    def test_resume(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(path)
+        bucket = CopyingBucket(data)
+        bucket.fail_deletes = True
+        self.assertRaises(OSSError, move_prefix, bucket, "tmp/", "final/",
+                          n_workers=4, checkpoint=path)
+        n_copied = len(bucket.copies)
+        assert n_copied >= 1000
+        # A source changed since its copy is copied again.
+        bucket.data["tmp/0001"] = "changed"
+        bucket.fail_deletes = False
+        stats = move_prefix(bucket, "tmp/", "final/", n_workers=4,
+                            checkpoint=path)
+        eq_(stats["skipped"], n_copied - 1)
+        eq_(stats["copied"], 2500 - n_copied + 1)
+        expected = self.moved()
+        expected["final/0001"] = "changed"
+        eq_(bucket.data, expected)
+        assert not os.path.exists(path)
+
+class DeleteManyTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                                 base_url="http://johnsmith.s3.amazonaws.com")
+
+    def test_all_deleted(self):
+        self.bucket.add_resp("/?delete", H("application/xml"), "")
+        eq_(self.bucket.delete_many(["a", "b"]), [])
+        eq_(self.bucket.mock_requests[0].get_method(), "POST")
+
+    def test_errors(self):
+        self.bucket.add_resp("/?delete", H("application/xml"),
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<DeleteResult xmlns="%s"><Error><Key>b</Key>'
+            '<Code>AccessDenied</Code><Message>Access Denied</Message>'
+            '</Error></DeleteResult>' % simpleoss.bucket.aliyun_oss_ns_url)
+        eq_(self.bucket.delete_many(["a", "b"]),
+            [("b", "AccessDenied", "Access Denied")])
+        self.bucket.add_resp("/?delete", H("application/xml"),
+            "<DeleteResult><Error><Key>a</Key><Code>InternalError</Code>"
+            "<Message>x</Message></Error></DeleteResult>")
+        eq_(self.bucket.delete("a", "b"), False)
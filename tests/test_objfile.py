@@ -0,0 +1,223 @@
+from __future__ import with_statement
+
+import gc
+import io
+import sys
+import unittest
+from nose.tools import eq_
+
+from simpleoss.objfile import OSSReader, OSSWriter, min_part_size
+from simpleoss.streaming import StreamingMixin
+from tests import MemoryBucket, MockBucket, H, BytesIO
+
+data = "".join("%06d\n" % i for i in xrange(1000))
+
+class OSSReaderTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = MemoryBucket()
+        self.bucket.data["k"] = data
+
+    def open(self, **kwds):
+        kwds.setdefault("block_size", 100)
+        return OSSReader(self.bucket, "k", **kwds)
+
+    def test_read_all(self):
+        fp = self.open(readahead=0)
+        eq_(fp.read(), data)
+        eq_(fp.read(), "")
+        eq_(len(self.bucket.ranges), 70)
+
+    def test_seek(self):
+        fp = self.open(readahead=0)
+        eq_(fp.seek(-7, io.SEEK_END), 6993)
+        eq_(fp.read(7), "000999\n")
+        fp.seek(91)
+        eq_(fp.read(14), "000013\n000014\n")
+        eq_(fp.tell(), 105)
+        eq_(self.bucket.ranges, ["6900-6999", "0-99", "100-199"])
+
+    def test_cache(self):
+        fp = self.open(readahead=0, cache_blocks=2)
+        for pos in (0, 150, 10, 160, 250, 20):
+            fp.seek(pos)
+            fp.read(5)
+        eq_(self.bucket.ranges, ["0-99", "100-199", "200-299", "0-99"])
+
+    def test_readahead(self):
+        fp = self.open(readahead=3, cache_blocks=8)
+        fp.read(100)
+        eq_(len(self.bucket.ranges), 1)
+        fp.read(100)
+        eq_(fp.read(100), data[200:300])
+        eq_(sorted(self.bucket.ranges)[:5],
+            ["0-99", "100-199", "200-299", "300-399", "400-499"])
+        fp.close()
+
+    def test_buffered(self):
+        with io.BufferedReader(self.open(), buffer_size=64) as fp:
+            lines = fp.readlines()
+        eq_(len(lines), 1000)
+        eq_(lines[500], "000500\n")
+
+    def test_ranges_not_honoured(self):
+        self.bucket.honour_ranges = False
+        fp = self.open(readahead=0)
+        fp.seek(700)
+        eq_(fp.read(7), "000100\n")
+
+    def test_short_block(self):
+        fp = self.open(readahead=0)
+        self.bucket.data["k"] = data[:150]
+        eq_(fp.read(100), data[:100])
+        self.assertRaises(IOError, fp.read, 100)
+
+    def test_closed(self):
+        fp = self.open()
+        fp.close()
+        self.assertRaises(ValueError, fp.read, 1)
+
+class OSSWriterTests(unittest.TestCase):
+    part_size = 100 << 10
+
+    def setUp(self):
+        self.bucket = MemoryBucket()
+
+    def open(self, **kwds):
+        return OSSWriter(self.bucket, "k", part_size=self.part_size, **kwds)
+
+    def test_single_put(self):
+        with self.open() as fp:
+            fp.write("a" * 1000)
+            fp.write("b" * (self.part_size - 1000))
+        eq_(self.bucket.data["k"], "a" * 1000 + "b" * (self.part_size - 1000))
+        eq_(fp.upload_id, None)
+
+    def test_multipart(self):
+        chunks = ["%d" % i * 10000 for i in xrange(30)]
+        with self.open(max_in_flight=2) as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+        eq_(self.bucket.data["k"], "".join(chunks))
+        eq_(self.bucket.uploads, {})
+        eq_(len(fp._parts), 5)
+
+    def test_abort(self):
+        try:
+            with self.open() as fp:
+                fp.write("x" * (self.part_size * 2))
+                raise RuntimeError("producer failed")
+        except RuntimeError:
+            pass
+        assert fp.closed
+        assert "k" not in self.bucket.data
+        eq_(self.bucket.uploads, {})
+
+    def test_dropped(self):
+        def produce():
+            fp = self.open()
+            fp.write("x" * (self.part_size * 2))
+            raise RuntimeError("producer failed")
+        self.assertRaises(RuntimeError, produce)
+        sys.exc_clear()
+        gc.collect()
+        assert "k" not in self.bucket.data
+        eq_(self.bucket.uploads, {})
+
+    def test_part_fails(self):
+        def upload_part(*args, **kwds):
+            raise IOError("connection reset")
+        self.bucket.upload_part = upload_part
+        fp = self.open(max_in_flight=1)
+        fp.write("x" * (self.part_size + 1))
+        self.assertRaises(IOError, fp.write, "x" * self.part_size)
+        assert fp.closed
+        eq_(self.bucket.uploads, {})
+
+class MultipartRequestTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                                 base_url="http://johnsmith.s3.amazonaws.com")
+
+    def test_requests(self):
+        b = self.bucket
+        b.add_resp("/k?uploads", H("application/xml"),
+                   "<InitiateMultipartUploadResult><Bucket>johnsmith</Bucket>"
+                   "<Key>k</Key><UploadId>0004B9894A22E5B1888A1E29F823</UploadId>"
+                   "</InitiateMultipartUploadResult>")
+        eq_(b.initiate_multipart("k"), "0004B9894A22E5B1888A1E29F823")
+        b.add_resp("/k?partNumber=1&uploadId=0004B9894A22E5B1888A1E29F823",
+                   H("text/plain", ("ETag", '"3858F62230AC3C915F300C664312C11F"')),
+                   "")
+        eq_(b.upload_part("k", "0004B9894A22E5B1888A1E29F823", 1, "data"),
+            '"3858F62230AC3C915F300C664312C11F"')
+        b.add_resp("/k?uploadId=0004B9894A22E5B1888A1E29F823",
+                   H("application/xml"), "")
+        b.complete_multipart("k", "0004B9894A22E5B1888A1E29F823",
+                             [(1, '"3858F62230AC3C915F300C664312C11F"')])
+        initiate, part, complete = b.mock_requests
+        eq_(initiate.get_method(), "POST")
+        eq_(part.get_method(), "PUT")
+        eq_(part.get_data(), "data")
+        eq_(complete.get_data(),
+            "<CompleteMultipartUpload><Part><PartNumber>1</PartNumber>"
+            "<ETag>\"3858F62230AC3C915F300C664312C11F\"</ETag>"
+            "</Part></CompleteMultipartUpload>")
+
+    def test_part_signed_content_type(self):
+        b = self.bucket
+        b.add_resp("/k?partNumber=1&uploadId=abc",
+                   H("text/plain", ("ETag", '"etag"')), "")
+        b.upload_part("k", "abc", 1, "data")
+        sent = b.mock_requests[0]
+        ctype = sent.get_header("Content-type")
+        eq_(ctype, "application/octet-stream")
+        # Signing what was sent gives the signature that was sent.
+        check = b.request(method="PUT", key="k", data="data",
+                          subresource="partNumber=1&uploadId=abc",
+                          headers={"Content-Type": ctype,
+                                   "Date": sent.get_header("Date")})
+        check.sign(b)
+        eq_(sent.get_header("Authorization"), check.headers["Authorization"])
+
+    def test_signed_subresource(self):
+        req = self.bucket.request(method="PUT", key="k",
+                                  subresource="partNumber=1&uploadId=abc")
+        eq_(req.canonical_resource, "/johnsmith/k?partNumber=1&uploadId=abc")
+
+class StreamingMockBucket(StreamingMixin, MockBucket):
+    pass
+
+class PutFileUnknownSizeTests(unittest.TestCase):
+    def test_pipe(self):
+        bucket = StreamingMockBucket("johnsmith", access_key="a", secret_key="b",
+                                     base_url="http://johnsmith.s3.amazonaws.com")
+        bucket.add_resp("/k.txt", H("text/plain"), "")
+        progress = []
+        bucket.put_file("k.txt", BytesIO("streamed"),
+                        progress=lambda *a: progress.append(a))
+        req, = bucket.mock_requests
+        eq_(req.get_method(), "PUT")
+        eq_(req.get_data(), "streamed")
+        eq_(progress, [(8, None, 8), (8, None, 0)])
+
+    def test_pipe_timeout_and_progress_interval(self):
+        class Bucket(StreamingMixin, MemoryBucket):
+            timeouts = []
+            def open(self, key, mode="rb", **kwds):
+                return OSSWriter(self, key, part_size=min_part_size, **kwds)
+            def upload_part(self, *args, **kwds):
+                self.timeouts.append(kwds["timeout"])
+                return MemoryBucket.upload_part(self, *args, **kwds)
+        class Pipe(object):
+            def __init__(self, data):
+                self.read = BytesIO(data).read
+        content = "x" * (2 * min_part_size + 1)
+        bucket = Bucket()
+        progress = []
+        bucket.put_file("k", Pipe(content), timeout=7.5,
+                        progress=lambda *a: progress.append(a),
+                        progress_interval=3600)
+        eq_(bucket.data["k"], content)
+        eq_(bucket.timeouts, [7.5, 7.5, 7.5])
+        n = len(content)
+        eq_(progress, [(n, None, n), (n, None, 0)])
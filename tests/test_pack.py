@@ -0,0 +1,63 @@
+import unittest
+from nose.tools import eq_
+
+from simpleoss.pack import PackWriter, PackReader
+from tests import MemoryBucket
+
+class PackTests(unittest.TestCase):
+    members = [("a", "alpha"), ("b", "bravo" * 10), ("empty", ""),
+               ("c", "charlie"), ("d", "delta" * 1000)]
+
+    def setUp(self):
+        self.bucket = MemoryBucket()
+        with PackWriter(self.bucket, "p.pack") as writer:
+            for name, data in self.members:
+                writer.add(name, data)
+
+    def test_read(self):
+        reader = PackReader(self.bucket, "p.pack")
+        eq_(reader.names(), [name for (name, data) in self.members])
+        for name, data in self.members:
+            eq_(reader.read(name), data)
+        eq_(len(self.bucket.ranges), 1 + len(self.members) - 1)
+        eq_(self.bucket.ranges[0], "-65536")
+
+    def test_coalesced(self):
+        reader = PackReader(self.bucket, "p.pack", max_gap=0)
+        eq_(reader.read_many(["c", "a", "b"]),
+            {"a": "alpha", "b": "bravo" * 10, "c": "charlie"})
+        eq_(self.bucket.ranges[1:], ["0-61"])
+
+    def test_gap(self):
+        reader = PackReader(self.bucket, "p.pack", max_gap=0)
+        reader.read_many(["a", "c"])
+        eq_(self.bucket.ranges[1:], ["0-4", "55-61"])
+        reader = PackReader(self.bucket, "p.pack", max_gap=100)
+        self.bucket.ranges = []
+        reader.read_many(["a", "c"])
+        eq_(self.bucket.ranges[1:], ["0-61"])
+
+    def test_max_range(self):
+        reader = PackReader(self.bucket, "p.pack", max_range=100)
+        reader.read_many(["a", "b", "c", "d"])
+        eq_(self.bucket.ranges[1:], ["0-61", "62-5061"])
+
+    def test_small_tail(self):
+        reader = PackReader(self.bucket, "p.pack", tail_size=40)
+        eq_(reader.read("d"), "delta" * 1000)
+        eq_(len(self.bucket.ranges), 3)
+
+    def test_ranges_not_honoured(self):
+        self.bucket.honour_ranges = False
+        reader = PackReader(self.bucket, "p.pack")
+        eq_(reader.read_many(["b", "d"]), {"b": "bravo" * 10, "d": "delta" * 1000})
+
+    def test_not_a_pack(self):
+        self.bucket.data["junk"] = "x" * 100
+        reader = PackReader(self.bucket, "junk")
+        self.assertRaises(ValueError, lambda: reader.index)
+
+    def test_duplicate(self):
+        writer = PackWriter(self.bucket, "q.pack")
+        writer.add("a", "1")
+        self.assertRaises(ValueError, writer.add, "a", "2")
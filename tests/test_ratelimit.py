@@ -0,0 +1,90 @@
+import unittest
+from nose.tools import eq_
+
+from simpleoss.ratelimit import TokenBucket, RateLimiter, ThrottledFile
+from tests import MockBucket, BytesIO, H
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.slept.append(delay)
+        self.now += delay
+
+class TokenBucketTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_burst_then_block(self):
+        tb = TokenBucket(10, burst=5, clock=self.clock, sleep=self.clock.sleep)
+        for i in xrange(5):
+            tb.consume()
+        eq_(self.clock.slept, [])
+        tb.consume()
+        eq_(self.clock.slept, [0.1])
+
+    def test_refill(self):
+        tb = TokenBucket(10, burst=5, clock=self.clock, sleep=self.clock.sleep)
+        tb.consume(5)
+        self.clock.now += 0.3
+        tb.consume(3)
+        eq_(self.clock.slept, [])
+
+    def test_debt(self):
+        tb = TokenBucket(100, clock=self.clock, sleep=self.clock.sleep)
+        tb.consume(300)
+        eq_(self.clock.slept, [2.0])
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(requests_per_sec=2, upload_bps=4,
+                                   download_bps=4, clock=self.clock,
+                                   sleep=self.clock.sleep)
+
+    def test_wrap_upload_string(self):
+        eq_(self.limiter.wrap_upload("12345678"), "12345678")
+        eq_(self.clock.slept, [1.0])
+
+    def test_wrap_upload_file(self):
+        fp = self.limiter.wrap_upload(BytesIO("12345678"))
+        assert isinstance(fp, ThrottledFile)
+        eq_(fp.read(4), "1234")
+        eq_(fp.read(4), "5678")
+        eq_(fp.read(4), "")
+        eq_(self.clock.slept, [1.0])
+
+    def test_unlimited(self):
+        limiter = RateLimiter()
+        data = BytesIO("abc")
+        assert limiter.wrap_upload(data) is data
+        limiter.acquire_request()
+
+    def _bucket(self, limiter, n_resps):
+        bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                            base_url="http://johnsmith.s3.amazonaws.com",
+                            rate_limiter=limiter)
+        for i in xrange(n_resps):
+            bucket.add_resp("/foo.txt", H("text/plain"), "12345678")
+        return bucket
+
+    def test_bucket_requests(self):
+        limiter = RateLimiter(requests_per_sec=1, clock=self.clock,
+                              sleep=self.clock.sleep)
+        bucket = self._bucket(limiter, 3)
+        for i in xrange(3):
+            bucket.info("foo.txt")
+        eq_(self.clock.slept, [1.0, 1.0])
+
+    def test_bucket_download(self):
+        bucket = self._bucket(self.limiter, 3)
+        for i in xrange(3):
+            fp = bucket.get("foo.txt")
+            eq_(fp.read(), "12345678")
+        # Past the first second's burst, each body costs two seconds.
+        eq_(self.clock.slept, [1.0, 2.0, 2.0])
@@ -0,0 +1,89 @@
+import unittest
+from nose.tools import eq_
+
+from simpleoss.replay import (TraceRecorder, Replayer, read_trace, key_hash,
+                              format_report)
+from tests import MockBucket, MemoryBucket, H, BytesIO
+
+class UnclosedIO(BytesIO):
+    def close(self):
+        pass
+
+class RecordTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 100.0
+        self.fp = UnclosedIO()
+        self.recorder = TraceRecorder(fp=self.fp, clock=lambda: self.now)
+        self.bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                                 base_url="http://johnsmith.s3.amazonaws.com",
+                                 recorder=self.recorder)
+
+    def records(self):
+        return list(read_trace(BytesIO(self.fp.getvalue())))
+
+    def test_record(self):
+        self.bucket.add_resp("/a.txt", H("text/plain"), "")
+        self.now += 1.5
+        self.bucket.put("a.txt", "x" * 300)
+        self.bucket.add_resp("/a.txt",
+                             H("text/plain", ("Content-Length", "5")), "hello")
+        self.bucket.get("a.txt").read()
+        self.bucket.add_resp("/gone.txt", H("text/plain"), "", status="404 Not Found")
+        self.assertRaises(KeyError, self.bucket.info, "gone.txt")
+        eq_(self.records(),
+            [(1.5, "PUT", key_hash("a.txt"), 300, 0.0, 200),
+             (1.5, "GET", key_hash("a.txt"), 5, 0.0, 200),
+             (1.5, "HEAD", key_hash("gone.txt"), 0, 0.0, 404)])
+        assert "a.txt" not in self.fp.getvalue()
+
+class ReplayTests(unittest.TestCase):
+    records = [(0.0, "GET", "aa", 10, 0.01, 200),
+               (0.5, "PUT", "bb", 20, 0.01, 200),
+               (1.0, "GET", "bb", 20, 0.01, 200),
+               (1.0, "HEAD", "cc", 0, 0.01, 404),
+               (2.0, "GET", "-", 0, 0.01, 200),
+               (4.0, "DELETE", "bb", 0, 0.01, 204)]
+
+    def test_prepare(self):
+        bucket = MemoryBucket()
+        Replayer(bucket).prepare(self.records)
+        eq_(bucket.data, {"replay/aa": "\0" * 10})
+
+    def test_replay(self):
+        bucket = MemoryBucket()
+        replayer = Replayer(bucket, n_workers=1)
+        replayer.prepare(self.records)
+        report = replayer.replay(self.records, speed=0)
+        eq_(bucket.data, {"replay/aa": "\0" * 10})
+        eq_(dict((m, r["count"]) for (m, r) in report["methods"].items()),
+            {"GET": 2, "PUT": 1, "DELETE": 1})
+        eq_((report["errors"], report["skipped"]), (1, 1))
+        assert report["requests_per_sec"] > 0
+        assert "GET" in format_report(report)
+
+    def test_paced(self):
+        now = [0.0]
+        sleeps = []
+        def sleep(t):
+            sleeps.append(t)
+            now[0] += t
+        replayer = Replayer(MemoryBucket(), clock=lambda: now[0], sleep=sleep)
+        replayer.prepare(self.records)
+        report = replayer.replay(self.records, speed=2.0)
+        eq_(sleeps, [0.25, 0.25, 1.5])
+        eq_(report["elapsed"], 2.0)
+
+    def test_queueing_counts(self):
+        # Each request takes a second on the one worker; those queued behind
+        # it are late by as much, and that counts.
+        now = [0.0]
+        class SlowReplayer(Replayer):
+            def issue(self, method, khash, size):
+                now[0] += 1.0
+                return 0
+        records = [(0.0, "HEAD", "aa", 0, 0.01, 200)] * 3
+        replayer = SlowReplayer(MemoryBucket(), n_workers=1,
+                                clock=lambda: now[0])
+        report = replayer.replay(records, speed=1.0)
+        eq_(sorted(replayer.latencies["HEAD"]), [1.0, 2.0, 3.0])
+        eq_(report["methods"]["HEAD"]["max"], 3.0)
@@ -0,0 +1,119 @@
+import time
+import urllib2
+import threading
+import unittest
+from nose.tools import eq_
+
+from simpleoss.scheduler import (TransferScheduler, INTERACTIVE, BULK,
+                                 request_size)
+from simpleoss.workers import WorkerPool
+from tests import MockBucket, H
+
+def req(url="http://x/k", size=None, range=None):
+    r = urllib2.Request(url)
+    if size is not None:
+        r.add_header("Content-Length", str(size))
+    if range is not None:
+        r.add_header("Range", range)
+    return r
+
+class ClassifyTests(unittest.TestCase):
+    def test_request_size(self):
+        eq_(request_size(req()), 0)
+        eq_(request_size(req(size=10)), 10)
+        eq_(request_size(urllib2.Request("http://x/k", data="abc")), 3)
+        eq_(request_size(req(range="bytes=100-199")), 100)
+
+    def test_classify(self):
+        s = TransferScheduler()
+        eq_(s.classify(req(), 0), INTERACTIVE)
+        eq_(s.classify(req(), 1 << 20), BULK)
+        eq_(s.classify(req("http://x/k?partNumber=1&uploadId=u"), 10), BULK)
+
+    def test_priority(self):
+        s = TransferScheduler(limit=4)
+        with s.priority(BULK):
+            ticket = s.acquire(req())
+        eq_(ticket[0], BULK)
+        s.release(ticket)
+        eq_(s.acquire(req())[0], INTERACTIVE)
+
+    def test_priority_in_workers(self):
+        s = TransferScheduler(limit=4)
+        other = TransferScheduler(limit=4)
+        pool = WorkerPool(1)
+        with s.priority(BULK):
+            fut = pool.submit(lambda: (s.acquire(req())[0],
+                                       other.acquire(req())[0]))
+        eq_(fut.result(), (BULK, INTERACTIVE))
+        # The worker thread is back to its own priorities afterwards.
+        eq_(pool.submit(s.acquire, req()).result()[0], INTERACTIVE)
+        pool.shutdown()
+
+class SchedulingTests(unittest.TestCase):
+    def _queue(self, scheduler, reqs, order=None):
+        # Queue up *reqs* behind a held slot, one thread each, in order.
+        if order is None:
+            order = []
+        threads = []
+        n_waiting = sum(v["waiting"] for v in scheduler.snapshot().values())
+        for name, r in reqs:
+            def run(name=name, r=r):
+                ticket = scheduler.acquire(r)
+                order.append(name)
+                scheduler.release(ticket)
+            t = threading.Thread(target=run)
+            t.start()
+            threads.append(t)
+            n = n_waiting + len(threads)
+            while sum(v["waiting"] for v in scheduler.snapshot().values()) < n:
+                time.sleep(0.001)
+        return order, threads
+
+    def test_interactive_skips_ahead(self):
+        s = TransferScheduler(limit=1, limits={})
+        held = s.acquire(req())
+        order, threads = self._queue(s, [
+            ("part1", req(size=64 << 20)), ("part2", req(size=64 << 20)),
+            ("part3", req(size=64 << 20)), ("head", req())])
+        s.release(held)
+        for t in threads:
+            t.join()
+        eq_(order, ["head", "part1", "part2", "part3"])
+        eq_(s.snapshot()[BULK], {"in_flight": 0, "waiting": 0, "sent": 3})
+
+    def test_bulk_gets_its_share(self):
+        # Small bulk requests are not starved by a stream of interactive ones.
+        s = TransferScheduler(limit=1, limits={})
+        held = s.acquire(req())
+        part = req("http://x/k?partNumber=1&uploadId=u")
+        order, threads = self._queue(s, [("bulk", part)])
+        more, more_threads = self._queue(s, [(i, req()) for i in xrange(12)],
+                                         order)
+        s.release(held)
+        for t in threads + more_threads:
+            t.join()
+        assert 0 < order.index("bulk") < 12, order
+
+    def test_bulk_limit(self):
+        s = TransferScheduler(limit=4)
+        eq_(s.limits, {BULK: 3})
+        bulk = [s.acquire(req(size=1 << 30)) for i in xrange(3)]
+        order, threads = self._queue(s, [("part", req(size=1 << 30))])
+        # The last slot is kept for interactive requests.
+        s.release(s.acquire(req()))
+        eq_(order, [])
+        s.release(bulk.pop())
+        threads[0].join()
+        eq_(order, ["part"])
+
+class BucketTests(unittest.TestCase):
+    def test_send(self):
+        s = TransferScheduler(limit=2)
+        bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                            base_url="http://johnsmith.s3.amazonaws.com",
+                            scheduler=s)
+        bucket.add_resp("/foo.txt", H("text/plain"), "")
+        bucket.info("foo.txt")
+        eq_(s.snapshot()[INTERACTIVE],
+            {"in_flight": 0, "waiting": 0, "sent": 1})
@@ -0,0 +1,110 @@
+import urllib2
+import unittest
+from nose.tools import eq_
+
+from simpleoss.stats import TransferStats
+from simpleoss.streaming import ProgressCallingFile
+from tests import MockBucket, H, BytesIO
+
+class TransferStatsTests(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.stats = TransferStats(window=10.0, clock=lambda: self.now)
+
+    def test_snapshot(self):
+        a = self.stats.start("a", "up", size=1000)
+        b = self.stats.start("b", "down")
+        for i in xrange(5):
+            self.now += 1.0
+            a.add(100)
+            b.add(100)
+        snap = self.stats.snapshot()
+        eq_(snap["active"], 2)
+        eq_(snap["bytes_done"], 1000)
+        eq_(snap["bytes_total"], 1500)
+        eq_(snap["rate"], 200.0)
+        eq_(snap["eta"], 2.5)
+        a.add(500)
+        b.finish()
+        snap = self.stats.snapshot()
+        eq_((snap["active"], snap["finished"]), (0, 2))
+
+    def test_rate_window(self):
+        t = self.stats.start("a", "up")
+        t.add(10000)
+        self.now += 20.0
+        for i in xrange(30):
+            self.now += 1.0
+            t.add(10)
+        assert 9.0 < self.stats.rate() < 12.0, self.stats.rate()
+
+    def test_bucket(self):
+        bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                            base_url="http://johnsmith.s3.amazonaws.com",
+                            transfer_stats=self.stats)
+        bucket.add_resp("/up.txt", H("text/plain"), "")
+        bucket.put("up.txt", "x" * 300)
+        bucket.add_resp("/down.txt",
+                        H("text/plain", ("Content-Length", "5")), "hello")
+        resp = bucket.get("down.txt")
+        eq_(self.stats.snapshot()["active"], 1)
+        eq_(resp.read(), "hello")
+        snap = self.stats.snapshot()
+        eq_((snap["active"], snap["finished"], snap["bytes_done"]), (0, 2, 305))
+
+    def test_retried(self):
+        bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                            base_url="http://johnsmith.s3.amazonaws.com",
+                            transfer_stats=self.stats)
+        bucket.retry_backoff = 0
+        bucket.add_resp("/up.txt", H("text/plain"), "",
+                        status="500 Internal Server Error")
+        bucket.add_resp("/up.txt", H("text/plain"), "")
+        bucket.put("up.txt", "x" * 300)
+        snap = self.stats.snapshot()
+        eq_((snap["active"], snap["finished"], snap["bytes_done"]), (0, 1, 300))
+
+    def test_rewound(self):
+        req = urllib2.Request("http://example.com/up.txt", BytesIO("x" * 300),
+                              {"Content-Length": "300"})
+        t = self.stats.track_upload(req)
+        fp = req.get_data()
+        fp.read()
+        eq_((t.done, t.finished), (300, True))
+        fp.seek(0)
+        snap = self.stats.snapshot()
+        eq_((snap["active"], snap["finished"], snap["bytes_done"]), (1, 0, 0))
+        fp.read(100)
+        fp.read()
+        snap = self.stats.snapshot()
+        eq_((snap["active"], snap["finished"], snap["bytes_done"]), (0, 1, 300))
+
+    def test_not_seekable(self):
+        class Pipe(object):
+            def __init__(self, data):
+                self.read = BytesIO(data).read
+        req = urllib2.Request("http://example.com/up.txt", Pipe("x" * 10))
+        self.stats.track_upload(req)
+        assert not hasattr(req.get_data(), "seek")
+
+class ProgressThrottleTests(unittest.TestCase):
+    def test_throttled(self):
+        now = [0.0]
+        calls = []
+        fp = ProgressCallingFile(BytesIO("x" * 1000), 1000,
+                                 lambda *a: calls.append(a),
+                                 min_interval=1.0, clock=lambda: now[0])
+        for i in xrange(10):
+            now[0] += 0.25
+            fp.read(100)
+        fp.read(100)
+        eq_(calls, [(400, 1000, 400), (800, 1000, 400), (1000, 1000, 200),
+                    (1000, 1000, 0)])
+
+    def test_min_bytes(self):
+        calls = []
+        fp = ProgressCallingFile(BytesIO("x" * 100), 100,
+                                 lambda *a: calls.append(a), min_bytes=50)
+        while fp.read(10):
+            pass
+        eq_(calls, [(50, 100, 50), (100, 100, 50), (100, 100, 0)])
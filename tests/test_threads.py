@@ -0,0 +1,43 @@
+from __future__ import with_statement
+
+import unittest
+import threading
+from nose.tools import eq_
+
+from tests import MockBucket, H
+
+class SharedBucketTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = MockBucket("johnsmith", access_key="a", secret_key="b",
+                                 base_url="http://johnsmith.s3.amazonaws.com",
+                                 timeout=10.0)
+
+    def test_timeout_disabled_per_thread(self):
+        seen = []
+        def other():
+            seen.append(self.bucket.timeout)
+        with self.bucket.timeout_disabled():
+            eq_(self.bucket.timeout, None)
+            thread = threading.Thread(target=other)
+            thread.start()
+            thread.join()
+        eq_(seen, [10.0])
+        eq_(self.bucket.timeout, 10.0)
+
+    def test_timeout_disabled_nested(self):
+        with self.bucket.timeout_disabled():
+            with self.bucket.timeout_disabled():
+                eq_(self.bucket.timeout, None)
+            eq_(self.bucket.timeout, None)
+        eq_(self.bucket.timeout, 10.0)
+
+    def test_per_call_options(self):
+        self.bucket.add_resp("/foo.txt", H("text/plain"), "hello")
+        self.bucket.add_resp("/foo.txt", H("text/plain"), "hello")
+        self.bucket.get("foo.txt", headers={"Range": "bytes=0-1"}, timeout=2.5)
+        self.bucket.get("foo.txt")
+        first, second = self.bucket.mock_requests
+        eq_(first.get_header("Range"), "bytes=0-1")
+        eq_(first.timeout, 2.5)
+        eq_(second.get_header("Range"), None)
+        eq_(second.timeout, 10.0)
@@ -0,0 +1,95 @@
+from __future__ import with_statement
+
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+from nose.tools import eq_
+
+from simpleoss import OSSError
+from simpleoss.utils import oss_md5
+from simpleoss import upload
+from simpleoss.upload import iter_tree, upload_tree
+
+class RecordingBucket(object):
+    def __init__(self, fail_key=None):
+        self.puts = {}
+        self.fail_key = fail_key
+        self.lock = threading.Lock()
+
+    def put(self, key, data=None, headers={}, **kwds):
+        if key == self.fail_key:
+            raise OSSError("HTTP error", key=key, code=403)
+        with self.lock:
+            self.puts[key] = (data.read(), headers, kwds)
+
+class UploadTreeTests(unittest.TestCase):
+    files = {"a.txt": "hello", "sub/b.bin": "x" * 100000, "sub/deeper/c": ""}
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        for relpath, data in self.files.iteritems():
+            path = os.path.join(self.root, *relpath.split("/"))
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, "wb") as fp:
+                fp.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_iter_tree(self):
+        eq_([key for (path, key) in iter_tree(self.root, "p/")],
+            ["p/a.txt", "p/sub/b.bin", "p/sub/deeper/c"])
+
+    def check_upload(self, **kwds):
+        bucket = RecordingBucket()
+        keys = upload_tree(bucket, self.root, "p/", acl="public-read",
+                           max_pending=2, **kwds)
+        eq_(keys, ["p/a.txt", "p/sub/b.bin", "p/sub/deeper/c"])
+        for relpath, data in self.files.iteritems():
+            body, headers, put_kwds = bucket.puts["p/" + relpath]
+            eq_(body, data)
+            eq_(headers["Content-Length"], str(len(data)))
+            eq_(headers["Content-MD5"], oss_md5(data))
+            eq_(put_kwds, {"acl": "public-read"})
+
+    def test_upload_threads(self):
+        self.check_upload()
+
+    def test_upload_processes(self):
+        self.check_upload(processes=True, n_hashers=2)
+
+    def test_processes_bounded(self):
+        # The tree is read only a little ahead of the uploads.
+        path = os.path.join(self.root, "a.txt")
+        consumed = []
+        def files(local_dir, prefix):
+            for i in xrange(50):
+                consumed.append(i)
+                yield path, "p/%d" % i
+        first_put = []
+        class Bucket(RecordingBucket):
+            def put(self, key, **kwds):
+                first_put.append(len(consumed))
+                RecordingBucket.put(self, key, **kwds)
+        bucket = Bucket()
+        orig_iter_tree = upload.iter_tree
+        upload.iter_tree = files
+        try:
+            keys = upload_tree(bucket, self.root, "p/", processes=True,
+                               n_hashers=2, n_uploaders=1, max_pending=2)
+        finally:
+            upload.iter_tree = orig_iter_tree
+        eq_(len(keys), 50)
+        assert first_put[0] < 10, first_put[0]
+
+    def test_error(self):
+        bucket = RecordingBucket(fail_key="p/sub/b.bin")
+        try:
+            upload_tree(bucket, self.root, "p/")
+        except OSSError, e:
+            eq_(e.extra["key"], "p/sub/b.bin")
+        else:
+            assert False, "expected the failed upload to be raised"
@@ -0,0 +1,87 @@
+import urllib
+import datetime
+import unittest
+from nose.tools import eq_
+
+import simpleoss
+from simpleoss.utils import ObjectInfo
+from tests import MockBucket, H
+
+class WalkTests(unittest.TestCase):
+    def setUp(self):
+        self.bucket = MockBucket("johnsmith",
+            access_key="0PN5J17HBGZHT7JJ3X82",
+            secret_key="uV3F3YluFJax1cknvbcGwgjvx4QpvB+leU8dUj2o",
+            base_url="http://johnsmith.s3.amazonaws.com")
+
+    def tearDown(self):
+        eq_(self.bucket.mock_responses, [])
+
+    def _listing_xml(self, prefix, keys=(), prefixes=()):
+        contents = "".join("<Contents><Key>%s</Key>"
+                           "<LastModified>2009-10-12T17:50:30.000Z</LastModified>"
+                           "<ETag>&quot;abc&quot;</ETag><Size>1</Size>"
+                           "</Contents>" % key for key in keys)
+        common = "".join("<CommonPrefixes><Prefix>%s</Prefix></CommonPrefixes>"
+                         % p for p in prefixes)
+        return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<ListBucketResult xmlns="%s">'
+                '<Prefix>%s</Prefix><Delimiter>/</Delimiter>'
+                '<IsTruncated>false</IsTruncated>%s%s</ListBucketResult>'
+                % (simpleoss.bucket.aliyun_oss_ns_url, prefix, contents, common))
+
+    def _add_level(self, prefix, keys=(), prefixes=()):
+        req = self.bucket.request(key="", args={"prefix": prefix,
+                                                "delimiter": "/"})
+        self.bucket.add_resp(req.url(""), H("application/xml"),
+                             self._listing_xml(prefix, keys, prefixes))
+
+    def test_common_prefixes(self):
+        self._add_level("", ["a.txt"], ["photos/", "videos/"])
+        listing = self.bucket._get_listing({"prefix": "", "delimiter": "/"})
+        eq_(listing.prefixes, ["photos/", "videos/"])
+        eq_([item[0] for item in listing], ["a.txt"])
+        eq_(listing.next_marker, "videos/")
+
+    def test_walk(self):
+        self._add_level("", ["a.txt"], ["photos/", "videos/"])
+        self._add_level("photos/", ["photos/b.jpg"], ["photos/2010/"])
+        self._add_level("videos/", ["videos/c.avi"])
+        self._add_level("photos/2010/", ["photos/2010/d.jpg"])
+        walked = [(prefix, subprefixes, [item[0] for item in items])
+                  for (prefix, subprefixes, items)
+                  in self.bucket.walk(n_workers=1)]
+        eq_(walked, [("", ["photos/", "videos/"], ["a.txt"]),
+                     ("photos/", ["photos/2010/"], ["photos/b.jpg"]),
+                     ("videos/", [], ["videos/c.avi"]),
+                     ("photos/2010/", [], ["photos/2010/d.jpg"])])
+
+    def test_walk_prune(self):
+        self._add_level("", ["a.txt"], ["photos/", "videos/"])
+        self._add_level("videos/", ["videos/c.avi"])
+        walked = []
+        for prefix, subprefixes, items in self.bucket.walk(n_workers=1):
+            walked.append(prefix)
+            if "photos/" in subprefixes:
+                subprefixes.remove("photos/")
+        eq_(walked, ["", "videos/"])
+        listed = [urllib.unquote_plus(req.get_full_url())
+                  for req in self.bucket.mock_requests]
+        eq_(len(listed), 2)
+        assert not [url for url in listed if "prefix=photos/" in url], listed
+
+class InfoTests(unittest.TestCase):
+    def test_info_lazy(self):
+        bucket = MockBucket("johnsmith",
+            access_key="0PN5J17HBGZHT7JJ3X82",
+            secret_key="uV3F3YluFJax1cknvbcGwgjvx4QpvB+leU8dUj2o",
+            base_url="http://johnsmith.s3.amazonaws.com")
+        bucket.add_resp("/foo.txt", H("text/plain",
+                        ("last-modified", "Mon, 06 Sep 2010 19:34:18 GMT"),
+                        ("content-length", "1234")), "")
+        info = bucket.info("foo.txt")
+        eq_(info.size, 1234)
+        assert isinstance(info, ObjectInfo)
+        eq_(info["modify"], datetime.datetime(2010, 9, 6, 19, 34, 18))
+        eq_(sorted(dict(info)), ["date", "headers", "metadata",
+                                 "mimetype", "modify", "size"])